@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class DocumentsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'documents'
+    verbose_name = '文档管理'
+
+    def ready(self):
+        # 注册文档相关信号（缓存失效等）
+        from . import signals  # noqa: F401
@@ -0,0 +1,349 @@
+"""标题联想（自动补全）索引
+
+每个工作进程在内存中维护一份有序数组前缀索引（收到第一个请求时在后台线程中构建，见 warm_up()），
+覆盖文档标题、分类名称和作者姓名：
+- 索引项为 (关键字, 类型, ID)，按关键字排序，用 bisect 定位前缀区间；
+- 关键字包括完整标题、标题中每个词开头的后缀，以及拼音首字母（需安装 pypinyin）；
+- 本进程内的修改通过信号即时更新；其他进程的修改通过缓存中的代数计数器感知，
+  按 updated_at 增量同步，数量不一致时整体重建。
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models import Count
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 未安装 pypinyin 时不支持拼音首字母检索
+    lazy_pinyin = None
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'documents:autocomplete:generation'
+SYNC_CHECK_INTERVAL = 5  # 秒，检查其他进程修改的最小间隔
+MAX_SCAN = 2000  # 单次查询最多扫描的索引项，避免大量不可见文档拖慢响应
+
+KIND_DOCUMENT = 'document'
+KIND_CATEGORY = 'category'
+KIND_AUTHOR = 'author'
+
+_WORD_BOUNDARY = re.compile(r'[\s\-_·.,，。、:：;；()（）\[\]【】《》"“”\'‘’/]+')
+
+
+def normalize(text):
+    return (text or '').strip().lower()
+
+
+def pinyin_initials(text):
+    """返回中文拼音首字母（如“期末考试”→“qmks”），未安装 pypinyin 时返回空字符串"""
+    if lazy_pinyin is None or not text:
+        return ''
+    return ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER, errors='default')).lower()
+
+
+def index_keys(text):
+    """为一段文本生成索引关键字"""
+    text = normalize(text)
+    if not text:
+        return set()
+    keys = {text}
+    # 每个词开头的后缀，使“2024 期末 试卷”可以通过“期末”“试卷”检索
+    for match in _WORD_BOUNDARY.finditer(text):
+        suffix = text[match.end():]
+        if suffix:
+            keys.add(suffix)
+    initials = pinyin_initials(text)
+    if initials and initials != text:
+        keys.add(initials)
+    return keys
+
+
+def author_keys(name, username):
+    """作者同时可按姓名和用户名检索"""
+    return index_keys(name) | index_keys(username)
+
+
+class PrefixIndex:
+    """有序数组前缀索引，索引项为 (关键字, 类型, ID)"""
+
+    def __init__(self):
+        self._entries = []
+        self._keys_by_item = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, kind, ident, keys):
+        self.remove(kind, ident)
+        for key in keys:
+            bisect.insort(self._entries, (key, kind, ident))
+        self._keys_by_item[(kind, ident)] = keys
+
+    def remove(self, kind, ident):
+        for key in self._keys_by_item.pop((kind, ident), ()):
+            entry = (key, kind, ident)
+            position = bisect.bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+
+    def load(self, items):
+        """批量载入 [(类型, ID, 关键字集合)]，一次排序，比逐条插入快得多"""
+        entries = []
+        keys_by_item = {}
+        for kind, ident, keys in items:
+            keys_by_item[(kind, ident)] = keys
+            entries.extend((key, kind, ident) for key in keys)
+        entries.sort()
+        self._entries = entries
+        self._keys_by_item = keys_by_item
+
+    def iter_prefix(self, prefix):
+        position = bisect.bisect_left(self._entries, (prefix,))
+        entries = self._entries
+        while position < len(entries) and entries[position][0].startswith(prefix):
+            yield entries[position]
+            position += 1
+
+
+class AutocompleteIndex:
+    """单个工作进程内的联想索引"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()  # 后台预热和请求同时触发时只构建一次
+        self.index = PrefixIndex()
+        self.documents = {}  # id -> (标题, 作者ID, 是否公开)
+        self.categories = {}  # id -> (名称, 创建人ID, 是否管理员创建)
+        self.authors = {}  # id -> (显示名称, 用户名)
+        self.public_counts = {}  # 作者ID -> 公开文档数
+        self.built = False
+        self.generation = None
+        self.synced_at = None
+        self.checked_at = 0
+
+    # 构建与同步
+
+    def rebuild(self):
+        from django.contrib.auth import get_user_model
+        from .models import Document
+
+        User = get_user_model()
+        started = time.time()
+        generation = cache.get(GENERATION_KEY)
+
+        documents = {
+            pk: (title, author_id, is_public)
+            for pk, title, author_id, is_public in Document.objects.values_list(
+                'id', 'title', 'author_id', 'is_public'
+            ).iterator(chunk_size=5000)
+        }
+        categories = self._load_categories()
+        authors = {
+            user.pk: (user.get_full_name() or user.username, user.username)
+            for user in User.objects.annotate(
+                document_count=Count('authored_documents')
+            ).filter(document_count__gt=0).only('id', 'username', 'first_name', 'last_name')
+        }
+
+        items = [(KIND_DOCUMENT, pk, index_keys(title)) for pk, (title, _, _) in documents.items()]
+        items += [(KIND_CATEGORY, pk, index_keys(name)) for pk, (name, _, _) in categories.items()]
+        items += [(KIND_AUTHOR, pk, author_keys(*names)) for pk, names in authors.items()]
+
+        public_counts = {}
+        for _, author_id, is_public in documents.values():
+            if is_public:
+                public_counts[author_id] = public_counts.get(author_id, 0) + 1
+
+        index = PrefixIndex()
+        index.load(items)
+
+        with self.lock:
+            self.index = index
+            self.documents = documents
+            self.categories = categories
+            self.authors = authors
+            self.public_counts = public_counts
+            self.built = True
+            self.generation = generation
+            self.synced_at = started
+            self.checked_at = time.time()
+
+    def _load_categories(self):
+        """分类数量很少，同步时直接全部重新读取"""
+        from .models import DocumentCategory
+
+        return {
+            row['id']: (
+                row['name'],
+                row['created_by_id'],
+                bool(row['created_by__is_superuser'] or row['created_by__role'] == 'admin'),
+            )
+            for row in DocumentCategory.objects.filter(is_active=True).values(
+                'id', 'name', 'created_by_id', 'created_by__is_superuser', 'created_by__role'
+            )
+        }
+
+    def ensure_fresh(self):
+        """首次使用时构建；之后定期检查其他进程的修改并增量同步"""
+        if not self.built:
+            with self.build_lock:
+                if not self.built:
+                    self.rebuild()
+            return
+        now = time.time()
+        if now - self.checked_at < SYNC_CHECK_INTERVAL:
+            return
+        self.checked_at = now
+        generation = cache.get(GENERATION_KEY)
+        if generation == self.generation:
+            return
+        self._sync_changes(generation)
+
+    def _sync_changes(self, generation):
+        from datetime import datetime, timezone as dt_timezone
+        from .models import Document
+
+        since = datetime.fromtimestamp(self.synced_at - 1, tz=dt_timezone.utc)
+        started = time.time()
+        for document in Document.objects.filter(updated_at__gte=since).select_related('author').only(
+            'id', 'title', 'author_id', 'is_public',
+            'author__username', 'author__first_name', 'author__last_name'
+        ):
+            self.update_document(
+                document.pk, document.title, document.author_id, document.is_public,
+                author=document.author
+            )
+
+        # 删除无法增量感知，数量不一致时整体重建
+        if Document.objects.count() != len(self.documents):
+            self.rebuild()
+            return
+
+        categories = self._load_categories()
+        with self.lock:
+            for pk in set(self.categories) - set(categories):
+                self.remove_category(pk)
+            for pk, (name, created_by_id, admin_created) in categories.items():
+                if self.categories.get(pk) != (name, created_by_id, admin_created):
+                    self.update_category(pk, name, created_by_id, admin_created, True)
+            self.generation = generation
+            self.synced_at = started
+
+    # 增量更新（信号调用）
+
+    def update_document(self, pk, title, author_id, is_public, author=None):
+        with self.lock:
+            if author is not None:
+                names = (author.get_full_name() or author.username, author.username)
+                if self.authors.get(author_id) != names:
+                    self.authors[author_id] = names
+                    self.index.add(KIND_AUTHOR, author_id, author_keys(*names))
+            old = self.documents.get(pk)
+            if old and old[2]:
+                self.public_counts[old[1]] -= 1
+            self.documents[pk] = (title, author_id, is_public)
+            if is_public:
+                self.public_counts[author_id] = self.public_counts.get(author_id, 0) + 1
+            self.index.add(KIND_DOCUMENT, pk, index_keys(title))
+
+    def remove_document(self, pk):
+        with self.lock:
+            old = self.documents.pop(pk, None)
+            if old and old[2]:
+                self.public_counts[old[1]] -= 1
+            self.index.remove(KIND_DOCUMENT, pk)
+
+    def update_category(self, pk, name, created_by_id, admin_created, is_active):
+        with self.lock:
+            if not is_active:
+                self.remove_category(pk)
+                return
+            self.categories[pk] = (name, created_by_id, admin_created)
+            self.index.add(KIND_CATEGORY, pk, index_keys(name))
+
+    def remove_category(self, pk):
+        with self.lock:
+            self.categories.pop(pk, None)
+            self.index.remove(KIND_CATEGORY, pk)
+
+    # 查询
+
+    def search(self, user, query, limit=10):
+        """返回用户可见的联想结果"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self.ensure_fresh()
+
+        is_admin = user.is_superuser or user.is_admin()
+        results = []
+        seen = set()
+        with self.lock:
+            for scanned, (_, kind, ident) in enumerate(self.index.iter_prefix(prefix)):
+                if scanned >= MAX_SCAN or len(results) >= limit:
+                    break
+                if (kind, ident) in seen:
+                    continue
+                result = self._visible_result(user, is_admin, kind, ident)
+                if result is not None:
+                    seen.add((kind, ident))
+                    results.append(result)
+        return results
+
+    def _visible_result(self, user, is_admin, kind, ident):
+        if kind == KIND_DOCUMENT:
+            title, author_id, is_public = self.documents[ident]
+            if is_public or author_id == user.pk:
+                return {'type': kind, 'id': ident, 'text': title}
+        elif kind == KIND_CATEGORY:
+            name, created_by_id, admin_created = self.categories[ident]
+            if is_admin or admin_created or created_by_id == user.pk:
+                return {'type': kind, 'id': ident, 'text': name}
+        elif kind == KIND_AUTHOR:
+            if ident == user.pk or self.public_counts.get(ident, 0) > 0:
+                name, username = self.authors[ident]
+                return {'type': kind, 'id': ident, 'text': name, 'username': username}
+        return None
+
+
+_index = AutocompleteIndex()
+
+
+def get_index():
+    return _index
+
+
+def warm_up():
+    """在后台线程中构建本进程的索引，第一个联想请求不必等待整表构建（最多等待正在进行的构建完成）
+
+    内存中的 SQLite 数据库（测试）不支持多个连接同时读写，不预热，仍在首次使用时构建。
+    """
+    if _index.built or (connection.vendor == 'sqlite' and connection.is_in_memory_db()):
+        return
+    threading.Thread(target=_warm_up, name='autocomplete-warm-up', daemon=True).start()
+
+
+def _warm_up():
+    try:
+        _index.ensure_fresh()
+    except DatabaseError:
+        logger.warning('预热联想索引失败，将在首次使用时构建', exc_info=True)
+    finally:
+        connection.close()
+
+
+def bump_generation():
+    """通知其他工作进程索引已过期"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def autocomplete(user, query, limit=10):
+    return _index.search(user, query, limit)
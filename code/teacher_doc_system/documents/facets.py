@@ -0,0 +1,81 @@
+"""文档列表筛选项统计（分面计数）
+
+可见文档 = 公开文档 ∪ 自己的文档，因此拆成两部分分别缓存：
+- 公开文档的统计，所有用户共享一份；
+- 自己的非公开文档的统计，按用户缓存。
+两部分相加即为该用户可见文档的统计，文档增删改时由信号清除对应缓存。
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+
+from .models import Document
+
+FACET_CACHE_TIMEOUT = 10 * 60  # 10分钟，兜底多进程本地缓存的失效延迟
+PUBLIC_FACETS_KEY = 'documents:facets:public'
+USER_FACETS_KEY = 'documents:facets:user:{user_id}'
+
+FACET_FIELDS = ('file_type', 'status', 'category', 'year')
+
+
+def _count_facets(queryset):
+    """一次 GROUP BY 查询统计四个维度"""
+    rows = queryset.annotate(year=ExtractYear('created_at')).values(
+        'file_type', 'status', 'category_id', 'year'
+    ).annotate(count=Count('id')).order_by()
+
+    facets = {field: Counter() for field in FACET_FIELDS}
+    for row in rows:
+        facets['file_type'][row['file_type']] += row['count']
+        facets['status'][row['status']] += row['count']
+        facets['category'][row['category_id']] += row['count']
+        facets['year'][row['year']] += row['count']
+    return {field: dict(counter) for field, counter in facets.items()}
+
+
+def _get_public_facets():
+    facets = cache.get(PUBLIC_FACETS_KEY)
+    if facets is None:
+        facets = _count_facets(Document.objects.filter(is_public=True))
+        cache.set(PUBLIC_FACETS_KEY, facets, FACET_CACHE_TIMEOUT)
+    return facets
+
+
+def _get_user_facets(user_id):
+    key = USER_FACETS_KEY.format(user_id=user_id)
+    facets = cache.get(key)
+    if facets is None:
+        facets = _count_facets(Document.objects.filter(author_id=user_id, is_public=False))
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
+
+
+def get_document_facets(user):
+    """返回用户可见文档按文件类型、状态、分类、年份的计数
+
+    返回值形如 {'file_type': {'pdf': 3}, 'status': {...}, 'category': {分类ID: 数量}, 'year': {2025: 5}}
+    """
+    public_facets = _get_public_facets()
+    user_facets = _get_user_facets(user.pk)
+
+    facets = {}
+    for field in FACET_FIELDS:
+        merged = Counter(public_facets.get(field, {}))
+        merged.update(user_facets.get(field, {}))
+        facets[field] = dict(merged)
+    return facets
+
+
+def has_private_documents(user):
+    """用户是否有非公开文档（复用私有部分的分面缓存）"""
+    return any(_get_user_facets(user.pk)['status'].values())
+
+
+def invalidate_document_facets(author_id=None):
+    """清除分面缓存（公开部分 + 指定作者的私有部分）"""
+    keys = [PUBLIC_FACETS_KEY]
+    if author_id is not None:
+        keys.append(USER_FACETS_KEY.format(user_id=author_id))
+    cache.delete_many(keys)
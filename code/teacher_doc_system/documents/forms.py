@@ -310,12 +310,20 @@ class DocumentSearchForm(forms.Form):
     )
     
     def __init__(self, *args, **kwargs):
+        # 可选传入分面统计（documents.facets），避免再次对全表做 DISTINCT 查询
+        facets = kwargs.pop('facets', None)
         super().__init__(*args, **kwargs)
         
         # 动态设置文件类型选项
-        from .models import Document
-        file_types = Document.objects.values_list('file_type', flat=True).distinct()
-        self.fields['file_type'].choices = [('', '所有类型')] + [(t, t.upper()) for t in file_types]
+        if facets is not None:
+            file_types = sorted(facets['file_type'].items(), key=lambda item: (-item[1], item[0]))
+            self.fields['file_type'].choices = [('', '所有类型')] + [
+                (t, f'{t.upper()} ({count})') for t, count in file_types
+            ]
+        else:
+            from .models import Document
+            file_types = Document.objects.values_list('file_type', flat=True).distinct()
+            self.fields['file_type'].choices = [('', '所有类型')] + [(t, t.upper()) for t in file_types]
     
     def clean(self):
         cleaned_data = super().clean()
@@ -0,0 +1,61 @@
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from documents.autocomplete import AutocompleteIndex, KIND_DOCUMENT, index_keys
+
+WORDS = [
+    '期末', '考试', '试卷', '教学', '大纲', '课件', '实验', '报告', '科研', '项目',
+    '申报', '总结', '计划', '高等数学', '线性代数', '软件工程', '数据库', '操作系统',
+    'python', 'java', 'lecture', 'notes', 'homework', 'syllabus', '2023', '2024',
+]
+
+
+class Command(BaseCommand):
+    help = '在内存中构建合成标题的联想索引，测试构建耗时和查询延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=200000, help='合成标题数量（默认200000）')
+        parser.add_argument('--queries', type=int, default=5000, help='查询次数（默认5000）')
+        parser.add_argument('--authors', type=int, default=500, help='作者数量（默认500）')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        authors = options['authors']
+
+        documents = {}
+        items = []
+        for pk in range(1, options['titles'] + 1):
+            title = ' '.join(rng.sample(WORDS, rng.randint(2, 5))) + f' {pk}'
+            documents[pk] = (title, rng.randint(1, authors), rng.random() < 0.5)
+            items.append((KIND_DOCUMENT, pk, index_keys(title)))
+
+        started = time.perf_counter()
+        index = AutocompleteIndex()
+        index.index.load(items)
+        index.documents = documents
+        index.built = True
+        index.checked_at = float('inf')  # 不访问缓存和数据库
+        build_ms = (time.perf_counter() - started) * 1000
+
+        user = SimpleNamespace(pk=1, is_superuser=False, is_admin=lambda: False)
+        prefixes = [rng.choice(WORDS)[:rng.randint(1, 3)] for _ in range(options['queries'])]
+
+        times = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            index.search(user, prefix)
+            times.append((time.perf_counter() - started) * 1000)
+
+        ordered = sorted(times)
+        p50 = statistics.median(ordered)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        self.stdout.write(
+            f'标题 {len(documents)} 个，索引项 {len(index.index)} 个，排序耗时 {build_ms:.0f} ms'
+        )
+        self.stdout.write(f'查询 {len(times)} 次: P50 {p50:.3f} ms，P99 {p99:.3f} ms，最大 {ordered[-1]:.3f} ms')
+        style = self.style.SUCCESS if p99 < 5 else self.style.WARNING
+        self.stdout.write(style(f'P99 {"低于" if p99 < 5 else "超过"} 5 ms'))
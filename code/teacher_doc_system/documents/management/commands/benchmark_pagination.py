@@ -0,0 +1,115 @@
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import QueryDict
+
+from documents.management.utils import get_command_user
+from documents.models import Document
+from documents.pagination import CursorPaginator
+from documents.queries import visibility_q
+
+
+class Command(BaseCommand):
+    help = '对比文档列表深翻页时 OFFSET 分页与游标分页的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='以该用户名的可见范围查询（默认第一个教师）')
+        parser.add_argument('--page', type=int, default=1000, help='测试的页码（默认1000）')
+        parser.add_argument('--page-size', type=int, default=20, help='每页条数（默认20）')
+        parser.add_argument('--repeat', type=int, default=5, help='每种方式重复次数（默认5）')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='临时生成指定数量的测试文档，测试结束后回滚'
+        )
+
+    def handle(self, *args, **options):
+        page = options['page']
+        page_size = options['page_size']
+        repeat = options['repeat']
+
+        user = get_command_user(options['user'])
+
+        with transaction.atomic():
+            if options['seed']:
+                self._seed(user, options['seed'])
+
+            queryset = Document.objects.filter(visibility_q(user)).select_related('author', 'category')
+
+            offset = (page - 1) * page_size
+            boundary = list(
+                queryset.order_by('-created_at', '-pk').values_list('created_at', 'pk')[offset - 1:offset]
+            ) if offset else []
+            if offset and not boundary:
+                raise CommandError(f'可见文档不足 {page} 页，请使用 --seed 生成测试数据')
+
+            offset_times = self._measure(lambda: self._offset_page(queryset, page, page_size), repeat)
+
+            # 定位第 page 页的游标（准备工作，不计入耗时）
+            token = None
+            if boundary:
+                created_at, pk = boundary[0]
+                paginator = CursorPaginator(queryset, page_size)
+                paginator.count, paginator.count_is_estimate = queryset.count(), False
+                token = paginator.make_cursor(SimpleNamespace(created_at=created_at, pk=pk), 'next', page)
+
+            cursor_times = self._measure(
+                lambda: list(CursorPaginator(queryset, page_size).page(token, QueryDict()).object_list),
+                repeat
+            )
+
+            if options['seed']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(f'用户: {user.username}，第 {page} 页，每页 {page_size} 条，重复 {repeat} 次')
+        self._report('OFFSET 分页', offset_times)
+        self._report('游标分页', cursor_times)
+
+        offset_median = statistics.median(offset_times)
+        cursor_median = statistics.median(cursor_times)
+        if cursor_median > 0:
+            self.stdout.write(self.style.SUCCESS(f'中位数加速比: {offset_median / cursor_median:.1f}x'))
+
+    def _seed(self, user, count):
+        """批量生成测试文档（在外层事务中，结束后回滚）"""
+        batch_size = 1000
+        prefix = f'bench-{int(time.time())}'
+        for start in range(0, count, batch_size):
+            Document.objects.bulk_create([
+                Document(
+                    title=f'测试文档 {i}',
+                    file=f'user_files/bench/{i}.pdf',
+                    file_size=1024,
+                    file_type='pdf',
+                    file_hash=f'{prefix}-{i}',
+                    author=user,
+                    status='published',
+                    is_public=bool(i % 2),
+                )
+                for i in range(start, min(start + batch_size, count))
+            ])
+        self.stdout.write(f'已生成 {count} 个测试文档')
+
+    def _offset_page(self, queryset, page, page_size):
+        """原有方式：COUNT(*) + OFFSET"""
+        paginator = Paginator(queryset.order_by('-created_at'), page_size)
+        return list(paginator.page(page).object_list)
+
+    def _measure(self, func, repeat):
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            times.append((time.perf_counter() - started) * 1000)
+        return times
+
+    def _report(self, label, times):
+        ordered = sorted(times)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        self.stdout.write(
+            f'{label}: 中位数 {statistics.median(times):.2f} ms，'
+            f'P95 {p95:.2f} ms，最小 {ordered[0]:.2f} ms'
+        )
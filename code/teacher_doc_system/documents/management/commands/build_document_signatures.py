@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from documents.models import Document
+from documents.similarity import compute_document_signature, signature_is_stale
+
+
+class Command(BaseCommand):
+    help = '为文档计算近似重复检测用的 MinHash 签名（默认只处理缺失或文件已变化的文档）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='重新计算所有文档的签名')
+
+    def handle(self, *args, **options):
+        computed = 0
+        skipped = 0
+        documents = Document.objects.select_related('signature').order_by('pk')
+        for document in documents.iterator(chunk_size=500):
+            if not options['rebuild'] and not signature_is_stale(document):
+                skipped += 1
+                continue
+            compute_document_signature(document)
+            computed += 1
+            if computed % 100 == 0:
+                self.stdout.write(f'已计算 {computed} 个文档')
+
+        self.stdout.write(self.style.SUCCESS(f'签名计算完成：计算 {computed} 个，跳过 {skipped} 个'))
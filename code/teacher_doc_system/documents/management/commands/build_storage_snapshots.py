@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.snapshots import rebuild_user_snapshots
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = '按现有文档回填用户每日存储快照（会覆盖已有快照）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='只处理该用户名的快照（默认所有有文档的用户）')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            users = User.objects.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f'用户不存在: {options["user"]}')
+        else:
+            users = User.objects.filter(authored_documents__isnull=False).distinct()
+
+        total = 0
+        for user in users.order_by('pk'):
+            count = rebuild_user_snapshots(user.pk)
+            total += count
+            self.stdout.write(f'{user.username}: {count} 条快照')
+
+        self.stdout.write(self.style.SUCCESS(f'回填完成，共写入 {total} 条快照'))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from documents.management.utils import get_command_user
+from documents.models import Document
+from documents.queries import DocumentQuery
+
+
+class Command(BaseCommand):
+    help = '输出文档列表常用筛选组合在当前数据库上的执行计划（OR 形式与 UNION 形式对比）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='以该用户名的可见范围查询（默认第一个教师）')
+        parser.add_argument('--page-size', type=int, default=20, help='每页条数（默认20）')
+
+    def handle(self, *args, **options):
+        user = get_command_user(options['user'])
+        limit = options['page_size'] + 1
+
+        sample = Document.objects.order_by('-created_at').values('category_id', 'file_type', 'created_at').first() or {}
+        sample_date = sample['created_at'].date().isoformat() if sample.get('created_at') else '2025-01-01'
+
+        combinations = [
+            ('无筛选', {}),
+            ('按状态', {'status': 'published'}),
+            ('按分类', {'category': str(sample.get('category_id') or 1)}),
+            ('按文件类型', {'file_type': sample.get('file_type') or 'pdf'}),
+            ('按日期范围', {'date_from': sample_date, 'date_to': sample_date}),
+            ('状态 + 分类', {'status': 'published', 'category': str(sample.get('category_id') or 1)}),
+            ('仅我的文档', {'my_docs_only': 'true'}),
+            ('关键词搜索', {'search': '课件'}),
+        ]
+
+        self.stdout.write(f'数据库: {connection.vendor}，用户: {user.username}')
+        for label, params in combinations:
+            query = DocumentQuery(user, params)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {label} {params}'))
+            self.stdout.write(f'自动选择: {"UNION" if query.should_use_union() else "OR"}')
+
+            or_queryset = query.queryset().order_by('-created_at', '-id')[:limit]
+            self.stdout.write(self.style.SUCCESS('-- OR 形式'))
+            self.stdout.write(self._explain(or_queryset))
+
+            if not query.my_docs_only:
+                union_queryset = query.union_queryset(limit=limit)
+                self.stdout.write(self.style.SUCCESS('-- UNION 形式'))
+                self.stdout.write(self._explain(union_queryset))
+
+    def _explain(self, queryset):
+        try:
+            return queryset.explain()
+        except Exception as e:
+            return f'无法获取执行计划: {e}'
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from documents.rollups import reset_rollups, rollup_operation_logs
+
+
+class Command(BaseCommand):
+    help = '把文档操作日志增量汇总到小时/天汇总表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='清空汇总表后从第一条日志重新汇总')
+        parser.add_argument('--batch-size', type=int, default=5000, help='每批处理的日志条数')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            reset_rollups()
+            self.stdout.write('已清空汇总表')
+
+        processed = rollup_operation_logs(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'汇总完成，本次处理 {processed} 条日志'))
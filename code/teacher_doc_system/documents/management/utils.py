@@ -0,0 +1,17 @@
+"""文档相关管理命令共用的辅助函数"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+
+def get_command_user(username=None):
+    """命令以其可见范围查询的用户：指定用户名时使用该用户，否则使用第一个教师"""
+    User = get_user_model()
+    if username:
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'用户不存在: {username}')
+    user = User.objects.filter(role='teacher').order_by('pk').first()
+    if user is None:
+        raise CommandError('没有可用的教师用户，请使用 --user 指定')
+    return user
@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-19 07:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSignature',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='documents.document', verbose_name='关联文档')),
+                ('minhash', models.BinaryField(verbose_name='MinHash签名')),
+                ('shingle_count', models.PositiveIntegerField(default=0, verbose_name='文本分片数')),
+                ('source_file', models.CharField(max_length=255, verbose_name='计算时的文件')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='计算时间')),
+            ],
+            options={
+                'verbose_name': '文档签名',
+                'verbose_name_plural': '文档签名',
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='分段序号')),
+                ('bucket', models.BigIntegerField(verbose_name='桶哈希值')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='documents.document', verbose_name='关联文档')),
+            ],
+            options={
+                'verbose_name': '文档LSH桶',
+                'verbose_name_plural': '文档LSH桶',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='documentlshbucket',
+            index=models.Index(fields=['band', 'bucket'], name='documents_d_band_1d7331_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='documentlshbucket',
+            unique_together={('document', 'band')},
+        ),
+    ]
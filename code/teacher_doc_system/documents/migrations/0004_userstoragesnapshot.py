@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-19 07:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0003_documentsignature_documentlshbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStorageSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('total_bytes', models.BigIntegerField(default=0, verbose_name='文档总大小(字节)')),
+                ('document_count', models.PositiveIntegerField(default=0, verbose_name='文档数')),
+                ('public_count', models.PositiveIntegerField(default=0, verbose_name='公开文档数')),
+                ('status_counts', models.JSONField(default=dict, verbose_name='按状态统计')),
+                ('type_counts', models.JSONField(default=dict, verbose_name='按类型统计')),
+                ('category_counts', models.JSONField(default=dict, verbose_name='按分类统计')),
+                ('upload_count', models.PositiveIntegerField(default=0, verbose_name='当天上传数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='storage_snapshots', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '用户存储快照',
+                'verbose_name_plural': '用户存储快照',
+                'ordering': ['-date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
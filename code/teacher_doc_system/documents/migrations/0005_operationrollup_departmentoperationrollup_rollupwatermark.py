@@ -0,0 +1,69 @@
+# Generated by Django 4.2 on 2026-10-19 07:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0004_userstoragesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='任务名称')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='已处理的最大ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '汇总进度',
+                'verbose_name_plural': '汇总进度',
+            },
+        ),
+        migrations.CreateModel(
+            name='OperationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', '小时'), ('day', '天')], max_length=10, verbose_name='汇总粒度')),
+                ('bucket_start', models.DateTimeField(verbose_name='时间段开始')),
+                ('operation', models.CharField(choices=[('create', '创建'), ('update', '更新'), ('delete', '删除'), ('download', '下载'), ('view', '查看'), ('star', '星标'), ('archive', '归档'), ('publish', '发布')], max_length=20, verbose_name='操作类型')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='次数')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operation_rollups', to='documents.document', verbose_name='关联文档')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='operation_rollups', to=settings.AUTH_USER_MODEL, verbose_name='操作人')),
+            ],
+            options={
+                'verbose_name': '文档操作汇总',
+                'verbose_name_plural': '文档操作汇总',
+            },
+        ),
+        migrations.CreateModel(
+            name='DepartmentOperationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', '小时'), ('day', '天')], max_length=10, verbose_name='汇总粒度')),
+                ('bucket_start', models.DateTimeField(verbose_name='时间段开始')),
+                ('department', models.CharField(blank=True, max_length=100, verbose_name='部门')),
+                ('operation', models.CharField(choices=[('create', '创建'), ('update', '更新'), ('delete', '删除'), ('download', '下载'), ('view', '查看'), ('star', '星标'), ('archive', '归档'), ('publish', '发布')], max_length=20, verbose_name='操作类型')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='次数')),
+            ],
+            options={
+                'verbose_name': '部门操作汇总',
+                'verbose_name_plural': '部门操作汇总',
+                'unique_together': {('granularity', 'bucket_start', 'department', 'operation')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='operationrollup',
+            index=models.Index(fields=['granularity', 'operation', 'bucket_start'], name='documents_o_granula_250b2c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operationrollup',
+            index=models.Index(fields=['user', 'granularity', 'bucket_start'], name='documents_o_user_id_4be012_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-19 07:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_operationrollup_departmentoperationrollup_rollupwatermark'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentoperationlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='操作时间'),
+        ),
+    ]
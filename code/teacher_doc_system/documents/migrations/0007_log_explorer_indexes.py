@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-19 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_audit_log_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentoperationlog',
+            index=models.Index(fields=['user', 'created_at'], name='documents_d_user_id_f096e7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentoperationlog',
+            index=models.Index(fields=['created_at'], name='documents_d_created_6facad_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_log_explorer_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentoperationlog',
+            name='event_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='次数'),
+        ),
+        migrations.AddField(
+            model_name='documentoperationlog',
+            name='last_event_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最后一次操作时间'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 # documents/models.py
 from django.db import models
+from django.db.models import Q
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -40,6 +43,17 @@ class DocumentCategory(models.Model):
         if self.parent:
             return f"{self.parent.full_path}→{self.name}"
         return self.name
+
+    @classmethod
+    def visible_to(cls, user):
+        """用户可选择的启用分类：管理员可见全部，教师可见管理员创建的和自己创建的"""
+        queryset = cls.objects.filter(is_active=True)
+        if user.is_superuser or user.is_admin():
+            return queryset
+        # 通过关联条件过滤，避免先查询管理员用户列表再做子查询
+        return queryset.filter(
+            Q(created_by__is_superuser=True) | Q(created_by__role='admin') | Q(created_by=user)
+        )
     
     # documents/models.py
 class Document(models.Model):
@@ -158,7 +172,13 @@ class DocumentOperationLog(models.Model):
     operation = models.CharField(max_length=20, choices=OPERATION_CHOICES, verbose_name="操作类型")
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name="操作IP")  # 记录操作来源
     details = models.JSONField(blank=True, null=True, verbose_name="操作详情")  # 存储额外信息（如旧状态→新状态）
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="操作时间")
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name="操作时间")  # 异步写入时保留记录产生的时间
+    # 合并记录：同一用户短时间内对同一文档的重复操作（如反复刷新查看）合并为一条
+    event_count = models.PositiveIntegerField(default=1, verbose_name="次数")
+    last_event_at = models.DateTimeField(null=True, blank=True, verbose_name="最后一次操作时间")
+
+    # 审计需要逐条记录的操作，不参与合并
+    EXACT_OPERATIONS = ('create', 'delete', 'download')
 
     class Meta:
         verbose_name = "文档操作日志"
@@ -166,5 +186,145 @@ class DocumentOperationLog(models.Model):
         indexes = [
             models.Index(fields=['user', 'operation']),  # 按用户查询操作记录
             models.Index(fields=['document', 'created_at']),  # 按文档查询历史操作
+            models.Index(fields=['user', 'created_at']),  # 日志查询按用户筛选
+            models.Index(fields=['created_at']),  # 日志查询按时间分页、日志归档
         ]
-        ordering = ['-created_at']  # 默认显示最新操作
\ No newline at end of file
+        ordering = ['-created_at']  # 默认显示最新操作
+
+    @classmethod
+    def coalesce_window(cls, operation):
+        """该操作的合并窗口（秒），不合并时返回 None"""
+        if operation in cls.EXACT_OPERATIONS:
+            return None
+        return getattr(settings, 'DOCUMENT_LOG_COALESCE_WINDOWS', {}).get(operation)
+
+
+class DocumentSignature(models.Model):
+    """文档内容的 MinHash 签名（用于近似重复检测）"""
+    document = models.OneToOneField(
+        Document,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name="关联文档"
+    )
+    minhash = models.BinaryField(verbose_name="MinHash签名")  # NUM_PERM 个 32 位无符号整数
+    shingle_count = models.PositiveIntegerField(default=0, verbose_name="文本分片数")  # 0 表示未能提取文本
+    source_file = models.CharField(max_length=255, verbose_name="计算时的文件")  # 文件替换后需要重新计算
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="计算时间")
+
+    class Meta:
+        verbose_name = "文档签名"
+        verbose_name_plural = "文档签名"
+
+    def __str__(self):
+        return f"{self.document_id} - {self.shingle_count}"
+
+
+class DocumentLSHBucket(models.Model):
+    """MinHash 分段（LSH band）桶：同一分段落入同一桶的文档为相似候选"""
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='lsh_buckets',
+        verbose_name="关联文档"
+    )
+    band = models.PositiveSmallIntegerField(verbose_name="分段序号")
+    bucket = models.BigIntegerField(verbose_name="桶哈希值")
+
+    class Meta:
+        verbose_name = "文档LSH桶"
+        verbose_name_plural = "文档LSH桶"
+        unique_together = ('document', 'band')
+        indexes = [
+            models.Index(fields=['band', 'bucket']),  # 按桶查找候选文档
+        ]
+
+
+class UserStorageSnapshot(models.Model):
+    """用户每日存储快照（当天结束时的累计状态，只在有变化的日期写入，缺失的日期沿用之前的快照）"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='storage_snapshots',
+        verbose_name="用户"
+    )
+    date = models.DateField(verbose_name="日期")
+    total_bytes = models.BigIntegerField(default=0, verbose_name="文档总大小(字节)")
+    document_count = models.PositiveIntegerField(default=0, verbose_name="文档数")
+    public_count = models.PositiveIntegerField(default=0, verbose_name="公开文档数")
+    status_counts = models.JSONField(default=dict, verbose_name="按状态统计")  # 如 {"published": 3}
+    type_counts = models.JSONField(default=dict, verbose_name="按类型统计")  # 如 {"pdf": 2}
+    category_counts = models.JSONField(default=dict, verbose_name="按分类统计")  # 键为分类ID，未分类为 "none"
+    upload_count = models.PositiveIntegerField(default=0, verbose_name="当天上传数")  # 不累计
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "用户存储快照"
+        verbose_name_plural = "用户存储快照"
+        unique_together = ('user', 'date')
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.user} - {self.date}"
+
+
+class OperationRollup(models.Model):
+    """文档操作日志按小时/天汇总（键为 文档 + 用户 + 操作类型）"""
+    GRANULARITY_CHOICES = (
+        ('hour', '小时'),
+        ('day', '天'),
+    )
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES, verbose_name="汇总粒度")
+    bucket_start = models.DateTimeField(verbose_name="时间段开始")  # 本地时间整点/零点
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='operation_rollups',
+        verbose_name="关联文档"
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='operation_rollups',
+        verbose_name="操作人"
+    )
+    operation = models.CharField(max_length=20, choices=DocumentOperationLog.OPERATION_CHOICES, verbose_name="操作类型")
+    count = models.PositiveIntegerField(default=0, verbose_name="次数")
+
+    class Meta:
+        verbose_name = "文档操作汇总"
+        verbose_name_plural = "文档操作汇总"
+        indexes = [
+            models.Index(fields=['granularity', 'operation', 'bucket_start']),  # 热门文档排行
+            models.Index(fields=['user', 'granularity', 'bucket_start']),  # 用户近期操作数
+        ]
+
+
+class DepartmentOperationRollup(models.Model):
+    """文档操作日志按部门汇总（键为 部门 + 操作类型）"""
+    granularity = models.CharField(max_length=10, choices=OperationRollup.GRANULARITY_CHOICES, verbose_name="汇总粒度")
+    bucket_start = models.DateTimeField(verbose_name="时间段开始")
+    department = models.CharField(max_length=100, blank=True, verbose_name="部门")  # 空字符串表示未设置部门
+    operation = models.CharField(max_length=20, choices=DocumentOperationLog.OPERATION_CHOICES, verbose_name="操作类型")
+    count = models.PositiveIntegerField(default=0, verbose_name="次数")
+
+    class Meta:
+        verbose_name = "部门操作汇总"
+        verbose_name_plural = "部门操作汇总"
+        unique_together = ('granularity', 'bucket_start', 'department', 'operation')
+
+
+class RollupWatermark(models.Model):
+    """汇总任务的高水位（已处理到的最大日志ID）"""
+    name = models.CharField(max_length=50, unique=True, verbose_name="任务名称")
+    last_id = models.BigIntegerField(default=0, verbose_name="已处理的最大ID")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "汇总进度"
+        verbose_name_plural = "汇总进度"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
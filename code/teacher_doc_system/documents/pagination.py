@@ -0,0 +1,247 @@
+"""游标（键集）分页
+
+按 (排序字段, id) 倒序分页，翻页条件为 WHERE (字段, id) < (上一页最后一条)，
+深翻页不再需要 OFFSET 扫描；总数只在第一页统计一次并随游标传递。
+"""
+import math
+
+from django.core import signing
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'documents.cursor-pagination'
+
+
+def estimate_table_rows(model):
+    """读取数据库统计信息中的表行数估计值，不支持的数据库返回 None"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row and row[0] is not None and row[0] >= 0:
+        return int(row[0])
+    return None
+
+
+def count_queryset(queryset, limit):
+    """统计总数，返回 (总数, 是否为估计值)
+
+    最多统计 limit 条；超过时，无筛选条件的查询使用表统计信息估算，
+    否则返回 limit 并标记为估计值（显示为“超过 N 条”）。
+    """
+    bounded = queryset.order_by()[:limit + 1].count()
+    if bounded <= limit:
+        return bounded, False
+    if not queryset.query.where:
+        estimated = estimate_table_rows(queryset.model)
+        if estimated is not None and estimated > limit:
+            return estimated, True
+    return limit, True
+
+
+class CursorPage:
+    """游标分页的一页，接口与模板中常用的 page_obj 属性保持一致"""
+
+    def __init__(self, object_list, number, has_next, has_previous, paginator, query_params):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.paginator = paginator
+        self._query_params = query_params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _query_with(self, token):
+        params = self._query_params.copy()
+        params.pop(self.paginator.cursor_query_param, None)
+        params.pop('page', None)
+        if token:
+            params[self.paginator.cursor_query_param] = token
+        return params.urlencode()
+
+    @property
+    def first_query(self):
+        return self._query_with(None)
+
+    @property
+    def next_query(self):
+        last = self.object_list[-1]
+        next_number = self.number + 1 if self.number else None
+        return self._query_with(self.paginator.make_cursor(last, 'next', next_number))
+
+    @property
+    def previous_query(self):
+        first = self.object_list[0]
+        previous_number = self.number - 1 if self.number else None
+        return self._query_with(self.paginator.make_cursor(first, 'prev', previous_number))
+
+    @property
+    def last_query(self):
+        return self._query_with(self.paginator.make_cursor(None, 'last', self.paginator.num_pages))
+
+
+class CursorPaginator:
+    """基于 (cursor_field, pk) 的倒序游标分页器"""
+
+    def __init__(self, queryset, per_page, cursor_field='created_at',
+                 cursor_query_param='cursor', exact_count_limit=10000, fetch_rows=None, count_rows=None):
+        self.queryset = queryset
+        # 可选的取数函数 fetch_rows(condition, ordering, limit, keyset)，如 DocumentQuery.fetch；
+        # keyset 为游标边界 ('lt'/'gt', 游标值, pk)，供基于内存列表取数的实现使用
+        self.fetch_rows = fetch_rows
+        # 可选的计数函数 count_rows(limit)，返回 (总数, 是否为估计值)
+        self.count_rows = count_rows
+        self.per_page = per_page
+        self.cursor_field = cursor_field
+        self.cursor_query_param = cursor_query_param
+        self.exact_count_limit = exact_count_limit
+        self.count = None
+        self.count_is_estimate = False
+
+    @property
+    def num_pages(self):
+        """精确总数时返回总页数，估计值时返回 None"""
+        if self.count is None or self.count_is_estimate:
+            return None
+        return max(1, math.ceil(self.count / self.per_page))
+
+    @property
+    def total_display(self):
+        if self.count is None:
+            return ''
+        if not self.count_is_estimate:
+            return f'共 {self.count} 条'
+        if self.count > self.exact_count_limit:
+            return f'约 {self.count} 条'
+        return f'超过 {self.count} 条'
+
+    def make_cursor(self, obj, direction, number=None):
+        payload = {
+            'd': direction,
+            'n': number,
+            't': self.count,
+            'e': self.count_is_estimate,
+        }
+        if obj is not None:
+            payload['v'] = getattr(obj, self.cursor_field).isoformat()
+            payload['pk'] = obj.pk
+        return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+    def _decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            payload = signing.loads(token, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            # 游标无效或被篡改时回到第一页
+            return None
+        if payload.get('d') not in ('next', 'prev', 'last'):
+            return None
+        if payload['d'] != 'last':
+            payload['v'] = parse_datetime(payload.get('v') or '')
+            if payload['v'] is None or payload.get('pk') is None:
+                return None
+        return payload
+
+    def _fetch(self, condition, ordering, limit, keyset=None):
+        if self.fetch_rows is not None:
+            return self.fetch_rows(condition, ordering, limit, keyset)
+        queryset = self.queryset
+        if condition is not None:
+            queryset = queryset.filter(condition)
+        return list(queryset.order_by(*ordering)[:limit])
+
+    def page(self, token, query_params):
+        cursor = self._decode_cursor(token)
+        field = self.cursor_field
+        descending = (f'-{field}', '-pk')
+        ascending = (field, 'pk')
+
+        if cursor is None:
+            # 第一页：统计一次总数，之后随游标传递
+            if self.count_rows is not None:
+                self.count, self.count_is_estimate = self.count_rows(self.exact_count_limit)
+            else:
+                self.count, self.count_is_estimate = count_queryset(self.queryset, self.exact_count_limit)
+            rows = self._fetch(None, descending, self.per_page + 1)
+            has_next = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page], 1, has_next, False, self, query_params)
+
+        self.count = cursor.get('t')
+        self.count_is_estimate = bool(cursor.get('e'))
+        number = cursor.get('n')
+
+        if cursor['d'] == 'next':
+            after = Q(**{f'{field}__lt': cursor['v']}) | Q(**{field: cursor['v'], 'pk__lt': cursor['pk']})
+            rows = self._fetch(after, descending, self.per_page + 1, ('lt', cursor['v'], cursor['pk']))
+            if not rows:
+                # 游标之后的数据已被删除，回到第一页
+                return self.page(None, query_params)
+            has_next = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page], number, has_next, True, self, query_params)
+
+        if cursor['d'] == 'prev':
+            before = Q(**{f'{field}__gt': cursor['v']}) | Q(**{field: cursor['v'], 'pk__gt': cursor['pk']})
+            rows = self._fetch(before, ascending, self.per_page + 1, ('gt', cursor['v'], cursor['pk']))
+            if not rows:
+                return self.page(None, query_params)
+        else:
+            rows = self._fetch(None, ascending, self.per_page + 1)
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        if not has_previous:
+            number = 1
+        return CursorPage(rows, number, cursor['d'] == 'prev', has_previous, self, query_params)
+
+
+class CursorPaginationMixin:
+    """为 ListView 提供游标分页（替换默认的 OFFSET 分页和每页 COUNT）"""
+    cursor_field = 'created_at'
+    cursor_query_param = 'cursor'
+    exact_count_limit = 10000
+
+    def get_fetch_rows(self):
+        """子类可返回自定义取数函数（如走 UNION 的 DocumentQuery.fetch）"""
+        return None
+
+    def get_count_rows(self):
+        """子类可返回自定义计数函数（如从缓存的结果列表计数）"""
+        return None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(
+            queryset,
+            page_size,
+            cursor_field=self.cursor_field,
+            cursor_query_param=self.cursor_query_param,
+            exact_count_limit=self.exact_count_limit,
+            fetch_rows=self.get_fetch_rows(),
+            count_rows=self.get_count_rows(),
+        )
+        page = paginator.page(self.request.GET.get(self.cursor_query_param), self.request.GET)
+        return (paginator, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,147 @@
+"""文档查询构造器
+
+集中处理“自己的文档 + 公开文档”可见性条件和列表筛选参数：
+- 筛选参数（分类、状态、类型、日期、关键词）只解析一次；
+- 可见性条件 author=用户 OR is_public=True 会使 (author, status) 与 (is_public, status)
+  两个复合索引都无法使用，必要时拆成两个可走索引的分支再 UNION ALL。
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Document
+
+DEFAULT_SEARCH_FIELDS = ('title', 'description', 'author__first_name', 'author__last_name')
+
+
+def parse_date(value):
+    """解析 YYYY-MM-DD 日期，格式不正确时返回 None（忽略该筛选条件）"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def visibility_q(user):
+    """用户可见文档的条件：自己的文档 + 公开文档"""
+    return Q(author=user) | Q(is_public=True)
+
+
+class DocumentQuery:
+    """根据请求参数构造文档查询
+
+    用法：
+        query = DocumentQuery(user, request.GET)
+        queryset = query.queryset()          # OR 形式，可继续 filter/分页
+        rows = query.fetch(condition, ordering, limit)  # 分页取数，必要时走 UNION
+    """
+
+    # None 表示自动判断；True/False 强制使用/不使用 UNION
+    use_union = None
+
+    def __init__(self, user, params=None, search_fields=DEFAULT_SEARCH_FIELDS):
+        self.user = user
+        self.search_fields = search_fields
+        params = params or {}
+
+        self.search = (params.get('search') or '').strip()
+        self.status = params.get('status') or ''
+        self.file_type = params.get('file_type') or ''
+        self.my_docs_only = params.get('my_docs_only') == 'true'
+
+        try:
+            self.category_id = int(params.get('category') or 0) or None
+        except (TypeError, ValueError):
+            self.category_id = None
+
+        self.date_from = parse_date(params.get('date_from'))
+        self.date_to = parse_date(params.get('date_to'))
+
+    def filter_q(self):
+        """除可见性以外的筛选条件"""
+        condition = Q()
+        if self.category_id:
+            condition &= Q(category_id=self.category_id)
+        if self.status:
+            condition &= Q(status=self.status)
+        if self.file_type:
+            condition &= Q(file_type=self.file_type)
+        if self.date_from:
+            start = timezone.make_aware(datetime.combine(self.date_from, time.min))
+            condition &= Q(created_at__gte=start)
+        if self.date_to:
+            # 结束日期当天全天有效：created_at < 次日零点
+            end = timezone.make_aware(datetime.combine(self.date_to + timedelta(days=1), time.min))
+            condition &= Q(created_at__lt=end)
+        if self.search:
+            search_q = Q()
+            for field in self.search_fields:
+                search_q |= Q(**{f'{field}__icontains': self.search})
+            condition &= search_q
+        return condition
+
+    def base_queryset(self):
+        return Document.objects.select_related('author', 'category')
+
+    def queryset(self):
+        """OR 形式的完整查询"""
+        if self.my_docs_only:
+            visibility = Q(author=self.user)
+        else:
+            visibility = visibility_q(self.user)
+        return self.base_queryset().filter(visibility, self.filter_q())
+
+    def branches(self):
+        """拆分后的两个分支：自己的文档、他人的公开文档（互不重叠，可 UNION ALL）"""
+        base = Document.objects.filter(self.filter_q())
+        own = base.filter(author=self.user)
+        public = base.filter(is_public=True).exclude(author=self.user)
+        return own, public
+
+    def should_use_union(self):
+        """是否拆分为 UNION 查询
+
+        仅查自己的文档时没有 OR；关键词模糊搜索无法走索引，拆分没有收益。
+        MySQL 对跨列 OR 通常退化为全表扫描，其余数据库（PostgreSQL 位图合并、
+        SQLite 的 OR 优化）能直接处理 OR，默认不拆分。
+        """
+        if self.use_union is not None:
+            return self.use_union
+        if self.my_docs_only or self.search:
+            return False
+        return connection.vendor == 'mysql'
+
+    def union_queryset(self, condition=None, ordering=('-created_at', '-id'), limit=None):
+        """返回 UNION ALL 后的 (id, 排序字段) 查询"""
+        fields = ['id'] + [name.lstrip('-') for name in ordering if name.lstrip('-') != 'id']
+        parts = []
+        for branch in self.branches():
+            if condition is not None:
+                branch = branch.filter(condition)
+            branch = branch.values_list(*fields)
+            if limit is not None and connection.features.supports_slicing_ordering_in_compound:
+                # 每个分支各自按索引取前 limit 条，合并后再截取
+                branch = branch.order_by(*ordering)[:limit]
+            parts.append(branch)
+        combined = parts[0].union(parts[1], all=True).order_by(*ordering)
+        if limit is not None:
+            combined = combined[:limit]
+        return combined
+
+    def fetch(self, condition=None, ordering=('-created_at', '-id'), limit=None, keyset=None):
+        """按条件、排序取出文档对象列表（keyset 与 condition 等价，查询数据库时只使用 condition）"""
+        ordering = tuple('-id' if name == '-pk' else 'id' if name == 'pk' else name for name in ordering)
+        if not self.should_use_union():
+            queryset = self.queryset()
+            if condition is not None:
+                queryset = queryset.filter(condition)
+            queryset = queryset.order_by(*ordering)
+            return list(queryset[:limit] if limit is not None else queryset)
+
+        ids = [row[0] for row in self.union_queryset(condition, ordering, limit)]
+        documents = self.base_queryset().in_bulk(ids)
+        return [documents[pk] for pk in ids if pk in documents]
@@ -0,0 +1,197 @@
+"""文档操作日志汇总
+
+DocumentOperationLog 每次查看、下载、增删改都会写一行，仪表盘按时间范围计数需要扫描大量日志。
+汇总任务从高水位（已处理的最大日志ID）开始增量处理新日志，累加到：
+- OperationRollup：按 (文档, 用户, 操作类型) 的小时/天汇总；
+- DepartmentOperationRollup：按 (部门, 操作类型) 的小时/天汇总。
+原始日志保留不动，供审计查询。读取时用汇总加上高水位之后尚未汇总的少量日志，结果是实时的。
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import (
+    Document, DocumentOperationLog, OperationRollup, DepartmentOperationRollup, RollupWatermark
+)
+from .queries import visibility_q
+
+WATERMARK_NAME = 'document_operation_log'
+# 只处理足够早的日志：避免遗漏尚未提交的事务，合并记录（见 system/audit.py）在窗口结束前次数还会增加
+ROLLUP_LAG = timedelta(minutes=1) + timedelta(
+    seconds=max(getattr(settings, 'DOCUMENT_LOG_COALESCE_WINDOWS', {}).values(), default=0)
+)
+BATCH_SIZE = 5000
+
+
+def _bucket_starts(created_at):
+    """返回日志所在的本地整点和本地零点"""
+    local = timezone.localtime(created_at)
+    hour = local.replace(minute=0, second=0, microsecond=0)
+    day = hour.replace(hour=0)
+    return hour, day
+
+
+def _merge_operation_counts(counts):
+    """把 {(粒度, 时间段, 文档, 用户, 操作): 次数} 累加到 OperationRollup"""
+    if not counts:
+        return
+    buckets = {key[1] for key in counts}
+    documents = {key[2] for key in counts}
+    existing = {
+        (row.granularity, row.bucket_start, row.document_id, row.user_id, row.operation): row
+        for row in OperationRollup.objects.filter(bucket_start__in=buckets, document_id__in=documents)
+    }
+    updated, created = [], []
+    for key, count in counts.items():
+        row = existing.get(key)
+        if row is not None:
+            row.count += count
+            updated.append(row)
+        else:
+            granularity, bucket_start, document_id, user_id, operation = key
+            created.append(OperationRollup(
+                granularity=granularity, bucket_start=bucket_start, document_id=document_id,
+                user_id=user_id, operation=operation, count=count
+            ))
+    OperationRollup.objects.bulk_update(updated, ['count'], batch_size=1000)
+    OperationRollup.objects.bulk_create(created, batch_size=1000)
+
+
+def _merge_department_counts(counts):
+    """把 {(粒度, 时间段, 部门, 操作): 次数} 累加到 DepartmentOperationRollup"""
+    if not counts:
+        return
+    buckets = {key[1] for key in counts}
+    existing = {
+        (row.granularity, row.bucket_start, row.department, row.operation): row
+        for row in DepartmentOperationRollup.objects.filter(bucket_start__in=buckets)
+    }
+    updated, created = [], []
+    for key, count in counts.items():
+        row = existing.get(key)
+        if row is not None:
+            row.count += count
+            updated.append(row)
+        else:
+            granularity, bucket_start, department, operation = key
+            created.append(DepartmentOperationRollup(
+                granularity=granularity, bucket_start=bucket_start, department=department,
+                operation=operation, count=count
+            ))
+    DepartmentOperationRollup.objects.bulk_update(updated, ['count'], batch_size=1000)
+    DepartmentOperationRollup.objects.bulk_create(created, batch_size=1000)
+
+
+def rollup_operation_logs(batch_size=BATCH_SIZE, max_batches=None):
+    """增量汇总新日志，返回本次处理的日志条数"""
+    processed = 0
+    batches = 0
+    cutoff = timezone.now() - ROLLUP_LAG
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            # 锁定高水位行，防止多个任务同时汇总同一批日志
+            RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+            watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+            fetched = list(
+                DocumentOperationLog.objects.filter(id__gt=watermark.last_id)
+                .order_by('id')
+                .values_list(
+                    'id', 'document_id', 'user_id', 'operation', 'created_at', 'event_count', 'user__department'
+                )[:batch_size]
+            )
+            # 高水位只能越过连续的已到期日志：遇到较新的日志就停下，之后ID更大的日志留到下次处理，
+            # 否则ID较小但时间较新的日志会被跳过
+            rows = []
+            for row in fetched:
+                if row[4] >= cutoff:
+                    break
+                rows.append(row)
+            if not rows:
+                break
+
+            operation_counts = Counter()
+            department_counts = Counter()
+            for _, document_id, user_id, operation, created_at, event_count, department in rows:
+                # 合并记录（见 DocumentOperationLog.event_count）按合并的次数计入第一次操作所在的时间段
+                hour, day = _bucket_starts(created_at)
+                for granularity, bucket_start in (('hour', hour), ('day', day)):
+                    operation_counts[(granularity, bucket_start, document_id, user_id, operation)] += event_count
+                    department_counts[(granularity, bucket_start, department or '', operation)] += event_count
+
+            _merge_operation_counts(operation_counts)
+            _merge_department_counts(department_counts)
+
+            watermark.last_id = rows[-1][0]
+            watermark.save(update_fields=['last_id', 'updated_at'])
+
+        processed += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return processed
+
+
+def reset_rollups():
+    """清空汇总并从头开始（原始日志不受影响）"""
+    with transaction.atomic():
+        OperationRollup.objects.all().delete()
+        DepartmentOperationRollup.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK_NAME).delete()
+
+
+def _watermark():
+    return RollupWatermark.objects.filter(name=WATERMARK_NAME).values_list('last_id', flat=True).first() or 0
+
+
+def week_start():
+    """最近7天（含今天）的开始时间：6天前的本地零点"""
+    today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=6)
+
+
+def count_user_operations(user, since):
+    """用户自 since（本地零点）以来的操作次数：天汇总 + 尚未汇总的日志"""
+    last_id = _watermark()
+    summed = OperationRollup.objects.filter(
+        user=user, granularity='day', bucket_start__gte=since
+    ).aggregate(total=Sum('count'))['total'] or 0
+    pending = DocumentOperationLog.objects.filter(
+        id__gt=last_id, user=user, created_at__gte=since
+    ).aggregate(total=Sum('event_count'))['total'] or 0
+    return summed + pending
+
+
+def most_downloaded_documents(user, since, limit=5):
+    """since 以来下载次数最多的文档（只包含用户可见的文档），返回 [(文档, 次数)]"""
+    last_id = _watermark()
+    counts = Counter(dict(
+        OperationRollup.objects.filter(granularity='day', operation='download', bucket_start__gte=since)
+        .values('document_id').annotate(total=Sum('count')).values_list('document_id', 'total')
+    ))
+    counts.update(
+        DocumentOperationLog.objects.filter(id__gt=last_id, operation='download', created_at__gte=since)
+        .values_list('document_id', flat=True)
+    )
+    if not counts:
+        return []
+
+    # 多取一些候选，过滤掉不可见的文档后再截取
+    candidates = [pk for pk, _ in counts.most_common(limit * 5)]
+    documents = Document.objects.filter(visibility_q(user), pk__in=candidates).select_related('author').in_bulk()
+    ranked = [(documents[pk], counts[pk]) for pk in candidates if pk in documents]
+    return ranked[:limit]
+
+
+def department_activity(since):
+    """since 以来各部门的操作次数，返回 {部门: {操作类型: 次数}}"""
+    activity = {}
+    rows = DepartmentOperationRollup.objects.filter(
+        granularity='day', bucket_start__gte=since
+    ).values('department', 'operation').annotate(total=Sum('count')).order_by()
+    for row in rows:
+        activity.setdefault(row['department'], {})[row['operation']] = row['total']
+    return activity
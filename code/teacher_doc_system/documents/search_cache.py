@@ -0,0 +1,142 @@
+"""文档搜索结果缓存
+
+相同的搜索（如“期末”“课件 2024”）会被反复执行，每次都要跑一遍 OR/LIKE 查询和分页计数。
+这里按 (可见范围, 规范化关键词, 筛选条件) 缓存排好序的 (created_at, id) 列表：
+- 分页和总数直接从缓存列表得到，每页只需一次 id__in 查询取出文档；
+- 没有非公开文档的用户可见范围相同（全部公开文档），共享同一份缓存；
+- 失效依靠代数计数器：公开文档变化时递增全局代数，非公开文档变化时递增作者代数，
+  代数是缓存键的一部分，无需逐个查找和删除旧缓存。
+"""
+import bisect
+import hashlib
+import json
+
+from django.core.cache import cache
+
+from .facets import has_private_documents
+from .pagination import count_queryset
+
+SEARCH_CACHE_TIMEOUT = 5 * 60  # 5分钟，兜底未经过信号的批量修改
+SEARCH_CACHE_MAX_ROWS = 5000  # 结果超过该数量时不缓存，退回数据库分页
+PUBLIC_GENERATION_KEY = 'documents:search:generation:public'
+USER_GENERATION_KEY = 'documents:search:generation:user:{user_id}'
+RESULT_KEY = 'documents:search:result:{digest}'
+OVERFLOW = 'overflow'
+
+
+def normalize_search(text):
+    """合并空白并转为小写（icontains 匹配不区分大小写，结果相同）"""
+    return ' '.join((text or '').split()).lower()
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def bump_search_generation(author_id=None, public=True):
+    """文档变化后使相关搜索缓存失效"""
+    if public:
+        _incr(PUBLIC_GENERATION_KEY)
+    if author_id is not None:
+        _incr(USER_GENERATION_KEY.format(user_id=author_id))
+
+
+class CachedSearch:
+    """包装 DocumentQuery，从缓存的结果列表分页取数
+
+    用法：
+        search = CachedSearch(document_query)
+        CursorPaginator(..., fetch_rows=search.fetch, count_rows=search.count)
+    """
+
+    def __init__(self, document_query):
+        self.document_query = document_query
+        self._loaded = False
+        self._keys = None
+
+    def visibility_class(self):
+        user = self.document_query.user
+        if self.document_query.my_docs_only:
+            return f'own:{user.pk}'
+        if not has_private_documents(user):
+            return 'public'
+        return f'user:{user.pk}'
+
+    def cache_key(self):
+        query = self.document_query
+        visibility = self.visibility_class()
+        generation_keys = []
+        if visibility != f'own:{query.user.pk}':
+            generation_keys.append(PUBLIC_GENERATION_KEY)
+        if visibility != 'public':
+            generation_keys.append(USER_GENERATION_KEY.format(user_id=query.user.pk))
+        generations = cache.get_many(generation_keys)
+
+        parts = {
+            'visibility': visibility,
+            'search': normalize_search(query.search),
+            'fields': list(query.search_fields),
+            'category': query.category_id,
+            'status': query.status,
+            'file_type': query.file_type,
+            'date_from': query.date_from.isoformat() if query.date_from else None,
+            'date_to': query.date_to.isoformat() if query.date_to else None,
+            'generations': [generations.get(key, 0) for key in generation_keys],
+        }
+        digest = hashlib.md5(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+        return RESULT_KEY.format(digest=digest)
+
+    def _load_keys(self):
+        """返回按 (created_at, id) 升序排列的结果列表，结果过多时返回 None"""
+        if self._loaded:
+            return self._keys
+
+        key = self.cache_key()
+        keys = cache.get(key)
+        if keys is None:
+            query = self.document_query
+            ordering = ('-created_at', '-id')
+            limit = SEARCH_CACHE_MAX_ROWS + 1
+            if query.should_use_union():
+                rows = list(query.union_queryset(None, ordering, limit))
+            else:
+                rows = list(query.queryset().order_by(*ordering).values_list('id', 'created_at')[:limit])
+            if len(rows) > SEARCH_CACHE_MAX_ROWS:
+                keys = OVERFLOW
+            else:
+                keys = [(created_at, pk) for pk, created_at in reversed(rows)]
+            cache.set(key, keys, SEARCH_CACHE_TIMEOUT)
+
+        self._loaded = True
+        self._keys = None if keys == OVERFLOW else keys
+        return self._keys
+
+    def count(self, limit):
+        keys = self._load_keys()
+        if keys is None:
+            return count_queryset(self.document_query.queryset(), limit)
+        return len(keys), False
+
+    def fetch(self, condition=None, ordering=('-created_at', '-id'), limit=None, keyset=None):
+        keys = self._load_keys()
+        if keys is None:
+            return self.document_query.fetch(condition, ordering, limit)
+
+        descending = ordering[0].startswith('-')
+        if keyset is None:
+            end = len(keys) if descending else 0
+        else:
+            op, value, pk = keyset
+            end = bisect.bisect_left(keys, (value, pk)) if op == 'lt' else bisect.bisect_right(keys, (value, pk))
+        if descending:
+            start = 0 if limit is None else max(0, end - limit)
+            ids = [pk for _, pk in reversed(keys[start:end])]
+        else:
+            stop = len(keys) if limit is None else end + limit
+            ids = [pk for _, pk in keys[end:stop]]
+
+        documents = self.document_query.base_queryset().in_bulk(ids)
+        return [documents[pk] for pk in ids if pk in documents]
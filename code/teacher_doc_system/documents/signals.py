@@ -0,0 +1,127 @@
+import logging
+
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Document, DocumentCategory
+from .facets import invalidate_document_facets
+from .search_cache import bump_search_generation
+from .snapshots import document_contribution, record_document_change, refresh_today_snapshot
+from . import autocomplete
+
+logger = logging.getLogger(__name__)
+
+# 仅更新这些计数字段时不影响筛选统计，无需清除缓存
+COUNTER_FIELDS = {'view_count', 'download_count'}
+AUTOCOMPLETE_WARM_UP_UID = 'documents.autocomplete.warm_up'
+
+
+def _file_name(instance):
+    value = instance.__dict__.get('file')
+    return getattr(value, 'name', value)
+
+
+def _enqueue_signature(document_id):
+    from .tasks import compute_document_signature_task
+    try:
+        compute_document_signature_task.delay(document_id)
+    except Exception:
+        # 消息队列不可用时不影响上传，可通过 build_document_signatures 命令补算
+        logger.warning('无法提交文档签名计算任务: document_id=%s', document_id, exc_info=True)
+
+
+@receiver(post_init, sender=Document)
+def document_loaded(sender, instance, **kwargs):
+    """记录加载时的公开状态和文件名，用于判断修改影响哪些缓存和签名"""
+    # 直接读 __dict__，避免延迟加载字段触发额外查询；未加载时按公开处理
+    instance._loaded_is_public = instance.__dict__.get('is_public', True)
+    instance._loaded_file_name = _file_name(instance)
+    instance._loaded_contribution = document_contribution(instance)
+
+
+@receiver(post_save, sender=Document)
+def document_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    """文档创建或更新后清除分面缓存和搜索缓存，更新存储快照和联想索引"""
+    if update_fields and set(update_fields) <= COUNTER_FIELDS:
+        return
+    invalidate_document_facets(instance.author_id)
+    was_public = not created and instance._loaded_is_public
+    bump_search_generation(instance.author_id, public=instance.is_public or was_public)
+    instance._loaded_is_public = instance.is_public
+
+    # 累加到作者当天的存储快照（修改前的值未知时按当前文档重新统计）
+    contribution = document_contribution(instance)
+    if created:
+        record_document_change(instance.author_id, None, contribution, created=True)
+    elif instance._loaded_contribution is not None:
+        record_document_change(instance.author_id, instance._loaded_contribution, contribution)
+    else:
+        refresh_today_snapshot(instance.author_id)
+    instance._loaded_contribution = contribution
+
+    # 新建或文件被替换（上传新版本、恢复版本）后重新计算近似重复签名
+    if created or _file_name(instance) != instance._loaded_file_name:
+        instance._loaded_file_name = _file_name(instance)
+        transaction.on_commit(lambda: _enqueue_signature(instance.pk))
+
+    # 只使用已加载的作者，不为联想索引额外查询；作者姓名未知时由索引的增量同步补上
+    index = autocomplete.get_index()
+    if index.built:
+        author_field = Document._meta.get_field('author')
+        index.update_document(
+            instance.pk, instance.title, instance.author_id, instance.is_public,
+            author=author_field.get_cached_value(instance, None)
+        )
+    autocomplete.bump_generation()
+
+
+@receiver(post_delete, sender=Document)
+def document_deleted(sender, instance, **kwargs):
+    """文档删除后清除分面缓存和搜索缓存，更新存储快照，并从联想索引中移除"""
+    invalidate_document_facets(instance.author_id)
+    bump_search_generation(instance.author_id, public=instance.is_public or instance._loaded_is_public)
+
+    # 删除用户时级联删除的文档不再记录快照（快照随用户一起删除）
+    origin = kwargs.get('origin')
+    if getattr(origin, 'model', type(origin)) is Document:
+        contribution = instance._loaded_contribution or document_contribution(instance)
+        if contribution is not None:
+            record_document_change(instance.author_id, contribution, None)
+        else:
+            refresh_today_snapshot(instance.author_id)
+
+    index = autocomplete.get_index()
+    if index.built:
+        index.remove_document(instance.pk)
+    autocomplete.bump_generation()
+
+
+@receiver(request_started, dispatch_uid=AUTOCOMPLETE_WARM_UP_UID)
+def warm_up_autocomplete(sender, **kwargs):
+    """工作进程收到第一个请求时在后台预热联想索引（之后不再触发；gunicorn 预加载时每个子进程各自触发）"""
+    request_started.disconnect(dispatch_uid=AUTOCOMPLETE_WARM_UP_UID)
+    autocomplete.warm_up()
+
+
+@receiver(post_save, sender=DocumentCategory)
+def category_saved(sender, instance, **kwargs):
+    """分类创建、修改或停用后更新联想索引"""
+    index = autocomplete.get_index()
+    if index.built:
+        creator = instance.created_by
+        admin_created = bool(creator and (creator.is_superuser or creator.role == 'admin'))
+        index.update_category(
+            instance.pk, instance.name, instance.created_by_id, admin_created, instance.is_active
+        )
+    autocomplete.bump_generation()
+
+
+@receiver(post_delete, sender=DocumentCategory)
+def category_deleted(sender, instance, **kwargs):
+    """分类删除后从联想索引中移除"""
+    index = autocomplete.get_index()
+    if index.built:
+        index.remove_category(instance.pk)
+    autocomplete.bump_generation()
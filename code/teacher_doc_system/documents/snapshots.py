@@ -0,0 +1,213 @@
+"""用户每日存储快照
+
+教师仪表盘的存储趋势原来每天单独执行一次 SUM(file_size)，趋势越长查询越多。
+这里为每个用户维护每日快照（UserStorageSnapshot）：
+- 文档创建、修改（状态、类型、分类、公开、文件大小）、删除时，由信号把变化量累加到当天快照；
+- 当天还没有快照时，从最近一天的快照复制累计值后再累加；
+- 任意天数的趋势都只需一次查询（区间内的快照 + 区间前最近的一条），缺失的日期沿用前一天。
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import Document, UserStorageSnapshot
+
+NO_CATEGORY = 'none'
+CONTRIBUTION_FIELDS = ('file_size', 'status', 'file_type', 'is_public', 'category_id')
+
+
+def document_contribution(instance):
+    """文档对快照的贡献，字段未加载（延迟加载）时返回 None"""
+    values = instance.__dict__
+    if any(field not in values for field in CONTRIBUTION_FIELDS):
+        return None
+    return tuple(values[field] for field in CONTRIBUTION_FIELDS)
+
+
+def _category_key(category_id):
+    return str(category_id) if category_id is not None else NO_CATEGORY
+
+
+class SnapshotDelta:
+    """快照的变化量"""
+
+    def __init__(self):
+        self.total_bytes = 0
+        self.document_count = 0
+        self.public_count = 0
+        self.status_counts = Counter()
+        self.type_counts = Counter()
+        self.category_counts = Counter()
+        self.upload_count = 0
+
+    def add(self, contribution, sign=1):
+        file_size, status, file_type, is_public, category_id = contribution
+        self.total_bytes += sign * (file_size or 0)
+        self.document_count += sign
+        self.public_count += sign if is_public else 0
+        self.status_counts[status] += sign
+        self.type_counts[file_type] += sign
+        self.category_counts[_category_key(category_id)] += sign
+
+    def apply_to(self, snapshot):
+        snapshot.total_bytes = max(0, snapshot.total_bytes + self.total_bytes)
+        snapshot.document_count = max(0, snapshot.document_count + self.document_count)
+        snapshot.public_count = max(0, snapshot.public_count + self.public_count)
+        snapshot.upload_count += self.upload_count
+        for field in ('status_counts', 'type_counts', 'category_counts'):
+            counts = Counter(getattr(snapshot, field))
+            counts.update(getattr(self, field))
+            setattr(snapshot, field, {key: value for key, value in counts.items() if value > 0})
+
+
+def _carry_forward(previous, user_id, date):
+    """新的一天的快照：累计值沿用 previous，当天上传数从 0 开始"""
+    snapshot = UserStorageSnapshot(user_id=user_id, date=date)
+    if previous is not None:
+        snapshot.total_bytes = previous.total_bytes
+        snapshot.document_count = previous.document_count
+        snapshot.public_count = previous.public_count
+        snapshot.status_counts = dict(previous.status_counts)
+        snapshot.type_counts = dict(previous.type_counts)
+        snapshot.category_counts = dict(previous.category_counts)
+    return snapshot
+
+
+def _locked_today_snapshot(user_id, date):
+    queryset = UserStorageSnapshot.objects.select_for_update()
+    snapshot = queryset.filter(user_id=user_id, date=date).first()
+    if snapshot is not None:
+        return snapshot
+    previous = UserStorageSnapshot.objects.filter(user_id=user_id, date__lt=date).order_by('-date').first()
+    snapshot = _carry_forward(previous, user_id, date)
+    try:
+        with transaction.atomic():
+            snapshot.save()
+        return snapshot
+    except IntegrityError:
+        # 并发请求已创建当天快照
+        return queryset.get(user_id=user_id, date=date)
+
+
+def apply_delta(user_id, delta):
+    today = timezone.localdate()
+    with transaction.atomic():
+        snapshot = _locked_today_snapshot(user_id, today)
+        delta.apply_to(snapshot)
+        snapshot.save()
+
+
+def record_document_change(user_id, old=None, new=None, created=False):
+    """记录文档变化：old/new 为变化前后的贡献（document_contribution 的返回值）"""
+    if old == new and not created:
+        return
+    delta = SnapshotDelta()
+    if old is not None:
+        delta.add(old, -1)
+    if new is not None:
+        delta.add(new)
+    if created:
+        delta.upload_count = 1
+    apply_delta(user_id, delta)
+
+
+def _aggregate_current(user_id):
+    """按当前文档统计用户的累计值"""
+    delta = SnapshotDelta()
+    rows = Document.objects.filter(author_id=user_id).values(
+        'status', 'file_type', 'is_public', 'category_id'
+    ).annotate(count=Count('id'), size=Sum('file_size')).order_by()
+    for row in rows:
+        count = row['count']
+        delta.total_bytes += row['size'] or 0
+        delta.document_count += count
+        delta.public_count += count if row['is_public'] else 0
+        delta.status_counts[row['status']] += count
+        delta.type_counts[row['file_type']] += count
+        delta.category_counts[_category_key(row['category_id'])] += count
+    return delta
+
+
+def refresh_today_snapshot(user_id):
+    """按当前文档重新计算当天快照（变化前的值未知时使用），保留当天上传数"""
+    delta = _aggregate_current(user_id)
+    today = timezone.localdate()
+    with transaction.atomic():
+        snapshot = _locked_today_snapshot(user_id, today)
+        upload_count = snapshot.upload_count
+        snapshot.total_bytes = delta.total_bytes
+        snapshot.document_count = delta.document_count
+        snapshot.public_count = delta.public_count
+        snapshot.status_counts = dict(delta.status_counts)
+        snapshot.type_counts = dict(delta.type_counts)
+        snapshot.category_counts = dict(delta.category_counts)
+        snapshot.upload_count = upload_count
+        snapshot.save()
+    return snapshot
+
+
+def get_storage_series(user, days=7):
+    """返回最近 days 天的快照列表（每天一项，按日期正序），缺失的日期沿用前一天
+
+    一次查询取出区间内的快照和区间开始前最近的一条。
+    """
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    previous_date = UserStorageSnapshot.objects.filter(
+        user=user, date__lt=start
+    ).order_by('-date').values('date')[:1]
+    rows = list(
+        UserStorageSnapshot.objects.filter(user=user).filter(
+            Q(date__gte=start) | Q(date=Subquery(previous_date))
+        ).order_by('date')
+    )
+    if not rows:
+        # 尚未生成过快照（如新用户或未执行回填），按当前文档生成当天快照
+        rows = [refresh_today_snapshot(user.pk)]
+
+    series = []
+    index = 0
+    current = None
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        upload_count = 0
+        while index < len(rows) and rows[index].date <= date:
+            current = rows[index]
+            if current.date == date:
+                upload_count = current.upload_count
+            index += 1
+        series.append({
+            'date': date,
+            'snapshot': current,
+            'total_bytes': current.total_bytes if current else 0,
+            'document_count': current.document_count if current else 0,
+            'upload_count': upload_count,
+        })
+    return series
+
+
+def rebuild_user_snapshots(user_id):
+    """按现有文档的上传时间回填快照（删除和状态变更的历史无法还原，按当前状态计入上传日）"""
+    snapshots = []
+    current = None
+    rows = Document.objects.filter(author_id=user_id).order_by('created_at').values_list(
+        'created_at', *CONTRIBUTION_FIELDS
+    )
+    for created_at, *contribution in rows.iterator(chunk_size=2000):
+        date = timezone.localdate(created_at)
+        if current is None or current.date != date:
+            current = _carry_forward(current, user_id, date)
+            snapshots.append(current)
+        delta = SnapshotDelta()
+        delta.add(tuple(contribution))
+        delta.upload_count = 1
+        delta.apply_to(current)
+
+    with transaction.atomic():
+        UserStorageSnapshot.objects.filter(user_id=user_id).delete()
+        UserStorageSnapshot.objects.bulk_create(snapshots, batch_size=500)
+    return len(snapshots)
+
@@ -0,0 +1,21 @@
+from celery import shared_task
+
+from .models import Document
+from .similarity import compute_document_signature, signature_is_stale
+
+
+@shared_task
+def compute_document_signature_task(document_id):
+    """计算文档的 MinHash 签名（文件未变化时跳过）"""
+    document = Document.objects.filter(pk=document_id).first()
+    if document is None or not signature_is_stale(document):
+        return None
+    record = compute_document_signature(document)
+    return record.shingle_count
+
+
+@shared_task
+def rollup_operation_logs_task():
+    """把新的文档操作日志汇总到小时/天汇总表"""
+    from .rollups import rollup_operation_logs
+    return rollup_operation_logs()
@@ -0,0 +1,27 @@
+import random
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+
+from documents import similarity
+
+
+@skipIf(similarity.numpy is None, '未安装 numpy')
+class MinHashTests(SimpleTestCase):
+    """向量化的 MinHash 与逐个计算的结果相同（已保存的签名仍可比较）"""
+
+    def test_vectorized_matches_python(self):
+        rng = random.Random(0)
+        hashes = {rng.getrandbits(32) for _ in range(2000)} | {0, 1, (1 << 32) - 1}
+        expected = [
+            min((a * value + b) % similarity._MERSENNE_PRIME for value in hashes) & similarity._MAX_HASH
+            for a, b in similarity._PERMUTATIONS
+        ]
+        self.assertEqual(list(similarity._minhash_vectorized(hashes)), expected)
+
+    def test_similar_texts_share_buckets(self):
+        text = '教学大纲 第一章 课程目标与要求 ' * 50
+        first = similarity.minhash(similarity.shingle_hashes(text))
+        second = similarity.minhash(similarity.shingle_hashes(text + '补充说明'))
+        self.assertGreater(similarity.estimate_similarity(first, second), similarity.SIMILARITY_THRESHOLD)
+        self.assertTrue(set(similarity.band_buckets(first)) & set(similarity.band_buckets(second)))
@@ -49,4 +49,5 @@ urlpatterns = [
     # API接口
     path('api/upload-progress/', views.UploadProgressAPIView.as_view(), name='upload_progress_api'),
     path('api/document-info/<int:pk>/', views.DocumentInfoAPIView.as_view(), name='document_info_api'),
+    path('api/autocomplete/', views.AutocompleteAPIView.as_view(), name='autocomplete_api'),
 ]
\ No newline at end of file
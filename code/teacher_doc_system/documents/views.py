@@ -12,36 +12,75 @@ from django.conf import settings
 import os
 import hashlib
 import mimetypes
+from urllib.parse import urlencode
 from datetime import datetime, timedelta
 
 from .models import Document, DocumentCategory, DocumentVersion, DocumentOperationLog
+from system import audit
 from system.models import ShareLink
 from .forms import DocumentForm, CategoryForm, VersionForm, ShareLinkForm
+from .autocomplete import autocomplete
+from .facets import get_document_facets
+from .pagination import CursorPaginationMixin
+from .queries import DocumentQuery, visibility_q
+from .rollups import count_user_operations, most_downloaded_documents, week_start
+from .search_cache import CachedSearch
+from .similarity import find_similar_documents
+from .snapshots import NO_CATEGORY, get_storage_series
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 
+def build_filter_options(user, facets):
+    """根据分面统计构造列表页筛选项（附带每个选项的可见文档数）"""
+    categories = list(DocumentCategory.visible_to(user))
+    for category in categories:
+        category.facet_count = facets['category'].get(category.id, 0)
+
+    file_types = sorted(facets['file_type'].items(), key=lambda item: (-item[1], item[0]))
+    status_options = [
+        (value, label, facets['status'].get(value, 0))
+        for value, label in Document.STATUS_CHOICES
+    ]
+    years = sorted(facets['year'].items(), reverse=True)
+
+    return {
+        'categories': categories,
+        'file_types': file_types,
+        'status_choices': Document.STATUS_CHOICES,
+        'status_options': status_options,
+        'years': years,
+    }
+
+
 class TeacherDashboardView(LoginRequiredMixin, TemplateView):
     """教师仪表盘"""
     template_name = 'documents/teacher_dashboard.html'
+    TREND_DAYS = ('7', '30', '90', '365')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
         
-        # 基本统计
-        total_documents = Document.objects.filter(author=user).count()
-        public_documents = Document.objects.filter(author=user, is_public=True).count()
+        # 文档统计和存储趋势来自每日快照：一次查询取出整个趋势区间
+        trend_days = self.request.GET.get('days', '7')
+        trend_days = int(trend_days) if trend_days in self.TREND_DAYS else 7
+        series = get_storage_series(user, max(trend_days, 7))
+        latest = series[-1]['snapshot']
+
+        total_documents = latest.document_count
+        public_documents = latest.public_count
         private_documents = total_documents - public_documents
         
         # 按状态统计文档
-        status_stats = Document.objects.filter(author=user).values('status').annotate(
-            count=Count('id')
-        )
+        status_stats = [
+            {'status': status, 'count': count}
+            for status, count in latest.status_counts.items()
+        ]
         
         # 审核未通过的文档
-        rejected_documents = Document.objects.filter(author=user, status='rejected').count()
+        rejected_documents = latest.status_counts.get('rejected', 0)
         
         # 存储使用情况
         total_storage_used = user.storage_used
@@ -57,62 +96,50 @@ class TeacherDashboardView(LoginRequiredMixin, TemplateView):
             else:
                 storage_percentage = round(percentage, 2)
         
-        # 按分类统计文档
-        category_stats = Document.objects.filter(author=user).values(
-            'category__name'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:5]
+        # 按分类统计文档（前5个，已删除的分类计入未分类）
+        top_categories = sorted(latest.category_counts.items(), key=lambda item: -item[1])[:5]
+        category_names = DocumentCategory.objects.in_bulk(
+            [int(key) for key, _ in top_categories if key != NO_CATEGORY]
+        )
+        category_stats = [
+            {
+                'category__name': category_names[int(key)].name if key != NO_CATEGORY and int(key) in category_names else None,
+                'count': count,
+            }
+            for key, count in top_categories
+        ]
         
         # 按文件类型统计
-        file_type_stats = Document.objects.filter(author=user).values(
-            'file_type'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:5]
+        file_type_stats = [
+            {'file_type': file_type, 'count': count}
+            for file_type, count in sorted(latest.type_counts.items(), key=lambda item: -item[1])[:5]
+        ]
         
         # 最近上传的文档
         recent_documents = Document.objects.filter(author=user).order_by('-created_at')[:5]
         
         # 分享链接统计
-        total_share_links = ShareLink.objects.filter(created_by=user).count()
-        active_share_links = ShareLink.objects.filter(
-            created_by=user, 
-            is_active=True,
-            expires_at__gt=timezone.now()
-        ).count()
-        
-        # 最近7天的活动统计
-        week_ago = timezone.now() - timedelta(days=7)
-        recent_uploads = Document.objects.filter(
-            author=user, 
-            created_at__gte=week_ago
-        ).count()
-        
-        recent_operations = DocumentOperationLog.objects.filter(
-            user=user,
-            created_at__gte=week_ago
-        ).count()
-        
-        # 存储使用趋势（最近7天）
-        storage_trend = []
-        for i in range(7):
-            date = timezone.now() - timedelta(days=i)
-            day_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-            day_end = day_start + timedelta(days=1)
-            
-            # 计算到该日期为止的存储使用量
-            documents_until_date = Document.objects.filter(
-                author=user,
-                created_at__lt=day_end
-            ).aggregate(total_size=Sum('file_size'))['total_size'] or 0
-            
-            storage_trend.append({
-                'date': day_start.strftime('%m-%d'),
-                'size': documents_until_date
-            })
-        
-        storage_trend.reverse()  # 按时间正序排列
+        share_link_stats = ShareLink.objects.filter(created_by=user).aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(is_active=True, expires_at__gt=timezone.now())),
+        )
+        total_share_links = share_link_stats['total']
+        active_share_links = share_link_stats['active']
+        
+        # 最近7天的活动统计（操作次数和下载排行读取操作日志汇总表）
+        since = week_start()
+        recent_uploads = sum(day['upload_count'] for day in series[-7:])
+        recent_operations = count_user_operations(user, since)
+        top_downloads = most_downloaded_documents(user, since)
+        
+        # 存储使用趋势
+        storage_trend = [
+            {'date': day['date'].strftime('%m-%d'), 'size': day['total_bytes']}
+            for day in series[-trend_days:]
+        ]
+        max_trend_size = max(day['size'] for day in storage_trend) or 1
+        for day in storage_trend:
+            day['percent'] = round(day['size'] * 100 / max_trend_size, 1)
         
         context.update({
             'total_documents': total_documents,
@@ -130,13 +157,16 @@ class TeacherDashboardView(LoginRequiredMixin, TemplateView):
             'active_share_links': active_share_links,
             'recent_uploads': recent_uploads,
             'recent_operations': recent_operations,
+            'top_downloads': top_downloads,
             'storage_trend': storage_trend,
+            'trend_days': trend_days,
+            'trend_day_options': self.TREND_DAYS,
         })
         
         return context
 
 
-class DocumentListView(LoginRequiredMixin, ListView):
+class DocumentListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """文档列表"""
     model = Document
     template_name = 'documents/document_list.html'
@@ -144,96 +174,30 @@ class DocumentListView(LoginRequiredMixin, ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        user = self.request.user
-        
-        # 基础查询：自己的文档 + 公开文档
-        queryset = Document.objects.filter(
-            Q(author=user) | Q(is_public=True)
-        ).select_related('author', 'category')
-        
-        # 筛选条件
-        category_filter = self.request.GET.get('category')
-        status_filter = self.request.GET.get('status')
-        file_type_filter = self.request.GET.get('file_type')
-        date_from = self.request.GET.get('date_from')
-        date_to = self.request.GET.get('date_to')
-        search = self.request.GET.get('search')
-        my_docs_only = self.request.GET.get('my_docs_only')
-        
-        if my_docs_only == 'true':
-            queryset = queryset.filter(author=user)
-        
-        if category_filter:
-            queryset = queryset.filter(category=category_filter)
-        
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        
-        if file_type_filter:
-            queryset = queryset.filter(file_type=file_type_filter)
-        
-        if date_from:
-            from datetime import datetime
-            try:
-                # 确保日期格式正确
-                if isinstance(date_from, str):
-                    date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-                # 使用更兼容的日期筛选方法
-                from django.utils import timezone
-                start_datetime = timezone.datetime.combine(date_from, timezone.datetime.min.time())
-                start_datetime = timezone.make_aware(start_datetime)
-                queryset = queryset.filter(created_at__gte=start_datetime)
-            except ValueError:
-                # 如果日期格式不正确，忽略该筛选条件
-                pass
-        
-        if date_to:
-            from datetime import datetime
-            try:
-                # 确保日期格式正确
-                if isinstance(date_to, str):
-                    date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                # 使用更兼容的日期筛选方法
-                from django.utils import timezone
-                end_datetime = timezone.datetime.combine(date_to, timezone.datetime.max.time())
-                end_datetime = timezone.make_aware(end_datetime)
-                queryset = queryset.filter(created_at__lte=end_datetime)
-            except ValueError:
-                # 如果日期格式不正确，忽略该筛选条件
-                pass
-        
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(author__first_name__icontains=search) |
-                Q(author__last_name__icontains=search)
-            )
-        
-        return queryset.order_by('-created_at')
+        # 筛选参数只解析一次，分页取数时复用（可见性 OR 条件必要时拆分为 UNION）
+        self.document_query = DocumentQuery(self.request.user, self.request.GET)
+        # 有关键词时从缓存的结果列表分页
+        self.cached_search = CachedSearch(self.document_query) if self.document_query.search else None
+        return self.document_query.queryset().order_by('-created_at')
+    
+    def get_fetch_rows(self):
+        if self.cached_search:
+            return self.cached_search.fetch
+        return self.document_query.fetch
+
+    def get_count_rows(self):
+        return self.cached_search.count if self.cached_search else None
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # 添加筛选选项 - 根据用户权限限制分类选择
+        # 添加筛选选项 - 根据用户权限限制分类选择，并附带可见文档数量
         user = self.request.user
-        if user.is_superuser or user.is_admin():
-            # 管理员可以看到所有分类
-            categories = DocumentCategory.objects.filter(is_active=True)
-        else:
-            # 教师只能看到管理员创建的分类和自己创建的分类
-            admin_users = User.objects.filter(Q(is_superuser=True) | Q(role='admin'))
-            categories = DocumentCategory.objects.filter(
-                Q(created_by__in=admin_users) | Q(created_by=user),
-                is_active=True
-            )
-        
-        file_types = Document.objects.values_list('file_type', flat=True).distinct()
-        
+        facets = get_document_facets(user)
+
+        context.update(build_filter_options(user, facets))
         context.update({
-            'categories': categories,
-            'file_types': file_types,
-            'status_choices': Document.STATUS_CHOICES,
+            'facets': facets,
             'filters': {
                 'category': self.request.GET.get('category'),
                 'status': self.request.GET.get('status'),
@@ -248,7 +212,7 @@ class DocumentListView(LoginRequiredMixin, ListView):
         return context
 
 
-class DocumentSearchView(LoginRequiredMixin, ListView):
+class DocumentSearchView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """文档搜索"""
     model = Document
     template_name = 'documents/document_list.html'
@@ -256,97 +220,38 @@ class DocumentSearchView(LoginRequiredMixin, ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        user = self.request.user
-        
-        # 基础查询：自己的文档 + 公开文档
-        queryset = Document.objects.filter(
-            Q(author=user) | Q(is_public=True)
-        ).select_related('author', 'category')
-        
-        # 搜索关键词
-        search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(author__username__icontains=search)
-            )
-        
-        # 其他筛选条件
-        category_filter = self.request.GET.get('category')
-        status_filter = self.request.GET.get('status')
-        file_type_filter = self.request.GET.get('file_type')
-        date_from = self.request.GET.get('date_from')
-        date_to = self.request.GET.get('date_to')
-        my_docs_only = self.request.GET.get('my_docs_only')
-        
-        if my_docs_only == 'true':
-            queryset = queryset.filter(author=user)
-        
-        if category_filter:
-            queryset = queryset.filter(category=category_filter)
-        
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        
-        if file_type_filter:
-            queryset = queryset.filter(file_type=file_type_filter)
-        
-        if date_from:
-            from datetime import datetime
-            try:
-                # 确保日期格式正确
-                if isinstance(date_from, str):
-                    date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-                # 使用更兼容的日期筛选方法
-                from django.utils import timezone
-                start_datetime = timezone.datetime.combine(date_from, timezone.datetime.min.time())
-                start_datetime = timezone.make_aware(start_datetime)
-                queryset = queryset.filter(created_at__gte=start_datetime)
-            except ValueError:
-                # 如果日期格式不正确，忽略该筛选条件
-                pass
-        
-        if date_to:
-            from datetime import datetime
-            try:
-                # 确保日期格式正确
-                if isinstance(date_to, str):
-                    date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                # 使用更兼容的日期筛选方法
-                from django.utils import timezone
-                end_datetime = timezone.datetime.combine(date_to, timezone.datetime.max.time())
-                end_datetime = timezone.make_aware(end_datetime)
-                queryset = queryset.filter(created_at__lte=end_datetime)
-            except ValueError:
-                # 如果日期格式不正确，忽略该筛选条件
-                pass
-        
-        return queryset.order_by('-created_at')
+        # 搜索页按标题、描述和作者用户名匹配关键词
+        self.document_query = DocumentQuery(
+            self.request.user,
+            self.request.GET,
+            search_fields=('title', 'description', 'author__username')
+        )
+        self.cached_search = CachedSearch(self.document_query) if self.document_query.search else None
+        return self.document_query.queryset().order_by('-created_at')
+    
+    def get_fetch_rows(self):
+        if self.cached_search:
+            return self.cached_search.fetch
+        return self.document_query.fetch
+
+    def get_count_rows(self):
+        return self.cached_search.count if self.cached_search else None
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # 根据用户权限限制分类选择
+        # 根据用户权限限制分类选择，并附带可见文档数量
         user = self.request.user
-        if user.is_superuser or user.is_admin():
-            # 管理员可以看到所有分类
-            categories = DocumentCategory.objects.filter(is_active=True)
-        else:
-            # 教师只能看到管理员创建的分类和自己创建的分类
-            admin_users = User.objects.filter(Q(is_superuser=True) | Q(role='admin'))
-            categories = DocumentCategory.objects.filter(
-                Q(created_by__in=admin_users) | Q(created_by=user),
-                is_active=True
-            )
-        
-        context['categories'] = categories
-        context['search_form'] = self.get_search_form()
+        facets = get_document_facets(user)
+
+        context.update(build_filter_options(user, facets))
+        context['facets'] = facets
+        context['search_form'] = self.get_search_form(facets)
         return context
-    
-    def get_search_form(self):
+
+    def get_search_form(self, facets=None):
         from .forms import DocumentSearchForm
-        return DocumentSearchForm(self.request.GET)
+        return DocumentSearchForm(self.request.GET, facets=facets)
 
 
 class DocumentDetailView(LoginRequiredMixin, DetailView):
@@ -361,9 +266,7 @@ class DocumentDetailView(LoginRequiredMixin, DetailView):
         if user.is_superuser or user.is_admin():
             return Document.objects.none()
         # 普通用户只能访问自己的文档或公开文档
-        return Document.objects.filter(
-            Q(author=user) | Q(is_public=True)
-        ).select_related('author', 'category')
+        return Document.objects.filter(visibility_q(user)).select_related('author', 'category')
     
     def get_context_data(self, **kwargs):
         """添加上下文数据，处理文件路径问题"""
@@ -381,6 +284,8 @@ class DocumentDetailView(LoginRequiredMixin, DetailView):
                 # 但我们需要在模板中使用 document.file_size 而不是 document.file.size
                 pass
         
+        # 内容相似的文档（按 LSH 桶查找，只显示当前用户可见的）
+        context['similar_documents'] = find_similar_documents(document, self.request.user)
         return context
     
     def get(self, request, *args, **kwargs):
@@ -398,10 +303,13 @@ class DocumentDetailView(LoginRequiredMixin, DetailView):
         # 增加查看次数
         if document.author != request.user:
             document.view_count += 1
-            document.save()
+            document.save(update_fields=['view_count'])
         
-        # 记录查看日志
-        DocumentOperationLog.objects.create(
+        # 记录查看日志（窗口内的重复查看合并为一条）
+        audit.record(
+            DocumentOperationLog,
+            coalesce_key=('document-view', request.user.pk, document.pk),
+            coalesce_window=DocumentOperationLog.coalesce_window('view'),
             document=document,
             user=request.user,
             operation='view',
@@ -500,7 +408,8 @@ class UploadDocumentView(LoginRequiredMixin, CreateView):
             user.save()
             
             # 记录操作日志
-            DocumentOperationLog.objects.create(
+            audit.record(
+                DocumentOperationLog,
                 document=document,
                 user=user,
                 operation='create',
@@ -586,7 +495,8 @@ class EditDocumentView(LoginRequiredMixin, UpdateView):
                 messages.success(self.request, f'文档 "{document.title}" 更新成功')
             
             # 记录操作日志
-            DocumentOperationLog.objects.create(
+            audit.record(
+                DocumentOperationLog,
                 document=document,
                 user=self.request.user,
                 operation='update',
@@ -629,7 +539,9 @@ class DeleteDocumentView(LoginRequiredMixin, DeleteView):
                 os.remove(document.file.path)
             
             # 记录操作日志
-            DocumentOperationLog.objects.create(
+            audit.record(
+                DocumentOperationLog,
+                sync=True,
                 document=document,
                 user=request.user,
                 operation='delete',
@@ -669,10 +581,11 @@ class DownloadDocumentView(LoginRequiredMixin, View):
         
         # 增加下载次数
         document.download_count += 1
-        document.save()
+        document.save(update_fields=['download_count'])
         
         # 记录下载日志
-        DocumentOperationLog.objects.create(
+        audit.record(
+            DocumentOperationLog,
             document=document,
             user=request.user,
             operation='download',
@@ -737,7 +650,9 @@ class BatchDeleteDocumentsView(LoginRequiredMixin, View):
                 request.user.save()
 
                 # 记录操作日志
-                DocumentOperationLog.objects.create(
+                audit.record(
+                    DocumentOperationLog,
+                    sync=True,
                     document=document,
                     user=request.user,
                     operation='delete',
@@ -896,9 +811,10 @@ class DownloadShareView(View):
             messages.error(request, '文件不存在')
             return redirect('documents:share_link', token=token)
         
-        # 增加下载次数
-        share_link.download_count += 1
-        share_link.save()
+        # 占用一次下载次数（检查和计数在同一条 UPDATE 中完成，并发下载不会超出上限）
+        if not share_link.consume_download():
+            messages.error(request, '下载次数已达上限')
+            return redirect('documents:share_link', token=token)
         
         # 返回文件
         response = FileResponse(
@@ -911,7 +827,7 @@ class DownloadShareView(View):
         return response
 
 
-class ShareLinkListView(LoginRequiredMixin, ListView):
+class ShareLinkListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """分享链接列表"""
     model = ShareLink
     template_name = 'documents/share_link_list.html'
@@ -921,7 +837,7 @@ class ShareLinkListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         return ShareLink.objects.filter(
             created_by=self.request.user
-        ).select_related('document').order_by('-created_at')
+        ).select_related('document__author').order_by('-created_at')
 
 
 class DeleteShareLinkView(LoginRequiredMixin, DeleteView):
@@ -1208,6 +1124,29 @@ class DocumentInfoAPIView(LoginRequiredMixin, View):
         })
 
 
+class AutocompleteAPIView(LoginRequiredMixin, View):
+    """搜索框联想API：返回用户可见的文档标题、分类和作者"""
+    max_limit = 20
+
+    def get(self, request):
+        query = request.GET.get('q', '')
+        try:
+            limit = min(int(request.GET.get('limit', 10)), self.max_limit)
+        except ValueError:
+            limit = 10
+
+        results = []
+        for item in autocomplete(request.user, query, limit):
+            if item['type'] == 'document':
+                item['url'] = reverse('documents:document_detail', args=[item['id']])
+            elif item['type'] == 'category':
+                item['url'] = reverse('documents:category_documents', args=[item['id']])
+            else:
+                item['url'] = f"{reverse('documents:document_search')}?{urlencode({'search': item['username']})}"
+            results.append(item)
+        return JsonResponse({'results': results})
+
+
 class CategoryListView(LoginRequiredMixin, ListView):
     """分类列表"""
     model = DocumentCategory
@@ -1220,8 +1159,8 @@ class CategoryListView(LoginRequiredMixin, ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # 获取所有分类
-        all_categories = DocumentCategory.objects.all()
+        # 获取所有分类（模板逐个显示创建人和子分类，预先取出避免每个分类单独查询）
+        all_categories = DocumentCategory.objects.select_related('created_by').prefetch_related('children')
         
         # 区分管理员分类和用户分类
         if self.request.user.is_superuser:
@@ -1294,7 +1233,7 @@ class UploadProgressAPIView(LoginRequiredMixin, View):
         return JsonResponse({'progress': 0, 'status': 'pending'})
 
 
-class CategoryDocumentsView(LoginRequiredMixin, ListView):
+class CategoryDocumentsView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """分类下的文档列表"""
     model = Document
     template_name = 'documents/category_documents.html'
@@ -1344,7 +1283,7 @@ class DocumentPreviewView(LoginRequiredMixin, View):
         
         # 记录查看次数
         document.view_count += 1
-        document.save()
+        document.save(update_fields=['view_count'])
         
         # 获取文件路径，尝试多种可能的路径格式
         file_path = None
@@ -1610,7 +1549,7 @@ class DocumentPreviewView(LoginRequiredMixin, View):
             return redirect('documents:document_detail', pk=document.pk)
 
 
-class DocumentReviewListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class DocumentReviewListView(LoginRequiredMixin, UserPassesTestMixin, CursorPaginationMixin, ListView):
     """待审核文档列表（仅管理员可见）"""
     model = Document
     template_name = 'documents/document_review_list.html'
@@ -1621,7 +1560,7 @@ class DocumentReviewListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         return self.request.user.is_superuser or self.request.user.is_admin()
     
     def get_queryset(self):
-        return Document.objects.filter(status='review').order_by('-created_at')
+        return Document.objects.filter(status='review').select_related('author').order_by('-created_at')
 
 
 class DocumentReviewView(LoginRequiredMixin, UserPassesTestMixin, View):
@@ -1648,7 +1587,8 @@ class DocumentReviewView(LoginRequiredMixin, UserPassesTestMixin, View):
             
             # 记录操作日志
             from system.models import SystemLog
-            SystemLog.objects.create(
+            audit.record(
+                SystemLog,
                 level='INFO',
                 message=f'管理员 {request.user.get_full_name()} 审核通过了文档《{document.title}》，已归档',
                 module='documents',
@@ -1664,7 +1604,8 @@ class DocumentReviewView(LoginRequiredMixin, UserPassesTestMixin, View):
             
             # 记录操作日志
             from system.models import SystemLog
-            SystemLog.objects.create(
+            audit.record(
+                SystemLog,
                 level='INFO',
                 message=f'管理员 {request.user.get_full_name()} 拒绝了文档《{document.title}》，状态为审核未通过',
                 module='documents',
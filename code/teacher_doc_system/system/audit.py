@@ -0,0 +1,316 @@
+"""审计日志异步批量写入
+
+查看、下载、登录等请求原来都在请求内同步执行一次 INSERT（DocumentOperationLog、SystemLog、
+LoginLog、UserOperationLog）。这里改为：
+- record() 把日志放入进程内的有界队列，后台线程每 AUDIT_LOG_BATCH_SIZE 条或每
+  AUDIT_LOG_FLUSH_INTERVAL 毫秒用 bulk_create 批量写入；
+- 在事务中调用时，事务提交后才入队，回滚的操作不会留下日志；
+- 数据库不可用时写入本地追加文件（AUDIT_LOG_SPOOL_PATH），数据库恢复后自动补写，
+  也可以执行 replay_audit_spool 命令补写；
+- 进程正常退出时写完队列中的日志；
+- 删除、冻结等关键操作使用 sync=True 同步写入（与业务操作在同一事务中）；
+- 队列已满时退化为同步写入，不丢日志；
+- 可按 key 在时间窗口内合并重复事件（如反复刷新文档页产生的查看记录）：窗口内第一次事件和普通日志一样
+  立即写入，之后的事件在每轮写入时用 UPDATE 累加到这条记录的 event_count、last_event_at 上，
+  进程被杀死时最多丢失一轮（AUDIT_LOG_FLUSH_INTERVAL）内的次数。
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+ASYNC_ENABLED = getattr(settings, 'AUDIT_LOG_ASYNC', True)
+BATCH_SIZE = getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 200)
+FLUSH_INTERVAL = getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL', 500) / 1000  # 毫秒 -> 秒
+QUEUE_SIZE = getattr(settings, 'AUDIT_LOG_QUEUE_SIZE', 10000)
+SPOOL_PATH = str(getattr(settings, 'AUDIT_LOG_SPOOL_PATH', settings.BASE_DIR / 'logs' / 'audit_spool.jsonl'))
+SPOOL_RETRY_INTERVAL = 30  # 秒，补写本地文件的最短间隔
+
+MAX_COALESCE_WINDOWS = 50000
+
+_STOP = object()
+
+
+class _Coalesced(namedtuple('_Coalesced', 'instance key window')):
+    """需要按窗口合并的日志"""
+
+
+class _Window:
+    """一个合并窗口：已写入（或等待写入）的第一条记录，以及尚未累加到它上面的次数"""
+
+    def __init__(self, instance, expires):
+        self.instance = instance
+        self.expires = expires
+        self.extra = 0  # 尚未写入数据库的次数
+        self.extra_since = None  # 其中第一次事件的时间
+        self.last_event_at = None
+
+
+def _serialize(instance):
+    """日志对象 -> 可写入本地文件的字典（外键保存为ID）"""
+    opts = instance._meta
+    fields = {
+        field.attname: getattr(instance, field.attname)
+        for field in opts.concrete_fields
+        if not field.primary_key
+    }
+    return {'model': opts.label, 'fields': fields}
+
+
+def _deserialize(data):
+    model = apps.get_model(data['model'])
+    values = {}
+    for field in model._meta.concrete_fields:
+        if field.attname in data['fields']:
+            values[field.attname] = field.to_python(data['fields'][field.attname])
+    return model(**values)
+
+
+def _insert(instances, returning=False):
+    """按模型分组批量写入；某批违反约束（如关联文档已删除）时逐条写入并丢弃失败的记录
+
+    returning=True 时需要写入后的主键（合并窗口的第一条记录），数据库不支持批量插入返回主键时逐条写入。
+    """
+    groups = defaultdict(list)
+    for instance in instances:
+        groups[type(instance)].append(instance)
+    one_by_one = returning and not connection.features.can_return_rows_from_bulk_insert
+    for model, rows in groups.items():
+        if not one_by_one:
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+                continue
+            except IntegrityError:
+                pass
+        for row in rows:
+            try:
+                with transaction.atomic():
+                    row.save(force_insert=True)
+            except IntegrityError:
+                logger.warning('丢弃无法写入的审计日志: %s', _serialize(row), exc_info=True)
+
+
+class AuditLogWriter:
+    """进程内的审计日志写入线程"""
+
+    def __init__(self, spool_path=SPOOL_PATH):
+        self.spool_path = spool_path
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._spool_checked_at = 0
+        self._windows = {}  # 合并窗口：key -> _Window
+        self._closed = []  # 已结束、还有次数未写入的窗口
+
+    def _ensure_started(self):
+        # 进程 fork 后（如 gunicorn 预加载）父进程的线程不会随之复制，需要在子进程中重新启动
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+            self._windows = {}
+            self._closed = []
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+
+    def put(self, instance, coalesce_key=None, coalesce_window=None):
+        self._ensure_started()
+        item = instance
+        if coalesce_key is not None and coalesce_window:
+            item = _Coalesced(instance, coalesce_key, coalesce_window)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logger.warning('审计日志队列已满，改为同步写入')
+            self._write([instance])
+
+    def _run(self):
+        pending = []
+        firsts = []  # 合并窗口的第一条记录，写入时需要取回主键
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        stopping = False
+        while not stopping:
+            timeout = max(0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            # 已积压的日志一并取出（每轮最多 BATCH_SIZE 条）
+            drained = 0
+            while item is not None and not stopping:
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, _Coalesced):
+                    self._coalesce(item, firsts)
+                else:
+                    pending.append(item)
+                drained += 1
+                if drained >= BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            if stopping or len(pending) + len(firsts) >= BATCH_SIZE or time.monotonic() >= deadline:
+                close_old_connections()
+                if pending:
+                    self._write(pending)
+                    pending = []
+                if firsts:
+                    self._write(firsts, returning=True)
+                    firsts = []
+                self._fold_windows(force=stopping)
+                self._maybe_replay_spool()
+                deadline = time.monotonic() + FLUSH_INTERVAL
+
+    def _coalesce(self, item, firsts):
+        """窗口内第一次事件写入一条记录，之后的事件只累加次数（在 _fold_windows() 中写入）"""
+        window = self._windows.get(item.key)
+        if window is not None and time.monotonic() < window.expires:
+            window.extra += item.instance.event_count
+            window.extra_since = window.extra_since or item.instance.created_at
+            window.last_event_at = item.instance.created_at
+            return
+        if window is not None:
+            self._closed.append(self._windows.pop(item.key))
+        if len(self._windows) >= MAX_COALESCE_WINDOWS:
+            # 窗口过多时提前结束最早打开的窗口
+            self._closed.append(self._windows.pop(next(iter(self._windows))))
+        firsts.append(item.instance)
+        self._windows[item.key] = _Window(item.instance, time.monotonic() + item.window)
+
+    def _fold_windows(self, force=False):
+        """把各窗口新增的次数累加到第一条记录上，并移除已结束的窗口"""
+        now = time.monotonic()
+        for key in [key for key, window in self._windows.items() if force or window.expires <= now]:
+            self._closed.append(self._windows.pop(key))
+        for window in [*self._windows.values(), *self._closed]:
+            if window.extra:
+                self._fold(window)
+        self._closed = []
+
+    def _fold(self, window):
+        first = window.instance
+        if first.pk is not None:
+            try:
+                updated = type(first).objects.filter(pk=first.pk).update(
+                    event_count=F('event_count') + window.extra, last_event_at=window.last_event_at
+                )
+            except DatabaseError:
+                logger.warning('合并审计日志次数失败，改为单独记录', exc_info=True)
+                updated = 0
+            if updated:
+                window.extra = 0
+                window.extra_since = None
+                return
+        # 第一条记录没有写入数据库（已暂存到本地文件或被丢弃）：新增的次数单独写一条，之后累加到这条上
+        extra = _deserialize(_serialize(first))
+        extra.event_count = window.extra
+        extra.created_at = window.extra_since
+        extra.last_event_at = window.last_event_at
+        window.instance = extra
+        window.extra = 0
+        window.extra_since = None
+        self._write([extra], returning=True)
+
+    def _write(self, instances, returning=False):
+        try:
+            _insert(instances, returning)
+        except DatabaseError:
+            logger.warning('审计日志写入数据库失败，暂存到 %s', self.spool_path, exc_info=True)
+            self._spool(instances)
+
+    def _spool(self, instances):
+        lines = ''.join(
+            json.dumps(_serialize(instance), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+            for instance in instances
+        )
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+            with open(self.spool_path, 'a', encoding='utf-8') as spool:
+                spool.write(lines)
+                spool.flush()
+                os.fsync(spool.fileno())
+
+    def _maybe_replay_spool(self):
+        now = time.monotonic()
+        if now - self._spool_checked_at < SPOOL_RETRY_INTERVAL:
+            return
+        self._spool_checked_at = now
+        if os.path.exists(self.spool_path):
+            try:
+                self.replay_spool()
+            except DatabaseError:
+                logger.warning('补写暂存的审计日志失败，稍后重试', exc_info=True)
+
+    def replay_spool(self):
+        """把本地文件中暂存的日志写入数据库，返回写入条数"""
+        replaying = f'{self.spool_path}.{os.getpid()}.replaying'
+        with self._spool_lock:
+            try:
+                # 改名是原子操作，多个进程同时补写时只有一个能拿到文件
+                os.rename(self.spool_path, replaying)
+            except FileNotFoundError:
+                return 0
+        with open(replaying, encoding='utf-8') as spool:
+            instances = [_deserialize(json.loads(line)) for line in spool if line.strip()]
+        try:
+            for start in range(0, len(instances), BATCH_SIZE):
+                _insert(instances[start:start + BATCH_SIZE])
+        except DatabaseError:
+            # 未写完的部分放回暂存文件（已写入的批次不重复写）
+            self._spool(instances[start:])
+            os.remove(replaying)
+            raise
+        os.remove(replaying)
+        return len(instances)
+
+    def flush(self, timeout=10):
+        """停止后台线程并写完队列中的日志（进程退出时调用）"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._pid != os.getpid() or not thread.is_alive():
+                return
+            self._queue.put(_STOP)
+            self._thread = None
+        thread.join(timeout)
+
+
+writer = AuditLogWriter()
+atexit.register(writer.flush)
+
+
+def record(model, sync=False, coalesce_key=None, coalesce_window=None, **fields):
+    """记录一条审计日志
+
+    sync=True 时立即写入（删除、冻结等关键操作），否则交给后台线程批量写入。
+    coalesce_key/coalesce_window（秒）用于合并重复事件：第一次事件立即写入，同一 key 在窗口内的后续事件
+    不再单独写入，只累加到这条记录的 event_count 和 last_event_at（模型需要有这两个字段）。
+    """
+    instance = model(**fields)
+    if sync or not ASYNC_ENABLED:
+        instance.save(force_insert=True)
+        return instance
+    # 事务提交后才入队；不在事务中时立即入队
+    transaction.on_commit(lambda: writer.put(instance, coalesce_key, coalesce_window))
+    return instance
@@ -0,0 +1,128 @@
+"""备份保留策略（祖父-父-子）与定时备份
+
+保留规则（select_keep）：
+- 最近 BACKUP_RETENTION_DAYS 天内的备份全部保留（子）；
+- 最近 BACKUP_RETENTION_WEEKS 周中，每周保留最新的一个（父）；
+- 最近 BACKUP_RETENTION_MONTHS 个月中，每月保留最新的一个（祖父）；
+- 最新的一个已完成备份总是保留；未完成（等待中、备份中）的备份不处理。
+其余备份通过 delete_backups() 删除（仍被保留的增量备份引用的暂时保留），随后清理没有记录的文件、
+回收分块仓库，并报告释放的空间。
+
+保留天数和是否自动备份优先使用系统配置页面中的设置（SystemConfig），没有时使用 TEACHER_DOC_SETTINGS。
+"""
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .backups import collect_garbage, delete_backups, plan_deletion, sweep_orphans
+from .models import Backup, BackupChunk, SystemConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BackupRetention:
+    days: int
+    weeks: int = 0
+    months: int = 0
+
+    def select_keep(self, backups, now=None):
+        """backups 中需要保留的备份的主键集合"""
+        today = timezone.localtime(now or timezone.now()).date()
+        this_week = today - timedelta(days=today.weekday())
+        first_week = this_week - timedelta(weeks=max(self.weeks - 1, 0))
+        first_month = _add_months(today.replace(day=1), -max(self.months - 1, 0))
+
+        keep = set()
+        weeks_seen = set()
+        months_seen = set()
+        completed = sorted(
+            (backup for backup in backups if backup.status == 'completed'),
+            key=lambda backup: backup.created_at, reverse=True
+        )
+        if completed:
+            keep.add(completed[0].pk)
+        for backup in completed:
+            day = timezone.localtime(backup.created_at).date()
+            if (today - day).days < self.days:
+                keep.add(backup.pk)
+            week = day - timedelta(days=day.weekday())
+            if self.weeks and week >= first_week and week not in weeks_seen:
+                weeks_seen.add(week)
+                keep.add(backup.pk)
+            month = day.replace(day=1)
+            if self.months and month >= first_month and month not in months_seen:
+                months_seen.add(month)
+                keep.add(backup.pk)
+        return keep
+
+
+def _add_months(month, delta):
+    index = month.year * 12 + month.month - 1 + delta
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _config_int(key, default):
+    try:
+        return int(SystemConfig.get_value(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_retention():
+    options = settings.TEACHER_DOC_SETTINGS
+    return BackupRetention(
+        days=_config_int('backup_retention_days', options['BACKUP_RETENTION_DAYS']),
+        weeks=_config_int('backup_retention_weeks', options['BACKUP_RETENTION_WEEKS']),
+        months=_config_int('backup_retention_months', options['BACKUP_RETENTION_MONTHS']),
+    )
+
+
+def auto_backup_enabled():
+    value = SystemConfig.get_value('auto_backup_enabled')
+    if value is None:
+        return settings.TEACHER_DOC_SETTINGS['AUTO_BACKUP_ENABLED']
+    return str(value).lower() in ('true', '1', 'on')
+
+
+def expired_backups(retention=None, now=None):
+    """按保留策略过期的备份：未保留的已完成备份，以及超过保留天数的失败备份"""
+    retention = retention or get_retention()
+    backups = list(Backup.objects.exclude(status__in=('pending', 'running')))
+    keep = retention.select_keep(backups, now)
+    cutoff = (now or timezone.now()) - timedelta(days=retention.days)
+    return [
+        backup for backup in backups
+        if backup.pk not in keep and (backup.status == 'completed' or backup.created_at < cutoff)
+    ]
+
+
+def prune_backups(retention=None, dry_run=False, now=None):
+    """删除过期备份并回收空间，返回统计（dry_run 时只计算将要删除的备份）"""
+    retention = retention or get_retention()
+    expired = expired_backups(retention, now)
+    if dry_run:
+        deleted, kept = plan_deletion(expired)
+    else:
+        deleted, kept = delete_backups(expired)
+    result = {
+        'retention': {'days': retention.days, 'weeks': retention.weeks, 'months': retention.months},
+        'deleted': [backup.name for backup in deleted],
+        'kept_for_dependents': [backup.name for backup in kept],
+        'freed_bytes': sum(backup.file_size or 0 for backup in deleted),
+        'orphan_files': 0,
+        'repository': None,
+    }
+    if dry_run:
+        return result
+
+    result['orphan_files'], orphan_bytes = sweep_orphans()
+    result['freed_bytes'] += orphan_bytes
+    if BackupChunk.objects.exists():
+        result['repository'] = collect_garbage()
+        result['freed_bytes'] += result['repository']['bytes_freed']
+    logger.info('备份清理完成: %s', result)
+    return result
@@ -0,0 +1,206 @@
+"""备份文件写入：按类型选择压缩方式，并行压缩
+
+- 已经压缩过的格式（docx/pptx/xlsx、zip、图片、音视频等，见 BACKUP_STORED_EXTENSIONS）以 ZIP_STORED 存储，
+  不再浪费 CPU 重复压缩；
+- 其余文件在线程池中并行读取、计算哈希并压缩（zlib/isal 和 hashlib 处理大块数据时会释放 GIL，
+  线程即可利用多核，也不需要在进程间复制压缩结果），主线程按提交顺序写入 zip，备份内容的顺序是确定的；
+- 安装了 isal（python-isal）时使用其兼容 zlib 的 deflate 实现，速度快数倍，生成的仍是标准 zip；
+- 写入预压缩数据依赖 ZipFile 的内部属性（见 _write_compressed），当前 Python 版本中缺少这些属性时
+  所有文件改为在主线程中通过公开接口 ZipFile.open(info, 'w') 压缩写入；system/tests.py 检查生成的 zip 能通过 testzip()；
+- 超过 BACKUP_PARALLEL_MAX_SIZE 的大文件在主线程中流式压缩，正在处理的数据总量不超过
+  BACKUP_MAX_INFLIGHT_BYTES，内存占用有上限；
+- 按扩展名统计文件数、原始大小、压缩后大小和耗时，用于报告吞吐量和压缩率。
+"""
+import hashlib
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+try:
+    from isal import isal_zlib as deflate  # 可选依赖：未安装时使用标准库 zlib
+    DEFAULT_LEVEL = 1
+except ImportError:
+    import zlib as deflate
+    DEFAULT_LEVEL = 6
+
+DEFAULT_STORED_EXTENSIONS = (
+    'docx', 'pptx', 'xlsx', 'odt', 'odp', 'ods',
+    'zip', 'rar', '7z', 'gz', 'bz2', 'xz', 'zst',
+    'jpg', 'jpeg', 'png', 'gif', 'webp',
+    'mp3', 'mp4', 'm4a', 'avi', 'mov', 'mkv', 'webm',
+)
+STORED_EXTENSIONS = frozenset(getattr(settings, 'BACKUP_STORED_EXTENSIONS', DEFAULT_STORED_EXTENSIONS))
+COMPRESSION_LEVEL = getattr(settings, 'BACKUP_COMPRESSION_LEVEL', DEFAULT_LEVEL)
+WORKERS = getattr(settings, 'BACKUP_COMPRESSION_WORKERS', None) or os.cpu_count() or 1
+PARALLEL_MAX_SIZE = getattr(settings, 'BACKUP_PARALLEL_MAX_SIZE', 32 * 1024 * 1024)
+MAX_INFLIGHT_BYTES = getattr(settings, 'BACKUP_MAX_INFLIGHT_BYTES', 256 * 1024 * 1024)
+READ_CHUNK_SIZE = 1024 * 1024
+# _write_compressed 用到的 ZipFile 内部属性
+_ZIPFILE_INTERNALS = ('_lock', '_writing', '_writecheck', '_didModify', 'start_dir', 'fp', 'filelist', 'NameToInfo')
+
+
+def file_extension(path):
+    return os.path.splitext(path)[1].lstrip('.').lower() or '(无)'
+
+
+def supports_precompressed(archive):
+    """archive 是否有 _write_compressed 需要的内部属性"""
+    return all(hasattr(archive, name) for name in _ZIPFILE_INTERNALS)
+
+
+def _compress_file(full_path, level):
+    """线程池中执行：读取、计算哈希并压缩为 raw deflate，返回 (压缩数据, CRC32, 原始大小, SHA-256, 耗时)"""
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    compressor = deflate.compressobj(level, deflate.DEFLATED, -15)
+    crc = 0
+    size = 0
+    parts = []
+    with open(full_path, 'rb') as source:
+        for chunk in iter(lambda: source.read(READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            crc = deflate.crc32(chunk, crc)
+            size += len(chunk)
+            parts.append(compressor.compress(chunk))
+    parts.append(compressor.flush())
+    return b''.join(parts), crc, size, digest.hexdigest(), time.perf_counter() - started
+
+
+class BackupWriter:
+    """向已打开的 zip 写入文件；add() 提交，完成时按提交顺序调用 on_stored(item, sha256, size)"""
+
+    def __init__(self, archive, on_stored, workers=WORKERS, level=COMPRESSION_LEVEL,
+                 parallel_max_size=PARALLEL_MAX_SIZE, max_inflight_bytes=MAX_INFLIGHT_BYTES):
+        self.archive = archive
+        self.on_stored = on_stored
+        self.level = level
+        self.parallel_max_size = parallel_max_size
+        self.max_inflight_bytes = max_inflight_bytes
+        if not supports_precompressed(archive):
+            workers = 1
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backup-compress') if workers > 1 else None
+        self.pending = deque()  # (item, member, future 或 None)
+        self.inflight_bytes = 0
+        self.stats = {}
+        self.started = time.perf_counter()
+
+    def add(self, item, member):
+        """item 需要有 full_path、size 属性"""
+        future = None
+        if self.executor is not None and item.size <= self.parallel_max_size and not self.is_stored(item):
+            while self.pending and self.inflight_bytes + item.size > self.max_inflight_bytes:
+                self._write_next()
+            future = self.executor.submit(_compress_file, item.full_path, self.level)
+            self.inflight_bytes += item.size
+        self.pending.append((item, member, future))
+        # 主线程处理的文件和已完成的压缩结果尽快写出，避免积压
+        while self.pending and (self.pending[0][2] is None or self.pending[0][2].done()):
+            self._write_next()
+
+    def close(self):
+        try:
+            while self.pending:
+                self._write_next()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+        return self.summary()
+
+    def is_stored(self, item):
+        return file_extension(item.full_path) in STORED_EXTENSIONS
+
+    def _write_next(self):
+        item, member, future = self.pending.popleft()
+        try:
+            if future is not None:
+                self.inflight_bytes -= item.size
+                payload, crc, size, digest, seconds = future.result()
+                self._write_compressed(item, member, payload, crc, size)
+                written = len(payload)
+            else:
+                digest, size, written, seconds = self._write_streaming(item, member)
+        except OSError as e:
+            self.on_stored(item, None, 0, error=e)
+            return
+        self._record(item, size, written, seconds)
+        self.on_stored(item, digest, size)
+
+    def _write_streaming(self, item, member):
+        """主线程中边读边写（大文件和已压缩格式）"""
+        started = time.perf_counter()
+        digest = hashlib.sha256()
+        size = 0
+        info = zipfile.ZipInfo.from_file(item.full_path, member, strict_timestamps=False)
+        info.compress_type = zipfile.ZIP_STORED if self.is_stored(item) else zipfile.ZIP_DEFLATED
+        with open(item.full_path, 'rb') as source, self.archive.open(info, 'w', force_zip64=True) as target:
+            for chunk in iter(lambda: source.read(READ_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                target.write(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size, info.compress_size, time.perf_counter() - started
+
+    def _write_compressed(self, item, member, payload, crc, size):
+        """写入已压缩好的 deflate 数据
+
+        zipfile 没有写入预压缩数据的公开接口，这里按 ZipFile._open_to_write 的步骤直接写本地文件头和数据
+        （大小和 CRC 已知，不需要回写文件头）。只用于不超过 BACKUP_PARALLEL_MAX_SIZE 的文件，不需要 ZIP64。
+        """
+        archive = self.archive
+        info = zipfile.ZipInfo.from_file(item.full_path, member, strict_timestamps=False)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.flag_bits = 0
+        info.CRC = crc
+        info.file_size = size
+        info.compress_size = len(payload)
+        with archive._lock:
+            if archive._writing:
+                raise ValueError('zip 文件正在被其他写入句柄使用')
+            archive.fp.seek(archive.start_dir)
+            info.header_offset = archive.fp.tell()
+            archive._writecheck(info)
+            archive._didModify = True
+            archive.fp.write(info.FileHeader(False))
+            archive.fp.write(payload)
+            archive.filelist.append(info)
+            archive.NameToInfo[info.filename] = info
+            archive.start_dir = archive.fp.tell()
+
+    def _record(self, item, size, written, seconds):
+        stats = self.stats.setdefault(file_extension(item.full_path), {
+            'files': 0, 'bytes': 0, 'compressed_bytes': 0, 'seconds': 0.0,
+            'stored': self.is_stored(item),
+        })
+        stats['files'] += 1
+        stats['bytes'] += size
+        stats['compressed_bytes'] += written
+        stats['seconds'] += seconds
+
+    def summary(self):
+        """总体和按类型的吞吐量（MB/s）与压缩率（压缩后/原始）"""
+        elapsed = time.perf_counter() - self.started
+        total = sum(stats['bytes'] for stats in self.stats.values())
+        compressed = sum(stats['compressed_bytes'] for stats in self.stats.values())
+        types = {}
+        for extension, stats in sorted(self.stats.items(), key=lambda pair: -pair[1]['bytes']):
+            types[extension] = {
+                **stats,
+                'seconds': round(stats['seconds'], 3),
+                'ratio': round(stats['compressed_bytes'] / stats['bytes'], 3) if stats['bytes'] else 1.0,
+                'mb_per_second': round(stats['bytes'] / 1e6 / stats['seconds'], 1) if stats['seconds'] else None,
+            }
+        return {
+            'codec': deflate.__name__,
+            'level': self.level,
+            'workers': self.executor._max_workers if self.executor is not None else 1,
+            'files': sum(stats['files'] for stats in self.stats.values()),
+            'bytes': total,
+            'compressed_bytes': compressed,
+            'seconds': round(elapsed, 3),
+            'ratio': round(compressed / total, 3) if total else 1.0,
+            'mb_per_second': round(total / 1e6 / elapsed, 1) if elapsed else None,
+            'types': types,
+        }
@@ -0,0 +1,538 @@
+"""增量备份
+
+每个备份是 MEDIA_ROOT/BACKUP_DIR 下的一个 zip 文件，包含：
+- manifest.json：备份时刻全部媒体文件的清单（路径、大小、修改时间、SHA-256、内容所在的备份文件）；
+- database_info.json：备份信息；
+- db/...：数据库的 JSONL 逻辑备份（见 system/dbdump.py）；
+- media/...：本次新增或修改的文件内容（BACKUP_FORMAT = 'chunked' 时文件内容按块保存在分块仓库中，见 system/chunkstore.py）。
+
+增量备份只读取大小或修改时间有变化的文件，其余文件沿用上一次清单中的哈希和所在备份，
+每次备份只读取、压缩变化的部分（按类型选择压缩方式并行压缩，见 system/backup_writer.py）。每 BACKUP_FULL_INTERVAL 次做一次完整备份，限制依赖链的长度。
+备份直接流式写入 BACKUP_DIR 中的 .partial 文件，完成后原子重命名，开始前检查磁盘剩余空间。
+
+恢复时按清单从各个备份文件中取出内容并校验哈希（合成完整备份），可以恢复任意一次备份时的状态（见 system/restore.py）。
+delete_backups() 删除旧备份时保留仍被其他备份引用的文件，不会破坏增量链（保留策略见 system/backup_retention.py）；
+collect_garbage() 回收分块仓库中不再被引用的块。
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import shutil
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .backup_writer import MAX_INFLIGHT_BYTES, PARALLEL_MAX_SIZE, WORKERS, BackupWriter, file_extension
+from .chunkstore import (
+    REPOSITORY_DIR, PackWriter, encode_file, pack_path, repository_lock, scan_pack, store_file
+)
+from .dbdump import DUMP_PREFIX, dump_database
+from .models import Backup, BackupChunk
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = getattr(settings, 'BACKUP_DIR', 'backups')
+FULL_INTERVAL = getattr(settings, 'BACKUP_FULL_INTERVAL', 7)
+SPACE_MARGIN = getattr(settings, 'BACKUP_SPACE_MARGIN', 64 * 1024 * 1024)
+BACKUP_FORMAT = getattr(settings, 'BACKUP_FORMAT', 'zip')  # 'zip' 或 'chunked'（分块去重仓库）
+REPOSITORY_SOURCE = posixpath.join(BACKUP_DIR, REPOSITORY_DIR)
+GC_GRACE = timedelta(hours=6)  # 新写入的块在这段时间内不回收
+REPACK_THRESHOLD = 0.5  # pack 中无用数据超过该比例时重新打包
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+MEDIA_PREFIX = 'media/'
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+    """备份文件缺失或内容与清单不符"""
+
+
+@dataclass
+class ManifestEntry:
+    """清单中的一个文件；source 为保存其内容的备份文件（相对 MEDIA_ROOT），
+    保存在分块仓库中时 source 为 REPOSITORY_SOURCE，chunks 为块的 SHA-256 列表"""
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    source: str
+    chunks: list = None
+
+    @property
+    def member(self):
+        return MEDIA_PREFIX + self.path
+
+
+class Manifest:
+    """一次备份时刻的媒体文件清单"""
+
+    def __init__(self, entries=(), backup_type='full', parent=None, created_at=None):
+        self.entries = {entry.path: entry for entry in entries}
+        self.backup_type = backup_type
+        self.parent = parent  # 上一个备份的文件路径
+        self.created_at = created_at
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    @property
+    def total_size(self):
+        return sum(entry.size for entry in self)
+
+    @property
+    def sources(self):
+        return {entry.source for entry in self}
+
+    def to_json(self):
+        return json.dumps({
+            'version': MANIFEST_VERSION,
+            'type': self.backup_type,
+            'parent': self.parent,
+            'created_at': self.created_at,
+            'files': [{key: value for key, value in asdict(entry).items() if value is not None} for entry in self],
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        if data.get('version') != MANIFEST_VERSION:
+            raise BackupError(f'不支持的清单版本: {data.get("version")}')
+        return cls(
+            (ManifestEntry(**item) for item in data['files']),
+            backup_type=data['type'], parent=data['parent'], created_at=data['created_at']
+        )
+
+
+@dataclass
+class MediaFile:
+    path: str  # 相对 MEDIA_ROOT，使用 / 分隔
+    full_path: str
+    size: int
+    mtime_ns: int
+
+
+def backup_full_path(relative_path):
+    return os.path.join(settings.MEDIA_ROOT, relative_path)
+
+
+def scan_media(media_root=None):
+    """遍历媒体目录（排除备份目录本身），按路径排序返回 MediaFile"""
+    media_root = str(media_root or settings.MEDIA_ROOT)
+    if not os.path.isdir(media_root):
+        return []
+    backup_root = os.path.normpath(os.path.join(media_root, BACKUP_DIR))
+    files = []
+    for root, dirs, names in os.walk(media_root):
+        # 排除备份目录，避免递归备份
+        dirs[:] = sorted(d for d in dirs if os.path.normpath(os.path.join(root, d)) != backup_root)
+        for name in names:
+            full_path = os.path.join(root, name)
+            try:
+                stat = os.lstat(full_path)
+            except OSError:
+                continue
+            if not os.path.isfile(full_path) or os.path.islink(full_path):
+                continue
+            path = os.path.relpath(full_path, media_root).replace(os.sep, '/')
+            files.append(MediaFile(path, full_path, stat.st_size, stat.st_mtime_ns))
+    files.sort(key=lambda item: item.path)
+    return files
+
+
+def load_manifest(backup):
+    """读取备份文件中的清单；旧格式的备份（没有清单）返回 None"""
+    path = backup_full_path(backup.file_path)
+    if not backup.file_path or not os.path.exists(path):
+        raise BackupError(f'备份文件不存在: {backup.file_path}')
+    with zipfile.ZipFile(path) as archive:
+        try:
+            return Manifest.from_json(archive.read(MANIFEST_NAME).decode('utf-8'))
+        except KeyError:
+            return None
+
+
+def previous_backup(exclude=None):
+    """最近一次有清单的已完成备份"""
+    backups = Backup.objects.filter(status='completed').exclude(file_path='').order_by('-completed_at', '-id')
+    if exclude is not None:
+        backups = backups.exclude(pk=exclude.pk)
+    for backup in backups[:5]:
+        try:
+            if load_manifest(backup) is not None:
+                return backup
+        except BackupError:
+            continue
+    return None
+
+
+def _chain_length(backup):
+    """从 backup 往前数到最近一次完整备份的增量备份个数"""
+    length = 0
+    while backup is not None and backup.backup_type == 'incremental':
+        length += 1
+        backup = backup.parent
+    return length
+
+
+def estimate_backup_size(items, reference=None):
+    """估计备份文件的大小（字节）
+
+    items 为需要保存内容的文件；按 reference（之前的备份）统计中各类型的压缩率估计，
+    没有统计的类型按不压缩计算。数据库部分沿用 reference 中的大小，另加 BACKUP_SPACE_MARGIN 余量。
+    """
+    stats = reference.stats if reference is not None else {}
+    ratios = {extension: min(1.0, item['ratio']) for extension, item in stats.get('types', {}).items()}
+    media = sum(item.size * ratios.get(file_extension(item.full_path), 1.0) for item in items)
+    database = stats.get('database', {}).get('bytes', 0)
+    # 每个文件另有 zip 本地文件头、中央目录项和清单中的一项（各含一份文件名）
+    overhead = sum(3 * len(item.path.encode('utf-8')) + 300 for item in items)
+    return int(media + database * 1.2 + overhead + SPACE_MARGIN)
+
+
+def check_free_space(directory, required):
+    free = shutil.disk_usage(directory).free
+    if free < required:
+        raise BackupError(
+            f'磁盘空间不足：备份预计需要 {required / 1024 ** 2:.1f} MB，{directory} 只剩 {free / 1024 ** 2:.1f} MB'
+        )
+
+
+def _store_chunks(items, on_stored, workers=WORKERS):
+    """把文件切块写入仓库（已有的块不重复保存），返回去重统计
+
+    和 BackupWriter 一样：不超过 BACKUP_PARALLEL_MAX_SIZE 的文件在线程池中并行切块、计算哈希并压缩，
+    主线程按提交顺序去重、写入 pack，正在处理的数据总量不超过 BACKUP_MAX_INFLIGHT_BYTES；大文件在主线程中流式处理。
+    """
+    started = time.perf_counter()
+    writer = PackWriter()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backup-chunk') if workers > 1 else None
+    pending = deque()  # (item, future 或 None)
+    inflight_bytes = 0
+
+    def store_next():
+        nonlocal inflight_bytes
+        item, future = pending.popleft()
+        try:
+            if future is None:
+                chunks, digest, size = store_file(writer, item.full_path)
+            else:
+                inflight_bytes -= item.size
+                encoded, digest, size = future.result()
+                chunks = [writer.add_encoded(*chunk) for chunk in encoded]
+        except OSError as e:
+            on_stored(item, None, 0, error=e)
+            return
+        on_stored(item, digest, size, chunks=chunks)
+
+    try:
+        for item in items:
+            future = None
+            if executor is not None and item.size <= PARALLEL_MAX_SIZE:
+                while pending and inflight_bytes + item.size > MAX_INFLIGHT_BYTES:
+                    store_next()
+                future = executor.submit(encode_file, item.full_path)
+                inflight_bytes += item.size
+            pending.append((item, future))
+            while pending and (pending[0][1] is None or pending[0][1].done()):
+                store_next()
+        while pending:
+            store_next()
+        writer.flush()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    elapsed = time.perf_counter() - started
+    stats = writer.stats
+    return {
+        'format': 'chunked',
+        'workers': workers,
+        'files': len(items),
+        **stats,
+        'seconds': round(elapsed, 3),
+        'mb_per_second': round(stats['bytes'] / 1e6 / elapsed, 1) if elapsed else None,
+        'dedup_ratio': round(stats['new_bytes'] / stats['bytes'], 3) if stats['bytes'] else 1.0,
+        'ratio': round(stats['stored_bytes'] / stats['bytes'], 3) if stats['bytes'] else 1.0,
+    }
+
+
+def create_backup(backup, full=False, backup_format=None):
+    """执行备份：有可用的上一次备份时做增量备份，否则做完整备份
+
+    备份直接写入目标目录中的 .partial 文件，完成后原子重命名（不经过临时目录，不需要再复制一次）；
+    开始前按预计大小检查目标磁盘的剩余空间。backup_format 为 'chunked' 时文件内容写入分块仓库。
+    """
+    chunked = (backup_format or BACKUP_FORMAT) == 'chunked'
+    parent = None if full else previous_backup(exclude=backup)
+    if parent is not None and _chain_length(parent) + 1 >= FULL_INTERVAL:
+        parent = None
+    previous = load_manifest(parent) if parent is not None else None
+    backup_type = 'incremental' if previous is not None else 'full'
+
+    filename = get_valid_filename(f'backup_{backup.name}_{timezone.localtime():%Y%m%d_%H%M%S}.zip')
+    relative_path = posixpath.join(BACKUP_DIR, filename)
+    destination = backup_full_path(relative_path)
+    partial = destination + '.partial'
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+    entries = []
+    changed = []
+    for item in scan_media():
+        old = previous.get(item.path) if previous is not None else None
+        if old is not None and old.size == item.size and old.mtime_ns == item.mtime_ns:
+            # 大小和修改时间都没变：不读取文件，沿用之前的内容
+            entries.append(old)
+        else:
+            changed.append(item)
+    estimated_size = estimate_backup_size(changed, parent or previous_backup(exclude=backup))
+    check_free_space(os.path.dirname(destination), estimated_size)
+    stored_count = 0
+
+    try:
+        with repository_lock() if chunked else contextlib.nullcontext(), open(partial, 'wb') as output:
+            with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+                archive.writestr('database_info.json', json.dumps({
+                    'database': settings.DATABASES['default']['NAME'],
+                    'backup_time': timezone.now().isoformat(),
+                    'backup_name': backup.name,
+                    'description': backup.description,
+                    'backup_type': backup_type,
+                }, ensure_ascii=False, indent=2))
+                # 先导出数据库，再备份媒体文件（恢复后数据库中引用的文件都在备份中）
+                database_started = time.perf_counter()
+                table_rows = dump_database(archive)
+                database_seconds = time.perf_counter() - database_started
+                database_bytes = sum(
+                    info.compress_size for info in archive.infolist() if info.filename.startswith(DUMP_PREFIX)
+                )
+
+                def stored(item, digest, size, error=None, chunks=None):
+                    nonlocal stored_count
+                    if error is not None:
+                        logger.warning('跳过文件 %s: %s', item.full_path, error)
+                        return
+                    source = relative_path if chunks is None else REPOSITORY_SOURCE
+                    entries.append(ManifestEntry(item.path, size, item.mtime_ns, digest, source, chunks))
+                    stored_count += 1
+
+                if chunked:
+                    # 块全部落盘并登记后才写清单，清单引用的块总是存在
+                    statistics = _store_chunks(changed, stored)
+                else:
+                    writer = BackupWriter(archive, stored)
+                    try:
+                        for item in changed:
+                            writer.add(item, MEDIA_PREFIX + item.path)
+                    finally:
+                        statistics = writer.close()
+
+                entries.sort(key=lambda entry: entry.path)
+                manifest = Manifest(
+                    entries, backup_type=backup_type,
+                    parent=parent.file_path if parent is not None else None,
+                    created_at=timezone.now().isoformat()
+                )
+                archive.writestr(MANIFEST_NAME, manifest.to_json())
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(partial, destination)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except FileNotFoundError:
+            pass
+        raise
+
+    backup.file_path = relative_path
+    backup.file_size = os.path.getsize(destination)
+    backup.backup_type = backup_type
+    backup.parent = parent
+    backup.file_count = len(manifest)
+    backup.stored_file_count = stored_count
+    backup.source_size = manifest.total_size
+    backup.stats = {
+        **statistics,
+        'estimated_size': estimated_size,
+        'database': {
+            'rows': sum(table_rows.values()),
+            'bytes': database_bytes,
+            'seconds': round(database_seconds, 3),
+            'tables': table_rows,
+        },
+    }
+    backup.save()
+    backup.depends_on.set(Backup.objects.filter(file_path__in=manifest.sources - {relative_path}))
+    return manifest
+
+
+def _extract(archive, entry, target=None):
+    """从备份中取出一个文件到 target 并校验哈希；target 为 None 时只校验"""
+    partial = None
+    if target is not None:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = target + '.partial'
+    digest = hashlib.sha256()
+    try:
+        with archive.open(entry.member) as source:
+            with open(partial, 'wb') if partial else contextlib.nullcontext() as output:
+                for chunk in iter(lambda: source.read(READ_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    if output is not None:
+                        output.write(chunk)
+    except KeyError:
+        raise BackupError(f'{entry.source} 中缺少文件 {entry.path}')
+    if digest.hexdigest() != entry.sha256:
+        if partial:
+            os.remove(partial)
+        raise BackupError(f'文件 {entry.path} 的哈希与清单不符')
+    if partial:
+        os.replace(partial, target)
+        os.utime(target, ns=(entry.mtime_ns, entry.mtime_ns))
+
+
+def plan_deletion(backups):
+    """返回 (可以删除的备份, 因仍被其他保留的备份引用而需要保留的备份)，不做任何修改"""
+    backups = list(backups)
+    deleting = {backup.pk for backup in backups}
+    links = list(Backup.depends_on.through.objects.values_list('from_backup_id', 'to_backup_id'))
+    while True:
+        # 被未删除的备份引用的备份不能删除；被保留的备份所依赖的也要保留，直到不再变化
+        blocked = {to_id for from_id, to_id in links if to_id in deleting and from_id not in deleting}
+        if not blocked:
+            break
+        deleting -= blocked
+    return (
+        [backup for backup in backups if backup.pk in deleting],
+        [backup for backup in backups if backup.pk not in deleting],
+    )
+
+
+def delete_backups(backups):
+    """删除备份记录和文件；仍被其他保留的备份引用的不删除
+
+    先删除记录（事务提交后）再删除文件：删除文件失败时只会留下没有记录的文件，由 sweep_orphans() 清理。
+    返回 (已删除的备份列表, 因被引用而保留的备份列表)。
+    """
+    deleted, kept = plan_deletion(backups)
+    for backup in deleted:
+        with transaction.atomic():
+            Backup.objects.filter(pk=backup.pk).delete()
+        if backup.file_path:
+            try:
+                os.remove(backup_full_path(backup.file_path))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning('删除备份文件 %s 失败: %s', backup.file_path, e)
+    return deleted, kept
+
+
+def sweep_orphans(min_age=timedelta(days=1)):
+    """删除备份目录中没有对应记录的备份文件和中断遗留的 .partial 文件（超过 min_age 的），返回 (文件数, 字节数)"""
+    directory = backup_full_path(BACKUP_DIR)
+    if not os.path.isdir(directory):
+        return 0, 0
+    known = set(Backup.objects.exclude(file_path='').values_list('file_path', flat=True))
+    cutoff = time.time() - min_age.total_seconds()
+    count = freed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.endswith(('.zip', '.zip.partial')) or not os.path.isfile(path):
+            continue
+        stat = os.stat(path)
+        if posixpath.join(BACKUP_DIR, name) in known or stat.st_mtime > cutoff:
+            continue
+        os.remove(path)
+        count += 1
+        freed += stat.st_size
+        logger.info('删除没有记录的备份文件 %s', name)
+    return count, freed
+
+
+def collect_garbage(grace=GC_GRACE):
+    """回收分块仓库中不再被任何备份引用的块，返回统计
+
+    整个 pack 都无用时删除文件；无用数据超过 REPACK_THRESHOLD 时把仍在使用的块复制到新 pack（不重新压缩）；
+    其余 pack 暂时保留，无用的块仍可被之后的备份复用。最近 grace 内写入的块不回收。
+    """
+    stats = {'chunks_deleted': 0, 'packs_deleted': 0, 'packs_repacked': 0, 'bytes_freed': 0, 'unused_bytes': 0}
+    with repository_lock():
+        live = set()
+        for backup in Backup.objects.exclude(file_path=''):
+            manifest = load_manifest(backup)  # 备份文件缺失时报错：不知道它引用了哪些块，不能回收
+            if manifest is not None:
+                live.update(digest for entry in manifest if entry.chunks for digest in entry.chunks)
+
+        cutoff = timezone.now() - grace
+        for pack in BackupChunk.objects.values_list('pack', flat=True).distinct().order_by('pack'):
+            chunks = list(BackupChunk.objects.filter(pack=pack))
+            dead = [chunk for chunk in chunks if chunk.digest not in live and chunk.created_at < cutoff]
+            if not dead:
+                continue
+            path = pack_path(pack)
+            pack_size = os.path.getsize(path) if os.path.exists(path) else 0
+            dead_bytes = sum(chunk.length for chunk in dead)
+            if len(dead) == len(chunks):
+                BackupChunk.objects.filter(pack=pack).delete()
+                _remove_pack(pack)
+                stats['packs_deleted'] += 1
+                stats['bytes_freed'] += pack_size
+            elif dead_bytes >= pack_size * REPACK_THRESHOLD:
+                stats['bytes_freed'] += pack_size - _repack(pack, [chunk for chunk in chunks if chunk not in dead], dead)
+                stats['packs_repacked'] += 1
+            else:
+                stats['unused_bytes'] += dead_bytes
+                continue
+            stats['chunks_deleted'] += len(dead)
+    logger.info('备份仓库垃圾回收: %s', stats)
+    return stats
+
+
+def _repack(pack, keep, dead):
+    """把 keep 中的块复制到新 pack（不重新压缩）并删除旧 pack，返回新 pack 的大小"""
+    wanted = {chunk.offset: chunk for chunk in keep}
+    writer = PackWriter(pack_size=float('inf'))  # 全部写入同一个新 pack
+    try:
+        for offset, record in scan_pack(pack_path(pack)):
+            chunk = wanted.get(offset)
+            if chunk is not None:
+                writer.add_record(chunk.digest, record, chunk.size)
+        new_pack = writer.pack
+        # 删除旧索引和登记新位置在同一个事务中
+        with transaction.atomic():
+            BackupChunk.objects.filter(pk__in=[chunk.pk for chunk in keep + dead]).delete()
+            writer.flush()
+    except BaseException:
+        writer.abort()
+        raise
+    _remove_pack(pack)
+    logger.info('重新打包 %s -> %s（保留 %d 个块）', pack, new_pack, len(keep))
+    return os.path.getsize(pack_path(new_pack))
+
+
+def _remove_pack(pack):
+    path = pack_path(pack)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+    with contextlib.suppress(OSError):
+        os.rmdir(os.path.dirname(path))  # 目录不为空时保留
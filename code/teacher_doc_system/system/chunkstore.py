@@ -0,0 +1,389 @@
+"""分块去重的备份仓库
+
+BACKUP_FORMAT = 'chunked' 时，备份中新增或修改的媒体文件不再整个写入 zip，而是：
+- 按内容切分为块（gear 滚动哈希，平均约 BACKUP_CHUNK_AVG_SIZE），切分点只取决于附近的内容，
+  文件中间插入或修改一段内容时，只有附近的块发生变化；安装了 numpy 时整段向量化计算哈希（数百 MB/s），
+  否则逐字节计算（约 7 MB/s，只适合小仓库），两种实现的切分点相同；
+- 块按 SHA-256 去重，所有备份共享，只保存一次；新块压缩后（压缩没有收益时原样）追加到 pack 文件，
+  pack 写满（BACKUP_PACK_SIZE）后落盘并在 BackupChunk 中登记位置；
+- 备份清单中的文件记录块列表（ManifestEntry.chunks），数据库导出和清单仍保存在备份的 zip 中。
+
+pack 中每个块记录自带头部（SHA-256、压缩方式、长度），索引丢失时可以扫描 pack 重建（rebuild_index）。
+仓库位于 MEDIA_ROOT/BACKUP_DIR/repository，备份和垃圾回收（见 system/backups.py）通过 repository_lock
+（仓库目录中 .lock 文件上的 flock）互斥，不依赖缓存，持有者退出时自动释放。
+"""
+import contextlib
+import hashlib
+import os
+import struct
+import uuid
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境：单进程运行，不需要跨进程锁
+    fcntl = None
+
+try:
+    import numpy  # 可选依赖：未安装时逐字节计算切分点
+except ImportError:
+    numpy = None
+
+from django.conf import settings
+
+from .models import BackupChunk
+
+REPOSITORY_DIR = 'repository'
+CHUNK_MIN_SIZE = getattr(settings, 'BACKUP_CHUNK_MIN_SIZE', 256 * 1024)
+CHUNK_AVG_SIZE = getattr(settings, 'BACKUP_CHUNK_AVG_SIZE', 1024 * 1024)
+CHUNK_MAX_SIZE = getattr(settings, 'BACKUP_CHUNK_MAX_SIZE', 4 * 1024 * 1024)
+PACK_SIZE = getattr(settings, 'BACKUP_PACK_SIZE', 64 * 1024 * 1024)
+COMPRESSION_LEVEL = getattr(settings, 'BACKUP_COMPRESSION_LEVEL', 6)
+LOCK_FILE = '.lock'
+
+# 记录头：SHA-256（32 字节）、压缩方式、保存的长度、原始大小
+RECORD_HEADER = struct.Struct('>32sBII')
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+
+_MASK = (1 << 64) - 1
+_WINDOW = 64  # 左移 64 次后早先的字节不再影响哈希，切分点只取决于前 64 个字节
+# 固定的 gear 表（由字节值的 SHA-256 得到），不同机器、不同版本的切分点一致
+_GEAR = tuple(int.from_bytes(hashlib.sha256(bytes([value])).digest()[:8], 'big') for value in range(256))
+# 哈希值小于阈值时切分：超过最小长度后每个字节切分的概率为 1/(平均长度-最小长度)
+_CUT_THRESHOLD = (1 << 64) // max(1, CHUNK_AVG_SIZE - CHUNK_MIN_SIZE)
+_GEAR_ARRAY = numpy.array(_GEAR, dtype=numpy.uint64) if numpy is not None else None
+_SEGMENT_SIZE = 1024 * 1024  # numpy 实现每次计算的字节数（找到切分点后不再计算后面的部分）
+
+
+class ChunkError(Exception):
+    """仓库中的块缺失或内容与哈希不符"""
+
+
+def repository_root():
+    return os.path.join(settings.MEDIA_ROOT, getattr(settings, 'BACKUP_DIR', 'backups'), REPOSITORY_DIR)
+
+
+def pack_path(pack, root=None):
+    return os.path.join(root or repository_root(), 'packs', pack[:2], f'{pack}.pack')
+
+
+@contextlib.contextmanager
+def repository_lock():
+    """写入仓库（备份、垃圾回收）时持有，避免回收正在被新备份引用的块
+
+    使用仓库目录中锁文件上的 flock：所有进程（web、各个 Celery worker、管理命令）共用，
+    不会在持有者运行期间过期，进程退出（包括被杀死）时由系统释放。
+    """
+    root = repository_root()
+    os.makedirs(root, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(root, LOCK_FILE), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ChunkError('备份仓库正在被其他任务使用，请稍后重试')
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _find_cut(data, limit):
+    """data[:limit] 中第一个切分点"""
+    if limit <= CHUNK_MIN_SIZE:
+        return limit
+    if numpy is not None:
+        return _find_cut_vectorized(data, limit)
+    return _find_cut_python(data, limit)
+
+
+def _find_cut_python(data, limit):
+    gear, threshold, mask = _GEAR, _CUT_THRESHOLD, _MASK
+    digest = 0
+    for byte in data[CHUNK_MIN_SIZE - _WINDOW:CHUNK_MIN_SIZE]:
+        digest = ((digest << 1) + gear[byte]) & mask
+    for position, byte in enumerate(data[CHUNK_MIN_SIZE:limit], CHUNK_MIN_SIZE):
+        digest = ((digest << 1) + gear[byte]) & mask
+        if digest < threshold:
+            return position + 1
+    return limit
+
+
+def _find_cut_vectorized(data, limit):
+    """与 _find_cut_python 结果相同：位置 p 的哈希只取决于 data[p-63:p+1]，即 sum(gear[data[p-k]] << k)，
+    用倍增一次算出一段中所有位置的哈希（窗口 1 -> 2 -> ... -> 64，共 6 次数组运算）"""
+    threshold = numpy.uint64(_CUT_THRESHOLD)
+    for start in range(CHUNK_MIN_SIZE, limit, _SEGMENT_SIZE):
+        end = min(limit, start + _SEGMENT_SIZE)
+        window = numpy.frombuffer(data, dtype=numpy.uint8, count=end - start + _WINDOW - 1,
+                                  offset=start - _WINDOW + 1)
+        digests = _GEAR_ARRAY[window]
+        width = 1
+        while width < _WINDOW:
+            digests[width:] += digests[:-width] << numpy.uint64(width)
+            width *= 2
+        cuts = numpy.flatnonzero(digests[_WINDOW - 1:] < threshold)
+        if len(cuts):
+            return start + int(cuts[0]) + 1
+    return limit
+
+
+def iter_chunks(source):
+    """把文件对象按内容切分，逐块返回 bytes"""
+    buffer = b''
+    eof = False
+    while True:
+        while not eof and len(buffer) < CHUNK_MAX_SIZE:
+            data = source.read(CHUNK_MAX_SIZE)
+            if not data:
+                eof = True
+            buffer += data
+        if not buffer:
+            return
+        cut = _find_cut(buffer, min(len(buffer), CHUNK_MAX_SIZE))
+        yield buffer[:cut]
+        buffer = buffer[cut:]
+
+
+def encode_record(data, digest, level=COMPRESSION_LEVEL):
+    payload = zlib.compress(data, level)
+    codec = CODEC_ZLIB
+    if len(payload) >= len(data):  # 已压缩的内容（图片、视频等）原样保存
+        payload, codec = data, CODEC_RAW
+    return RECORD_HEADER.pack(bytes.fromhex(digest), codec, len(payload), len(data)) + payload
+
+
+def decode_record(record):
+    """返回 (SHA-256, 原始内容)，内容与哈希不符时报错"""
+    raw_digest, codec, length, size = RECORD_HEADER.unpack_from(record)
+    payload = record[RECORD_HEADER.size:RECORD_HEADER.size + length]
+    try:
+        data = zlib.decompress(payload) if codec == CODEC_ZLIB else payload
+    except zlib.error as e:
+        raise ChunkError(f'块 {raw_digest.hex()} 无法解压: {e}')
+    digest = raw_digest.hex()
+    if len(data) != size or hashlib.sha256(data).hexdigest() != digest:
+        raise ChunkError(f'块 {digest} 的内容与哈希不符')
+    return digest, data
+
+
+def scan_pack(path):
+    """依次返回 pack 中的 (偏移, 记录)"""
+    with open(path, 'rb') as source:
+        offset = 0
+        while True:
+            header = source.read(RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < RECORD_HEADER.size:
+                raise ChunkError(f'{path} 在偏移 {offset} 处不完整')
+            length = RECORD_HEADER.unpack(header)[2]
+            payload = source.read(length)
+            if len(payload) < length:
+                raise ChunkError(f'{path} 在偏移 {offset} 处不完整')
+            yield offset, header + payload
+            offset += len(header) + length
+
+
+class ChunkReader:
+    """按索引读取块；index 为 {digest: (pack, offset, length)}，为 None 时按需查询 BackupChunk"""
+
+    def __init__(self, index=None, root=None):
+        self.index = index
+        self.root = root
+        self.files = {}
+
+    def read(self, digest):
+        if self.index is not None:
+            location = self.index.get(digest)
+        else:
+            location = BackupChunk.objects.filter(digest=digest).values_list('pack', 'offset', 'length').first()
+        if location is None:
+            raise ChunkError(f'仓库中缺少块 {digest}')
+        pack, offset, length = location
+        source = self.files.get(pack)
+        if source is None:
+            try:
+                source = self.files[pack] = open(pack_path(pack, self.root), 'rb')
+            except FileNotFoundError:
+                raise ChunkError(f'pack 文件不存在: {pack}')
+        source.seek(offset)
+        found, data = decode_record(source.read(length))
+        if found != digest:
+            raise ChunkError(f'索引中块 {digest} 的位置指向了其他内容')
+        return data
+
+    def close(self):
+        for source in self.files.values():
+            source.close()
+        self.files.clear()
+
+
+def load_index(digests, batch_size=1000):
+    """批量查询块的位置，返回 {digest: (pack, offset, length)}"""
+    digests = list(digests)
+    index = {}
+    for start in range(0, len(digests), batch_size):
+        rows = BackupChunk.objects.filter(digest__in=digests[start:start + batch_size])
+        index.update((digest, (pack, offset, length)) for digest, pack, offset, length in
+                     rows.values_list('digest', 'pack', 'offset', 'length'))
+    return index
+
+
+class PackWriter:
+    """向仓库追加新块；已有的块只返回哈希。pack 写满或调用 flush() 时落盘并登记索引"""
+
+    def __init__(self, root=None, level=COMPRESSION_LEVEL, pack_size=PACK_SIZE):
+        self.root = root or repository_root()
+        self.level = level
+        self.pack_size = pack_size
+        self.known = set()  # 本次已确认在仓库中的块
+        self.pending = {}  # 当前 pack 中的块：digest -> (offset, length, size)
+        self.pack = None
+        self.output = None
+        self.stats = {'chunks': 0, 'bytes': 0, 'new_chunks': 0, 'new_bytes': 0, 'stored_bytes': 0, 'packs': 0}
+
+    def add(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        if not self._stored(digest, len(data)):
+            self.add_record(digest, encode_record(data, digest, self.level), len(data))
+        return digest
+
+    def add_encoded(self, digest, record, size):
+        """添加已在其他线程中编码好的块（见 encode_file），已有的块丢弃记录"""
+        if not self._stored(digest, size):
+            self.add_record(digest, record, size)
+        return digest
+
+    def _stored(self, digest, size):
+        """块是否已在仓库中（或当前 pack 中）"""
+        self.stats['chunks'] += 1
+        self.stats['bytes'] += size
+        if digest in self.known or digest in self.pending:
+            return True
+        if BackupChunk.objects.filter(digest=digest).exists():
+            self.known.add(digest)
+            return True
+        return False
+
+    def add_record(self, digest, record, size):
+        """追加已编码的记录（垃圾回收重新打包时直接复制）"""
+        if self.output is None:
+            self.pack = uuid.uuid4().hex
+            path = pack_path(self.pack, self.root)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.output = open(path + '.partial', 'wb')
+        offset = self.output.tell()
+        self.output.write(record)
+        self.pending[digest] = (offset, len(record), size)
+        self.stats['new_chunks'] += 1
+        self.stats['new_bytes'] += size
+        self.stats['stored_bytes'] += len(record)
+        if self.output.tell() >= self.pack_size:
+            self.flush()
+
+    def flush(self):
+        """当前 pack 落盘（fsync 后重命名），再登记索引：索引中的块总是可读的"""
+        if self.output is None:
+            return
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        self.output.close()
+        path = pack_path(self.pack, self.root)
+        os.replace(path + '.partial', path)
+        BackupChunk.objects.bulk_create([
+            BackupChunk(digest=digest, pack=self.pack, offset=offset, length=length, size=size)
+            for digest, (offset, length, size) in self.pending.items()
+        ], batch_size=1000, ignore_conflicts=True)
+        self.known.update(self.pending)
+        self.pending = {}
+        self.output = None
+        self.stats['packs'] += 1
+
+    def abort(self):
+        """丢弃未落盘的 pack"""
+        if self.output is not None:
+            self.output.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(pack_path(self.pack, self.root) + '.partial')
+        self.pending = {}
+        self.output = None
+
+
+def store_file(writer, path):
+    """把文件切块写入仓库，返回 (块列表, SHA-256, 大小)"""
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    with open(path, 'rb') as source:
+        for data in iter_chunks(source):
+            digest.update(data)
+            size += len(data)
+            chunks.append(writer.add(data))
+    return chunks, digest.hexdigest(), size
+
+
+def encode_file(path, level=COMPRESSION_LEVEL):
+    """线程池中执行：把文件切块、计算哈希并编码（压缩）每个块，不访问数据库
+
+    返回 ([(块哈希, 记录, 原始大小)], 文件 SHA-256, 大小)，由主线程交给 PackWriter.add_encoded() 去重写入。
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    with open(path, 'rb') as source:
+        for data in iter_chunks(source):
+            digest.update(data)
+            size += len(data)
+            chunk_digest = hashlib.sha256(data).hexdigest()
+            chunks.append((chunk_digest, encode_record(data, chunk_digest, level), len(data)))
+    return chunks, digest.hexdigest(), size
+
+
+def extract_file(reader, entry, target=None):
+    """按清单项（chunks、sha256、mtime_ns）从仓库中取出文件到 target 并校验；target 为 None 时只校验"""
+    partial = None
+    if target is not None:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = target + '.partial'
+    digest = hashlib.sha256()
+    try:
+        with open(partial, 'wb') if partial else contextlib.nullcontext() as output:
+            for chunk in entry.chunks:
+                data = reader.read(chunk)
+                digest.update(data)
+                if output is not None:
+                    output.write(data)
+        if digest.hexdigest() != entry.sha256:
+            raise ChunkError(f'文件 {entry.path} 的哈希与清单不符')
+    except BaseException:
+        if partial:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(partial)
+        raise
+    if partial:
+        os.replace(partial, target)
+        os.utime(target, ns=(entry.mtime_ns, entry.mtime_ns))
+
+
+def rebuild_index(root=None):
+    """扫描全部 pack 重建块索引（补上缺失的记录），返回补上的块数"""
+    root = root or repository_root()
+    packs_dir = os.path.join(root, 'packs')
+    added = 0
+    for directory, _, names in os.walk(packs_dir):
+        for name in sorted(names):
+            if not name.endswith('.pack'):
+                continue
+            pack = name[:-len('.pack')]
+            chunks = []
+            for offset, record in scan_pack(os.path.join(directory, name)):
+                digest, data = decode_record(record)
+                chunks.append(BackupChunk(digest=digest, pack=pack, offset=offset, length=len(record), size=len(data)))
+            before = BackupChunk.objects.count()
+            BackupChunk.objects.bulk_create(chunks, batch_size=1000, ignore_conflicts=True)
+            added += BackupChunk.objects.count() - before
+    return added
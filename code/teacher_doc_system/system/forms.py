@@ -1,6 +1,10 @@
+import re
+
 from django import forms
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from .models import SystemConfig
+from .models import Backup, SystemConfig
+from .profiling import MAX_DURATION, MAX_PROFILES_PER_RULE
 
 
 class SystemConfigForm(forms.ModelForm):
@@ -150,7 +154,27 @@ class SystemSettingsForm(forms.Form):
         widget=forms.NumberInput(attrs={
             'class': 'form-control'
         }),
-        help_text='自动删除超过此天数的备份文件'
+        help_text='此天数内的备份全部保留，更早的按周、按月各保留一个'
+    )
+    
+    backup_retention_weeks = forms.IntegerField(
+        label='每周保留(周)',
+        min_value=0,
+        max_value=104,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control'
+        }),
+        help_text='最近几周中每周保留最新的一个备份'
+    )
+    
+    backup_retention_months = forms.IntegerField(
+        label='每月保留(月)',
+        min_value=0,
+        max_value=120,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control'
+        }),
+        help_text='最近几个月中每月保留最新的一个备份'
     )
     
     def clean(self):
@@ -189,6 +213,22 @@ class LogFilterForm(forms.Form):
         ('publish', '发布'),
     ]
     
+    SOURCE_CHOICES = [
+        ('document', '文档操作日志'),
+        ('system', '系统日志'),
+        ('login', '登录日志'),
+        ('user', '用户操作日志'),
+    ]
+    
+    source = forms.ChoiceField(
+        choices=SOURCE_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={
+            'class': 'form-control'
+        }),
+        label='日志类型'
+    )
+    
     level = forms.ChoiceField(
         choices=LEVEL_CHOICES,
         required=False,
@@ -243,6 +283,19 @@ class LogFilterForm(forms.Form):
         label='IP地址'
     )
     
+    include_archive = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        label='包括历史归档'
+    )
+    
+    def __init__(self, *args, operation_choices=None, archive_max_days=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 不同日志表的操作类型不同（如用户操作日志为冻结、解冻等）
+        if operation_choices is not None:
+            self.fields['operation'].choices = [('', '所有操作')] + list(operation_choices)
+        self.archive_max_days = archive_max_days
+    
     def clean(self):
         cleaned_data = super().clean()
         date_from = cleaned_data.get('date_from')
@@ -251,4 +304,140 @@ class LogFilterForm(forms.Form):
         if date_from and date_to and date_from > date_to:
             raise ValidationError('开始日期不能晚于结束日期')
         
+        # 查找归档需要解压扫描归档文件，分页查询时限制日期范围
+        if cleaned_data.get('include_archive') and self.archive_max_days:
+            if not date_from or not date_to:
+                raise ValidationError('包括历史归档时需要填写开始日期和结束日期')
+            if (date_to - date_from).days + 1 > self.archive_max_days:
+                raise ValidationError(f'包括历史归档时日期范围不能超过 {self.archive_max_days} 天')
+        
+        return cleaned_data
+
+
+class ProfilingRuleForm(forms.Form):
+    """性能分析规则表单（用户和 URL 正则至少填写一项）"""
+    username = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': '用户名'
+        }),
+        label='用户名'
+    )
+    
+    path_pattern = forms.CharField(
+        required=False,
+        max_length=200,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'URL 正则，如 ^/documents/$'
+        }),
+        label='URL 正则'
+    )
+    
+    duration = forms.IntegerField(
+        initial=30,
+        min_value=1,
+        max_value=MAX_DURATION,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control'
+        }),
+        label='持续时间(分钟)'
+    )
+    
+    max_profiles = forms.IntegerField(
+        initial=20,
+        min_value=1,
+        max_value=MAX_PROFILES_PER_RULE,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control'
+        }),
+        label='最多采集次数'
+    )
+    
+    def clean_username(self):
+        username = self.cleaned_data.get('username', '').strip()
+        if not username:
+            return None
+        try:
+            return get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise ValidationError('用户不存在')
+    
+    def clean_path_pattern(self):
+        pattern = self.cleaned_data.get('path_pattern', '').strip()
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ValidationError(f'正则表达式无效: {e}')
+        return pattern
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if not self.errors and not cleaned_data.get('username') and not cleaned_data.get('path_pattern'):
+            raise ValidationError('请至少填写用户名或 URL 正则')
+        return cleaned_data
+
+
+class BackupRestoreForm(forms.Form):
+    """恢复备份表单（默认只校验，不写入；整库恢复只能校验，需要使用 restore_backup 命令）"""
+    backup = forms.ModelChoiceField(
+        queryset=Backup.objects.filter(status='completed'),
+        widget=forms.Select(attrs={
+            'class': 'form-select'
+        }),
+        label='备份'
+    )
+    
+    username = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': '只恢复该用户的文档（留空为全部）'
+        }),
+        label='用户名'
+    )
+    
+    restore_media = forms.BooleanField(
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        label='媒体文件'
+    )
+    
+    restore_database = forms.BooleanField(
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        label='数据库'
+    )
+    
+    dry_run = forms.BooleanField(
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        label='只校验（不写入）'
+    )
+    
+    def clean_username(self):
+        username = self.cleaned_data.get('username', '').strip()
+        if not username:
+            return None
+        try:
+            return get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise ValidationError('用户不存在')
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if not self.errors and not cleaned_data.get('restore_media') and not cleaned_data.get('restore_database'):
+            raise ValidationError('请至少选择媒体文件或数据库')
+        if (not self.errors and cleaned_data.get('restore_database') and not cleaned_data.get('dry_run')
+                and not cleaned_data.get('username')):
+            # 整库恢复会清空并重新加载所有表，期间的请求会失败或写入的数据被覆盖，不能在网页上对运行中的站点执行
+            backup = cleaned_data['backup']
+            raise ValidationError(
+                f'整库恢复只能在网页上校验。请在维护窗口停止服务后执行 '
+                f'python manage.py restore_backup {backup.pk}（或只恢复某个用户的文档）'
+            )
         return cleaned_data
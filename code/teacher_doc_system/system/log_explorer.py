@@ -0,0 +1,222 @@
+"""日志查询与导出
+
+四张日志表（文档操作、系统、登录、用户操作）共用一套筛选（LogFilterForm）：
+- 日期范围转换为时间字段上的区间条件（不使用 __date，避免无法利用索引）；
+- 列表按 (时间, id) 倒序做键集分页；勾选“包括历史归档”时（列表页要求日期范围有限），
+  数据库中的记录取完后继续读取归档文件，否则只查询数据库，不解压归档；
+- 导出用 StreamingHttpResponse 逐行输出 CSV/JSONL，数据库部分按键集分批读取，
+  包括归档时接着输出归档中的记录，内存占用与导出条数无关。
+"""
+import csv
+import heapq
+import json
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, prefetch_related_objects
+from django.utils import timezone
+
+from documents.models import DocumentOperationLog
+from documents.pagination import count_queryset
+from users.models import LoginLog, UserOperationLog
+
+from .models import SystemLog
+from .retention import archived_row_count, iter_archived_logs
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+@dataclass
+class LogSource:
+    """一张日志表的查询配置"""
+    key: str
+    label: str
+    model: type
+    time_field: str = 'created_at'
+    user_field: str = 'user'
+    related: tuple = ('user',)
+    has_level: bool = False
+    operation_choices: tuple = ()
+
+    @property
+    def model_label(self):
+        return self.model._meta.label
+
+    @property
+    def export_fields(self):
+        return [f.attname for f in self.model._meta.concrete_fields]
+
+
+LOG_SOURCES = {
+    source.key: source for source in (
+        LogSource('document', '文档操作日志', DocumentOperationLog,
+                  related=('user', 'document'), operation_choices=DocumentOperationLog.OPERATION_CHOICES),
+        LogSource('system', '系统日志', SystemLog, has_level=True),
+        LogSource('login', '登录日志', LoginLog, time_field='login_time'),
+        LogSource('user', '用户操作日志', UserOperationLog,
+                  related=('user', 'operated_by'), operation_choices=UserOperationLog.OPERATION_CHOICES),
+    )
+}
+DEFAULT_SOURCE = 'document'
+
+
+def get_source(key):
+    return LOG_SOURCES.get(key) or LOG_SOURCES[DEFAULT_SOURCE]
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class LogQuery:
+    """根据 LogFilterForm 的 cleaned_data 构造日志查询"""
+
+    def __init__(self, source, filters):
+        self.source = source
+        self.filters = filters or {}
+        date_from = self.filters.get('date_from')
+        date_to = self.filters.get('date_to')
+        self.start = _day_start(date_from) if date_from else None
+        self.end = _day_start(date_to + timedelta(days=1)) if date_to else None
+        self.include_archive = bool(self.filters.get('include_archive'))
+
+    def equality_filters(self):
+        """除时间外的等值条件（字段 attname -> 值），数据库和归档共用"""
+        conditions = {}
+        if self.filters.get('user'):
+            conditions[f'{self.source.user_field}_id'] = self.filters['user']
+        if self.filters.get('ip_address'):
+            conditions['ip_address'] = self.filters['ip_address']
+        if self.source.operation_choices and self.filters.get('operation'):
+            conditions['operation'] = self.filters['operation']
+        if self.source.has_level and self.filters.get('level'):
+            conditions['level'] = self.filters['level']
+        return conditions
+
+    def queryset(self):
+        time_field = self.source.time_field
+        queryset = self.source.model.objects.filter(**self.equality_filters())
+        if self.start is not None:
+            queryset = queryset.filter(**{f'{time_field}__gte': self.start})
+        if self.end is not None:
+            queryset = queryset.filter(**{f'{time_field}__lt': self.end})
+        return queryset
+
+    def archived(self, ascending=False, end=None, start=None):
+        """归档中符合条件的记录；end/start 可进一步收窄时间范围（用于分页）"""
+        range_start = max(filter(None, (self.start, start)), default=None)
+        range_end = min(filter(None, (self.end, end)), default=None)
+        return iter_archived_logs(
+            self.source.model_label, start=range_start, end=range_end,
+            filters=self.equality_filters(), ascending=ascending
+        )
+
+    def _key(self, row):
+        return getattr(row, self.source.time_field), row.pk
+
+    def fetch(self, condition, ordering, limit, keyset=None):
+        """CursorPaginator 的取数函数：包括归档时，数据库记录不足一页则用归档记录补足"""
+        queryset = self.queryset().select_related(*self.source.related)
+        if condition is not None:
+            queryset = queryset.filter(condition)
+        rows = list(queryset.order_by(*ordering)[:limit])
+        if not self.include_archive:
+            return rows
+        ascending = not ordering[0].startswith('-')
+        if len(rows) >= limit and not ascending:
+            # 倒序时归档记录都比数据库中的旧，数据库已够一页就不必读取归档
+            return rows
+
+        direction, value, pk = keyset if keyset else (None, None, None)
+        if direction == 'lt':
+            # 结束时间放宽 1 微秒，保留与游标同一时间、id 更小的记录
+            archived = self.archived(end=value + timedelta(microseconds=1))
+            archived = (row for row in archived if self._key(row) < (value, pk))
+        elif direction == 'gt':
+            archived = self.archived(ascending=True, start=value)
+            archived = (row for row in archived if self._key(row) > (value, pk))
+        else:
+            archived = self.archived(ascending=ascending)
+        archived = list(islice(archived, limit))
+        if not archived:
+            return rows
+        prefetch_related_objects(archived, *self.source.related)
+
+        merged = heapq.merge(rows, archived, key=self._key, reverse=not ascending)
+        return list(islice(merged, limit))
+
+    def count(self, limit):
+        """CursorPaginator 的计数函数：数据库计数（包括归档时加上归档文件中的记录数）"""
+        total, is_estimate = count_queryset(self.queryset(), limit)
+        if not self.include_archive:
+            return total, is_estimate
+        archived = archived_row_count(self.source.model_label, self.start, self.end)
+        if archived:
+            # 归档按文件统计，有筛选条件时只是上限
+            total += archived
+            is_estimate = is_estimate or bool(self.equality_filters()) or bool(self.start or self.end)
+        return total, is_estimate
+
+    def _iter_database_rows(self, fields):
+        """按 (时间, id) 键集分批读取数据库记录
+
+        MySQL 驱动不支持服务端游标，.iterator() 仍会把整个结果集读入客户端内存，
+        因此每批单独查询，批次之间用上一批最后一条作为边界。
+        """
+        time_field = self.source.time_field
+        time_index = fields.index(time_field)
+        queryset = self.queryset().order_by(f'-{time_field}', '-pk').values_list(*fields)
+        boundary = None
+        while True:
+            batch = queryset
+            if boundary is not None:
+                value, pk = boundary
+                batch = batch.filter(
+                    Q(**{f'{time_field}__lt': value}) | Q(**{time_field: value, 'pk__lt': pk})
+                )
+            rows = list(batch[:EXPORT_CHUNK_SIZE])
+            yield from rows
+            if len(rows) < EXPORT_CHUNK_SIZE:
+                break
+            boundary = (rows[-1][time_index], rows[-1][0])
+
+    def iter_export_rows(self):
+        """导出用：先输出数据库中的记录，包括归档时再输出归档中的记录（均按时间倒序）"""
+        fields = self.source.export_fields
+        yield from self._iter_database_rows(fields)
+        if not self.include_archive:
+            return
+        for row in self.archived():
+            yield tuple(getattr(row, name) for name in fields)
+
+
+class _Echo:
+    """csv.writer 的输出对象：write 直接返回写入的内容"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return '' if value is None else value
+
+
+def stream_csv(log_query):
+    writer = csv.writer(_Echo())
+    fields = log_query.source.export_fields
+    # BOM 让 Excel 以 UTF-8 打开
+    yield '\ufeff' + writer.writerow(fields)
+    for row in log_query.iter_export_rows():
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def stream_jsonl(log_query):
+    fields = log_query.source.export_fields
+    for row in log_query.iter_export_rows():
+        yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
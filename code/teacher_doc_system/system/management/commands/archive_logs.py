@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from system.retention import ArchiveBusy, archive_old_logs, get_policies
+
+
+class Command(BaseCommand):
+    help = '按保留策略把过期日志归档为压缩文件，并从数据库中删除'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help='只处理该日志表（如 users.LoginLog），默认全部')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='每批归档的记录数')
+
+    def handle(self, *args, **options):
+        policies = get_policies()
+        if options['model']:
+            policies = [policy for policy in policies if policy.model_label == options['model']]
+            if not policies:
+                raise CommandError(f'没有该日志表的保留策略: {options["model"]}')
+
+        total = 0
+        for policy in policies:
+            try:
+                count = archive_old_logs(policy, chunk_size=options['chunk_size'])
+            except ArchiveBusy as e:
+                self.stdout.write(self.style.WARNING(f'{e}，跳过'))
+                continue
+            total += count
+            self.stdout.write(f'{policy.model_label}: 保留 {policy.days} 天，归档 {count} 条')
+
+        self.stdout.write(self.style.SUCCESS(f'归档完成，共 {total} 条'))
@@ -0,0 +1,69 @@
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import ResolverMatch
+
+from system.metrics import MetricsRegistry, render_prometheus
+from system.middleware import MetricsMiddleware
+
+
+class Command(BaseCommand):
+    help = '测试请求指标中间件的额外开销（每个请求增加的微秒数），超过预算时返回错误'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='每轮请求数（默认20000）')
+        parser.add_argument('--rounds', type=int, default=5, help='测试轮数，取中位数（默认5）')
+        parser.add_argument('--views', type=int, default=50, help='不同的URL名称数量（默认50）')
+        parser.add_argument(
+            '--budget', type=float, default=getattr(settings, 'METRICS_OVERHEAD_BUDGET_US', 50),
+            help='每个请求允许的额外开销（微秒）'
+        )
+
+    def _run(self, handler, requests):
+        started = time.perf_counter()
+        for request in requests:
+            handler(request)
+        return time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        response = HttpResponse(b'x' * 2048)
+
+        def view(request):
+            request.resolver_match = match_for[request.path]
+            return response
+
+        match_for = {}
+        requests = []
+        for index in range(options['requests']):
+            path = f'/bench/{index % options["views"]}/'
+            match_for.setdefault(path, ResolverMatch(view, (), {}, url_name=f'view_{index % options["views"]}'))
+            requests.append(factory.get(path))
+
+        with tempfile.TemporaryDirectory() as directory:
+            middleware = MetricsMiddleware(view)
+            # 独立的计数和目录，不影响正在运行的服务；每秒写一次文件，比默认更频繁
+            middleware.registry = MetricsRegistry(directory=directory, flush_interval=1)
+
+            baseline, instrumented = [], []
+            for _ in range(options['rounds']):
+                baseline.append(self._run(view, requests))
+                instrumented.append(self._run(middleware, requests))
+
+            per_request = (statistics.median(instrumented) - statistics.median(baseline)) / len(requests) * 1e6
+            rendered = render_prometheus(middleware.registry.collect())
+
+        self.stdout.write(
+            f'{len(requests)} 个请求 × {options["rounds"]} 轮：'
+            f'无中间件 {statistics.median(baseline) * 1000:.1f} ms，'
+            f'有中间件 {statistics.median(instrumented) * 1000:.1f} ms'
+        )
+        self.stdout.write(f'每个请求额外开销 {per_request:.2f} µs，指标输出 {len(rendered.splitlines())} 行')
+        if per_request > options['budget']:
+            raise CommandError(f'额外开销超过预算 {options["budget"]} µs')
+        self.stdout.write(self.style.SUCCESS(f'额外开销在预算 {options["budget"]} µs 以内'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from system.models import Backup
+from system.tasks import create_backup_task
+
+
+class Command(BaseCommand):
+    help = '创建备份（有上一次备份时为增量备份）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help='备份名称（默认按当前时间生成）')
+        parser.add_argument('--description', default='', help='备份描述')
+        parser.add_argument('--full', action='store_true', help='强制完整备份')
+        parser.add_argument('--format', choices=['zip', 'chunked'], help='备份格式（默认 BACKUP_FORMAT）')
+
+    def handle(self, *args, **options):
+        name = options['name'] or f'manual_{timezone.localtime():%Y%m%d_%H%M%S}'
+        backup = Backup.objects.create(name=name, description=options['description'])
+        create_backup_task(backup.id, full=options['full'], backup_format=options['format'])
+        backup.refresh_from_db()
+        self.stdout.write(self.style.SUCCESS(
+            f'备份完成: {backup.file_path}（{backup.get_backup_type_display()}），'
+            f'共 {backup.file_count} 个文件，本次保存 {backup.stored_file_count} 个，文件大小 {backup.file_size} 字节'
+        ))
+        self._report(backup.stats)
+
+    def _report(self, stats):
+        if not stats.get('files'):
+            return
+        if stats.get('format') == 'chunked':
+            self.stdout.write(
+                f'分块仓库: {stats["bytes"] / 1e6:.1f} MB 切分为 {stats["chunks"]} 个块，'
+                f'新增 {stats["new_chunks"]} 个（{stats["new_bytes"] / 1e6:.1f} MB，占 {stats["dedup_ratio"]:.1%}），'
+                f'压缩后写入 {stats["stored_bytes"] / 1e6:.1f} MB，用时 {stats["seconds"]:.1f} 秒（{stats["mb_per_second"]} MB/s）'
+            )
+            return
+        self.stdout.write(
+            f'压缩: {stats["codec"]} 级别 {stats["level"]}，{stats["workers"]} 个线程，'
+            f'{stats["bytes"] / 1e6:.1f} MB 用时 {stats["seconds"]:.1f} 秒（{stats["mb_per_second"]} MB/s），'
+            f'压缩率 {stats["ratio"]:.1%}'
+        )
+        self.stdout.write(f'{"类型":<8}{"文件数":>8}{"原始(MB)":>12}{"压缩后(MB)":>12}{"压缩率":>8}{"MB/s":>10}  方式')
+        for extension, item in stats['types'].items():
+            self.stdout.write(
+                f'{extension:<8}{item["files"]:>8}{item["bytes"] / 1e6:>12.1f}{item["compressed_bytes"] / 1e6:>12.1f}'
+                f'{item["ratio"]:>8.1%}{item["mb_per_second"] or "-":>10}  {"存储" if item["stored"] else "压缩"}'
+            )
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from system.backup_retention import get_retention, prune_backups
+from system.backups import BackupError, collect_garbage
+from system.chunkstore import ChunkError
+
+
+class Command(BaseCommand):
+    help = '按保留策略删除旧备份（每天/每周/每月，仍被增量备份引用的保留），并回收不再使用的文件和块'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='全部保留的天数（默认使用系统配置或 BACKUP_RETENTION_DAYS）')
+        parser.add_argument('--weeks', type=int, help='每周保留一个的周数（默认 BACKUP_RETENTION_WEEKS）')
+        parser.add_argument('--months', type=int, help='每月保留一个的月数（默认 BACKUP_RETENTION_MONTHS）')
+        parser.add_argument('--dry-run', action='store_true', help='只列出将要删除的备份，不删除')
+        parser.add_argument('--gc-only', action='store_true', help='只回收仓库，不删除备份')
+
+    def handle(self, *args, **options):
+        try:
+            if options['gc_only']:
+                self._report_garbage(collect_garbage())
+                self.stdout.write(self.style.SUCCESS('完成'))
+                return
+            retention = get_retention()
+            for key in ('days', 'weeks', 'months'):
+                if options[key] is not None:
+                    setattr(retention, key, options[key])
+            result = prune_backups(retention, dry_run=options['dry_run'])
+        except (BackupError, ChunkError) as e:
+            raise CommandError(str(e))
+
+        action = '将删除' if options['dry_run'] else '删除了'
+        self.stdout.write(
+            f'保留策略：{retention.days} 天内全部保留，{retention.weeks} 周内每周一个，{retention.months} 个月内每月一个'
+        )
+        self.stdout.write(f'{action} {len(result["deleted"])} 个备份')
+        for name in result['deleted']:
+            self.stdout.write(f'  {name}')
+        for name in result['kept_for_dependents']:
+            self.stdout.write(f'保留 {name}：仍被其他备份引用')
+        if result['orphan_files']:
+            self.stdout.write(f'删除了 {result["orphan_files"]} 个没有记录的备份文件')
+        if result['repository'] is not None:
+            self._report_garbage(result['repository'])
+        self.stdout.write(self.style.SUCCESS(f'完成，{"可" if options["dry_run"] else "已"}释放 {result["freed_bytes"]} 字节'))
+
+    def _report_garbage(self, garbage):
+        self.stdout.write(
+            f'仓库回收：删除 {garbage["chunks_deleted"]} 个块，删除 {garbage["packs_deleted"]} 个 pack，'
+            f'重新打包 {garbage["packs_repacked"]} 个，释放 {garbage["bytes_freed"]} 字节，'
+            f'剩余未使用 {garbage["unused_bytes"]} 字节'
+        )
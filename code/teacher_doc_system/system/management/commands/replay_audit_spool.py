@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from system.audit import writer
+
+
+class Command(BaseCommand):
+    help = '把数据库不可用时暂存在本地文件中的审计日志写入数据库'
+
+    def handle(self, *args, **options):
+        count = writer.replay_spool()
+        self.stdout.write(self.style.SUCCESS(f'补写完成，共写入 {count} 条审计日志'))
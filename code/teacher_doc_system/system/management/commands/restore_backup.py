@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from system.backups import BackupError
+from system.dbdump import DumpError
+from system.models import Backup
+from system.restore import RESTORE_WORKERS, restore_backup
+
+
+class Command(BaseCommand):
+    help = ('恢复某次备份：并行取出媒体文件并校验哈希（自动从依赖的备份中取出未变化的文件），重新加载数据库。'
+            '整库恢复会清空现有数据，请先停止 Web 服务和 Celery worker')
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup_id', type=int, help='备份ID')
+        parser.add_argument('--target', help='媒体文件恢复到的目录（默认 MEDIA_ROOT）')
+        parser.add_argument('--skip-media', action='store_true', help='不恢复媒体文件')
+        parser.add_argument('--skip-database', action='store_true', help='不恢复数据库')
+        parser.add_argument('--user', help='只恢复该用户的文档（文档、版本记录及其文件）')
+        parser.add_argument('--dry-run', action='store_true', help='只校验备份内容并统计，不写入')
+        parser.add_argument('--workers', type=int, default=RESTORE_WORKERS,
+                            help=f'并行线程数（默认{RESTORE_WORKERS}）')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='整库恢复前不要求确认')
+
+    def handle(self, *args, **options):
+        if options['skip_media'] and options['skip_database']:
+            raise CommandError('--skip-media 和 --skip-database 不能同时使用')
+        try:
+            backup = Backup.objects.get(pk=options['backup_id'], status='completed')
+        except Backup.DoesNotExist:
+            raise CommandError(f'找不到已完成的备份: {options["backup_id"]}')
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'用户不存在: {options["user"]}')
+
+        if (not options['skip_database'] and not options['dry_run'] and user is None
+                and options['interactive']):
+            self.stdout.write(self.style.WARNING(
+                f'将清空当前数据库并重新加载备份 {backup.name}，期间不要运行 Web 服务和 Celery worker。'
+            ))
+            if input(f'输入备份名称 {backup.name} 确认：').strip() != backup.name:
+                raise CommandError('已取消恢复')
+
+        try:
+            progress = restore_backup(
+                backup,
+                target_dir=options['target'],
+                media=not options['skip_media'],
+                database=not options['skip_database'],
+                user=user,
+                dry_run=options['dry_run'],
+                workers=options['workers'],
+            )
+        except (BackupError, DumpError) as e:
+            raise CommandError(str(e))
+
+        action = '可恢复' if options['dry_run'] else '已恢复'
+        if not options['skip_media']:
+            self.stdout.write(
+                f'{action} {progress["files_done"]} 个文件（{progress["bytes_done"]} 字节），'
+                f'{progress["files_skipped"]} 个文件未变化'
+            )
+        if not options['skip_database']:
+            self.stdout.write(f'{action} {progress["rows"]} 行数据')
+        self.stdout.write(self.style.SUCCESS(
+            f'{"校验" if options["dry_run"] else "恢复"}完成，用时 {progress["seconds"]} 秒'
+        ))
@@ -0,0 +1,77 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from system.backups import BackupError, load_manifest
+from system.chunkstore import ChunkError, ChunkReader, pack_path, rebuild_index
+from system.models import Backup, BackupChunk
+
+
+class Command(BaseCommand):
+    help = '检查分块备份仓库：pack 文件是否完整、备份引用的块是否都在，并抽样读取块校验哈希'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=200, help='抽样校验的块数（默认200）')
+        parser.add_argument('--all', action='store_true', help='校验全部块')
+        parser.add_argument('--rebuild-index', action='store_true', help='先扫描 pack 文件补全块索引')
+
+    def handle(self, *args, **options):
+        if options['rebuild_index']:
+            self.stdout.write(f'已补全 {rebuild_index()} 个块的索引')
+
+        problems = []
+        # pack 文件存在且不短于索引中的记录
+        for pack, end in self._pack_ends().items():
+            path = pack_path(pack)
+            try:
+                with open(path, 'rb') as source:
+                    size = source.seek(0, 2)
+            except FileNotFoundError:
+                problems.append(f'pack 文件不存在: {pack}')
+                continue
+            if size < end:
+                problems.append(f'pack 文件不完整: {pack}（{size} < {end} 字节）')
+
+        # 备份清单引用的块都在索引中
+        indexed = set(BackupChunk.objects.values_list('digest', flat=True))
+        referenced = 0
+        for backup in Backup.objects.filter(status='completed').exclude(file_path=''):
+            try:
+                manifest = load_manifest(backup)
+            except BackupError as e:
+                problems.append(str(e))
+                continue
+            digests = {digest for entry in manifest or () if entry.chunks for digest in entry.chunks}
+            referenced += len(digests)
+            missing = digests - indexed
+            if missing:
+                problems.append(f'备份 {backup.name} 引用的 {len(missing)} 个块不在仓库中')
+
+        # 抽样读取块，校验内容
+        pks = list(BackupChunk.objects.values_list('pk', flat=True))
+        if not options['all']:
+            pks = random.sample(pks, min(options['sample'], len(pks)))
+        reader = ChunkReader()
+        try:
+            for chunk in BackupChunk.objects.filter(pk__in=pks).order_by('pack', 'offset').iterator():
+                try:
+                    reader.read(chunk.digest)
+                except ChunkError as e:
+                    problems.append(str(e))
+        finally:
+            reader.close()
+
+        self.stdout.write(
+            f'仓库中 {len(indexed)} 个块，备份引用 {referenced} 次，校验了 {len(pks)} 个块'
+        )
+        if problems:
+            for problem in problems[:50]:
+                self.stderr.write(problem)
+            raise CommandError(f'发现 {len(problems)} 个问题')
+        self.stdout.write(self.style.SUCCESS('检查通过'))
+
+    def _pack_ends(self):
+        ends = {}
+        for pack, offset, length in BackupChunk.objects.values_list('pack', 'offset', 'length').iterator():
+            ends[pack] = max(ends.get(pack, 0), offset + length)
+        return ends
@@ -0,0 +1,287 @@
+"""请求指标（Prometheus 文本格式）
+
+MetricsMiddleware 按 URL 名称（如 documents:document_list）记录：
+- 请求数（按方法、状态码分类）和延迟直方图；
+- 数据库查询次数和耗时（通过 connection.execute_wrapper 统计）；
+- 响应大小；
+- 正在处理的请求数。
+计数保存在进程内（加锁的字典累加，开销在微秒级）。gunicorn 多进程部署时，每个进程每隔
+METRICS_FLUSH_INTERVAL 秒把自己的计数写入 METRICS_DIR 下的 JSON 文件，
+/system/metrics 汇总所有进程的文件输出；已退出进程的累计值保留，正在处理的请求数只统计存活进程。
+已退出进程的文件在汇总时合并进 metrics-retired.json 后删除，目录不会随 worker 重启无限增长；
+进程号被新进程复用时，新进程第一次写入前先把旧文件合并进去，累计值不会倒退。
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境：单进程运行，不需要跨进程锁
+    fcntl = None
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_DIR = str(getattr(settings, 'METRICS_DIR', settings.BASE_DIR / 'logs' / 'metrics'))
+FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+UNRESOLVED = '<unresolved>'
+# 其他请求方法（任意字符串）记为 other，避免客户端构造出无限多的序列
+KNOWN_METHODS = frozenset(('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'))
+OTHER_METHOD = 'other'
+RETIRED_FILE = 'metrics-retired.json'
+
+
+def _new_view_stats():
+    return {
+        'buckets': [0] * (len(LATENCY_BUCKETS) + 1),  # 最后一个为 +Inf
+        'latency_sum': 0.0,
+        'count': 0,
+        'db_queries': 0,
+        'db_seconds': 0.0,
+        'response_bytes': 0,
+        'statuses': defaultdict(int),
+    }
+
+
+class MetricsRegistry:
+    """进程内的指标计数"""
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._views = defaultdict(_new_view_stats)
+        self._in_flight = 0
+        self._flushed_at = time.monotonic()
+        self._token = None  # 本进程写入的文件标识（区分复用同一进程号的进程）
+        self._token_pid = None
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def request_finished(self, view, method, status, seconds, db_queries, db_seconds, response_bytes):
+        bucket = bisect_left(LATENCY_BUCKETS, seconds)
+        if method not in KNOWN_METHODS:
+            method = OTHER_METHOD
+        with self._lock:
+            self._in_flight -= 1
+            stats = self._views[(view, method)]
+            stats['buckets'][bucket] += 1
+            stats['latency_sum'] += seconds
+            stats['count'] += 1
+            stats['db_queries'] += db_queries
+            stats['db_seconds'] += db_seconds
+            stats['response_bytes'] += response_bytes
+            stats['statuses'][status] += 1
+            flush = self.directory and time.monotonic() - self._flushed_at >= self.flush_interval
+            if flush:
+                self._flushed_at = time.monotonic()
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            views = [
+                {
+                    'view': view,
+                    'method': method,
+                    'buckets': list(stats['buckets']),
+                    'latency_sum': stats['latency_sum'],
+                    'count': stats['count'],
+                    'db_queries': stats['db_queries'],
+                    'db_seconds': stats['db_seconds'],
+                    'response_bytes': stats['response_bytes'],
+                    'statuses': dict(stats['statuses']),
+                }
+                for (view, method), stats in self._views.items()
+            ]
+            return {'pid': os.getpid(), 'token': self._process_token(), 'in_flight': self._in_flight, 'views': views}
+
+    def _process_token(self):
+        if self._token_pid != os.getpid():
+            self._token = uuid.uuid4().hex
+            self._token_pid = os.getpid()
+        return self._token
+
+    @contextmanager
+    def _directory_lock(self):
+        """合并、删除其他进程的文件时持有（多个 worker 同时汇总）"""
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def flush(self):
+        """把当前进程的计数写入共享目录（先写临时文件再改名，读取方不会读到半个文件）"""
+        snapshot = self.snapshot()
+        path = os.path.join(self.directory, f'metrics-{snapshot["pid"]}.json')
+        with self._directory_lock():
+            previous = _read_snapshot(path)
+            if previous is not None and previous.get('token') != snapshot['token']:
+                # 进程号被复用：先保留已退出进程的累计值
+                self._retire([previous])
+            _write_snapshot(path, snapshot)
+
+    def collect(self):
+        """汇总所有进程的计数；未配置共享目录时只返回当前进程"""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        with self._directory_lock():
+            dead = []
+            for name in os.listdir(self.directory):
+                if not (name.startswith('metrics-') and name.endswith('.json')):
+                    continue
+                path = os.path.join(self.directory, name)
+                snapshot = _read_snapshot(path)
+                if snapshot is None:
+                    continue
+                if name != RETIRED_FILE and snapshot['pid'] != os.getpid() and not _pid_alive(snapshot['pid']):
+                    dead.append((path, snapshot))
+                elif name != RETIRED_FILE:
+                    snapshots.append(snapshot)
+            if dead:
+                self._retire([snapshot for _, snapshot in dead])
+                for path, _ in dead:
+                    os.remove(path)
+            retired = _read_snapshot(os.path.join(self.directory, RETIRED_FILE))
+            if retired is not None:
+                snapshots.append(retired)
+        return snapshots
+
+    def _retire(self, snapshots):
+        """把已退出进程的计数合并进 metrics-retired.json（调用方持有目录锁）"""
+        path = os.path.join(self.directory, RETIRED_FILE)
+        retired = _read_snapshot(path) or {'pid': None, 'retired': True, 'in_flight': 0, 'views': []}
+        views = {(item['view'], item['method']): item for item in retired['views']}
+        for snapshot in snapshots:
+            for item in snapshot['views']:
+                key = (item['view'], item['method'])
+                if key not in views:
+                    views[key] = dict(item, buckets=list(item['buckets']), statuses=dict(item['statuses']))
+                    continue
+                merged = views[key]
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], item['buckets'])]
+                for field in ('latency_sum', 'count', 'db_queries', 'db_seconds', 'response_bytes'):
+                    merged[field] += item[field]
+                for status, count in item['statuses'].items():
+                    merged['statuses'][status] = merged['statuses'].get(status, 0) + count
+        retired['views'] = list(views.values())
+        _write_snapshot(path, retired)
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, encoding='utf-8') as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as output:
+        json.dump(snapshot, output)
+    os.replace(temporary, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(snapshots):
+    """把多个进程的快照合并为 Prometheus 文本格式"""
+    views = defaultdict(_new_view_stats)
+    in_flight = 0
+    for snapshot in snapshots:
+        if not snapshot.get('retired') and (snapshot['pid'] == os.getpid() or _pid_alive(snapshot['pid'])):
+            in_flight += snapshot['in_flight']
+        for item in snapshot['views']:
+            stats = views[(item['view'], item['method'])]
+            for index, count in enumerate(item['buckets']):
+                stats['buckets'][index] += count
+            for field in ('latency_sum', 'count', 'db_queries', 'db_seconds', 'response_bytes'):
+                stats[field] += item[field]
+            for status, count in item['statuses'].items():
+                stats['statuses'][status] += count
+
+    lines = [
+        '# HELP django_http_requests_in_flight 正在处理的请求数',
+        '# TYPE django_http_requests_in_flight gauge',
+        f'django_http_requests_in_flight {in_flight}',
+        '# HELP django_http_requests_total 请求数',
+        '# TYPE django_http_requests_total counter',
+    ]
+    ordered = sorted(views.items())
+    for (view, method), stats in ordered:
+        for status, count in sorted(stats['statuses'].items()):
+            lines.append(
+                f'django_http_requests_total{{view="{_label(view)}",method="{_label(method)}",status="{status}"}} {count}'
+            )
+
+    lines += [
+        '# HELP django_http_request_duration_seconds 请求处理时间',
+        '# TYPE django_http_request_duration_seconds histogram',
+    ]
+    for (view, method), stats in ordered:
+        labels = f'view="{_label(view)}",method="{_label(method)}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats['buckets']):
+            cumulative += count
+            lines.append(f'django_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'django_http_request_duration_seconds_sum{{{labels}}} {stats["latency_sum"]:.6f}')
+        lines.append(f'django_http_request_duration_seconds_count{{{labels}}} {stats["count"]}')
+
+    for name, field, help_text, fmt in (
+        ('django_db_queries_total', 'db_queries', '数据库查询次数', '{}'),
+        ('django_db_query_duration_seconds_total', 'db_seconds', '数据库查询耗时', '{:.6f}'),
+        ('django_http_response_bytes_total', 'response_bytes', '响应大小（字节）', '{}'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (view, method), stats in ordered:
+            value = fmt.format(stats[field])
+            lines.append(f'{name}{{view="{_label(view)}",method="{_label(method)}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class QueryCounter:
+    """connection.execute_wrapper 使用的查询计数器"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .metrics import UNRESOLVED, QueryCounter, registry
+from .profiling import run_profiled
+from .query_analysis import QueryAnalyzer, report_repeated
+
+
+class MetricsMiddleware:
+    """记录每个请求的耗时、数据库查询和响应大小（见 system/metrics.py）"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.registry = registry
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        self.registry.request_started()
+        started = time.perf_counter()
+        status = 500
+        response_bytes = 0
+        try:
+            with connection.execute_wrapper(counter):
+                response = self.get_response(request)
+            status = response.status_code
+            if response.has_header('Content-Length'):
+                response_bytes = int(response['Content-Length'])
+            elif not response.streaming:
+                response_bytes = len(response.content)
+            return response
+        finally:
+            match = getattr(request, 'resolver_match', None)
+            self.registry.request_finished(
+                match.view_name if match else UNRESOLVED,
+                request.method,
+                status,
+                time.perf_counter() - started,
+                counter.count,
+                counter.seconds,
+                response_bytes,
+            )
+
+
+class ProfilingMiddleware:
+    """按管理员开启的规则对请求做性能分析（见 system/profiling.py），需要放在认证中间件之后"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return run_profiled(self.get_response, request)
+
+
+class QueryAnalysisMiddleware:
+    """开发环境中检测 N+1 查询（见 system/query_analysis.py），生产环境不启用"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_ANALYSIS_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        analyzer = QueryAnalyzer()
+        with connection.execute_wrapper(analyzer):
+            response = self.get_response(request)
+        report_repeated(request, analyzer)
+        response['X-Query-Count'] = str(analyzer.count)
+        return response
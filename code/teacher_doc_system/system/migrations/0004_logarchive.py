@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-19 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0003_audit_log_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100, verbose_name='日志表')),
+                ('month', models.DateField(verbose_name='月份')),
+                ('path', models.CharField(max_length=500, verbose_name='文件路径')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='记录数')),
+                ('min_id', models.BigIntegerField(verbose_name='最小ID')),
+                ('max_id', models.BigIntegerField(verbose_name='最大ID')),
+                ('start_time', models.DateTimeField(verbose_name='最早记录时间')),
+                ('end_time', models.DateTimeField(verbose_name='最晚记录时间')),
+                ('file_size', models.BigIntegerField(default=0, verbose_name='文件大小(字节)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='归档时间')),
+            ],
+            options={
+                'verbose_name': '日志归档',
+                'verbose_name_plural': '日志归档',
+                'ordering': ['model_label', '-month', '-min_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='logarchive',
+            index=models.Index(fields=['model_label', 'month'], name='system_loga_model_l_61ccdb_idx'),
+        ),
+    ]
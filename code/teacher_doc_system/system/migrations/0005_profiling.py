@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-19 07:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('system', '0004_logarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path_pattern', models.CharField(blank=True, max_length=200, verbose_name='URL 正则')),
+                ('expires_at', models.DateTimeField(verbose_name='截止时间')),
+                ('max_profiles', models.PositiveIntegerField(default=20, verbose_name='最多采集次数')),
+                ('captured_count', models.PositiveIntegerField(default=0, verbose_name='已采集次数')),
+                ('is_active', models.BooleanField(default=True, verbose_name='是否启用')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_profiling_rules', to=settings.AUTH_USER_MODEL, verbose_name='创建人')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='profiling_rules', to=settings.AUTH_USER_MODEL, verbose_name='目标用户')),
+            ],
+            options={
+                'verbose_name': '性能分析规则',
+                'verbose_name_plural': '性能分析规则',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=10, verbose_name='请求方法')),
+                ('path', models.CharField(max_length=500, verbose_name='请求路径')),
+                ('view_name', models.CharField(blank=True, max_length=200, verbose_name='视图')),
+                ('status_code', models.PositiveIntegerField(default=0, verbose_name='状态码')),
+                ('duration_ms', models.FloatField(default=0, verbose_name='耗时(毫秒)')),
+                ('query_count', models.PositiveIntegerField(default=0, verbose_name='SQL 查询数')),
+                ('sql_ms', models.FloatField(default=0, verbose_name='SQL 耗时(毫秒)')),
+                ('profile_path', models.CharField(max_length=500, verbose_name='cProfile 文件')),
+                ('sql_path', models.CharField(max_length=500, verbose_name='SQL 记录文件')),
+                ('file_size', models.BigIntegerField(default=0, verbose_name='文件大小(字节)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='采集时间')),
+                ('rule', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='profiles', to='system.profilingrule', verbose_name='分析规则')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='request_profiles', to=settings.AUTH_USER_MODEL, verbose_name='请求用户')),
+            ],
+            options={
+                'verbose_name': '请求性能分析',
+                'verbose_name_plural': '请求性能分析',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='profilingrule',
+            index=models.Index(fields=['is_active', 'expires_at'], name='system_prof_is_acti_336559_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-19 07:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0005_profiling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backup',
+            name='backup_type',
+            field=models.CharField(choices=[('full', '完整备份'), ('incremental', '增量备份')], default='full', max_length=20, verbose_name='备份类型'),
+        ),
+        migrations.AddField(
+            model_name='backup',
+            name='depends_on',
+            field=models.ManyToManyField(blank=True, related_name='dependents', to='system.backup', verbose_name='引用的备份'),
+        ),
+        migrations.AddField(
+            model_name='backup',
+            name='file_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='文件数'),
+        ),
+        migrations.AddField(
+            model_name='backup',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='system.backup', verbose_name='上一个备份'),
+        ),
+        migrations.AddField(
+            model_name='backup',
+            name='source_size',
+            field=models.BigIntegerField(default=0, verbose_name='媒体文件总大小(字节)'),
+        ),
+        migrations.AddField(
+            model_name='backup',
+            name='stored_file_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='本次保存的文件数'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0006_incremental_backups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backup',
+            name='stats',
+            field=models.JSONField(blank=True, default=dict, verbose_name='备份统计'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-19 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0007_backup_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backup',
+            name='restore_progress',
+            field=models.JSONField(blank=True, default=dict, verbose_name='恢复进度'),
+        ),
+        migrations.AddField(
+            model_name='backup',
+            name='restore_started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='恢复开始时间'),
+        ),
+        migrations.AddField(
+            model_name='backup',
+            name='restore_status',
+            field=models.CharField(blank=True, choices=[('', '未恢复'), ('running', '恢复中'), ('completed', '恢复完成'), ('failed', '恢复失败')], default='', max_length=20, verbose_name='恢复状态'),
+        ),
+        migrations.AddField(
+            model_name='backup',
+            name='restore_updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='恢复进度更新时间'),
+        ),
+    ]
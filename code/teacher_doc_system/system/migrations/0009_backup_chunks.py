@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-19 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0008_backup_restore_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackupChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('pack', models.CharField(db_index=True, max_length=64, verbose_name='所在 pack')),
+                ('offset', models.BigIntegerField(verbose_name='偏移')),
+                ('length', models.PositiveIntegerField(verbose_name='记录长度(字节)')),
+                ('size', models.PositiveIntegerField(verbose_name='原始大小(字节)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '备份数据块',
+                'verbose_name_plural': '备份数据块',
+            },
+        ),
+    ]
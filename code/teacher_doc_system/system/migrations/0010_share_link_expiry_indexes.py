@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-19 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0009_backup_chunks'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sharelink',
+            name='system_shar_expires_31f61e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='sharelink',
+            index=models.Index(fields=['is_active', 'expires_at'], name='system_shar_is_acti_c86dd5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sharelink',
+            index=models.Index(fields=['is_active', 'max_downloads', 'download_count'], name='system_shar_is_acti_cce2de_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -66,7 +67,7 @@ class SystemLog(models.Model):
         verbose_name="相关用户"
     )
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name="IP地址")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name="创建时间")
     
     class Meta:
         verbose_name = "系统日志"
@@ -82,6 +83,93 @@ class SystemLog(models.Model):
         return f"[{self.level}] {self.message[:50]}"
 
 
+class Backup(models.Model):
+    """数据备份模型"""
+    STATUS_CHOICES = (
+        ('pending', '待备份'),
+        ('running', '备份中'),
+        ('completed', '已完成'),
+        ('failed', '失败'),
+    )
+    TYPE_CHOICES = (
+        ('full', '完整备份'),
+        ('incremental', '增量备份'),
+    )
+    RESTORE_STATUS_CHOICES = (
+        ('', '未恢复'),
+        ('running', '恢复中'),
+        ('completed', '恢复完成'),
+        ('failed', '恢复失败'),
+    )
+    
+    name = models.CharField(max_length=200, verbose_name="备份名称")
+    description = models.TextField(blank=True, verbose_name="备份描述")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="状态")
+    file_path = models.CharField(max_length=500, blank=True, verbose_name="备份文件路径")
+    file_size = models.BigIntegerField(null=True, blank=True, verbose_name="文件大小(字节)")
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='created_backups',
+        verbose_name="创建人"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="完成时间")
+    error_message = models.TextField(blank=True, verbose_name="错误信息")
+    # 增量备份（见 system/backups.py）：清单中未变化的文件引用之前备份中的内容
+    backup_type = models.CharField(max_length=20, choices=TYPE_CHOICES, default='full', verbose_name="备份类型")
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='children',
+        verbose_name="上一个备份"
+    )
+    depends_on = models.ManyToManyField(
+        'self',
+        symmetrical=False,
+        blank=True,
+        related_name='dependents',
+        verbose_name="引用的备份"
+    )  # 清单中的文件内容保存在这些备份中，删除时需要保留
+    file_count = models.PositiveIntegerField(default=0, verbose_name="文件数")
+    stored_file_count = models.PositiveIntegerField(default=0, verbose_name="本次保存的文件数")
+    source_size = models.BigIntegerField(default=0, verbose_name="媒体文件总大小(字节)")
+    stats = models.JSONField(default=dict, blank=True, verbose_name="备份统计")  # 吞吐量、按类型的压缩率
+    # 最近一次恢复（见 system/restore.py），页面轮询 restore_progress 显示进度
+    restore_status = models.CharField(max_length=20, choices=RESTORE_STATUS_CHOICES, blank=True, default='', verbose_name="恢复状态")
+    restore_progress = models.JSONField(default=dict, blank=True, verbose_name="恢复进度")
+    restore_started_at = models.DateTimeField(null=True, blank=True, verbose_name="恢复开始时间")
+    restore_updated_at = models.DateTimeField(null=True, blank=True, verbose_name="恢复进度更新时间")
+    
+    class Meta:
+        verbose_name = "数据备份"
+        verbose_name_plural = "数据备份"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+
+class BackupChunk(models.Model):
+    """分块去重备份仓库的块索引（见 system/chunkstore.py）：块按内容哈希只保存一次"""
+    digest = models.CharField(max_length=64, unique=True, verbose_name="SHA-256")
+    pack = models.CharField(max_length=64, db_index=True, verbose_name="所在 pack")
+    offset = models.BigIntegerField(verbose_name="偏移")
+    length = models.PositiveIntegerField(verbose_name="记录长度(字节)")  # 包括记录头，压缩后
+    size = models.PositiveIntegerField(verbose_name="原始大小(字节)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "备份数据块"
+        verbose_name_plural = "备份数据块"
+
+    def __str__(self):
+        return f"{self.digest[:12]} @ {self.pack}:{self.offset}"
+
+
 class ShareLink(models.Model):
     """分享链接模型"""
     document = models.ForeignKey(
@@ -113,7 +201,9 @@ class ShareLink(models.Model):
         verbose_name_plural = "分享链接"
         indexes = [
             models.Index(fields=['token']),
-            models.Index(fields=['expires_at', 'is_active']),
+            # 等值列在前，失效扫描只读仍有效的链接（见 system/share_links.py）
+            models.Index(fields=['is_active', 'expires_at']),
+            models.Index(fields=['is_active', 'max_downloads', 'download_count']),
             models.Index(fields=['created_by', 'created_at']),
         ]
         ordering = ['-created_at']
@@ -134,6 +224,20 @@ class ShareLink(models.Model):
                 not self.is_expired and 
                 (self.max_downloads == 0 or self.download_count < self.max_downloads))
     
+    def consume_download(self):
+        """占用一次下载次数，返回是否成功
+
+        用一条带条件的 UPDATE 完成检查和计数：只有链接仍然有效、未过期且次数未用完时才加一，
+        并发下载时不会超出 max_downloads，也不会丢失计数。
+        """
+        granted = ShareLink.objects.filter(
+            models.Q(max_downloads=0) | models.Q(download_count__lt=models.F('max_downloads')),
+            pk=self.pk, is_active=True, expires_at__gte=timezone.now()
+        ).update(download_count=models.F('download_count') + 1)
+        if granted:
+            self.refresh_from_db(fields=['download_count'])
+        return bool(granted)
+    
     def can_access(self, password=None):
         """检查是否可以访问"""
         if not self.is_available:
@@ -143,3 +247,108 @@ class ShareLink(models.Model):
             return self.password == password
         
         return True
+
+
+class LogArchive(models.Model):
+    """已归档的日志文件（每个文件为一批日志的 gzip 压缩 JSONL）"""
+    model_label = models.CharField(max_length=100, verbose_name="日志表")  # 如 documents.DocumentOperationLog
+    month = models.DateField(verbose_name="月份")  # 当月1日（本地时间）
+    path = models.CharField(max_length=500, verbose_name="文件路径")  # 相对 MEDIA_ROOT
+    row_count = models.PositiveIntegerField(default=0, verbose_name="记录数")
+    min_id = models.BigIntegerField(verbose_name="最小ID")
+    max_id = models.BigIntegerField(verbose_name="最大ID")
+    start_time = models.DateTimeField(verbose_name="最早记录时间")
+    end_time = models.DateTimeField(verbose_name="最晚记录时间")
+    file_size = models.BigIntegerField(default=0, verbose_name="文件大小(字节)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="归档时间")
+
+    class Meta:
+        verbose_name = "日志归档"
+        verbose_name_plural = "日志归档"
+        indexes = [
+            models.Index(fields=['model_label', 'month']),
+        ]
+        ordering = ['model_label', '-month', '-min_id']
+
+    def __str__(self):
+        return f"{self.model_label} {self.month:%Y-%m} ({self.row_count})"
+
+
+class ProfilingRule(models.Model):
+    """按需性能分析规则：在有效期内对指定用户和/或匹配 URL 的请求采集 cProfile 和 SQL 记录"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='profiling_rules',
+        verbose_name="目标用户"
+    )
+    path_pattern = models.CharField(max_length=200, blank=True, verbose_name="URL 正则")  # re.search 匹配 request.path
+    expires_at = models.DateTimeField(verbose_name="截止时间")
+    max_profiles = models.PositiveIntegerField(default=20, verbose_name="最多采集次数")
+    captured_count = models.PositiveIntegerField(default=0, verbose_name="已采集次数")
+    is_active = models.BooleanField(default=True, verbose_name="是否启用")
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='created_profiling_rules',
+        verbose_name="创建人"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "性能分析规则"
+        verbose_name_plural = "性能分析规则"
+        indexes = [
+            models.Index(fields=['is_active', 'expires_at']),
+        ]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        target = self.user.username if self.user_id else '所有用户'
+        return f"{target} {self.path_pattern or '*'}"
+
+    @property
+    def is_running(self):
+        return self.is_active and self.expires_at > timezone.now() and self.captured_count < self.max_profiles
+
+
+class RequestProfile(models.Model):
+    """一次请求的性能分析结果（cProfile 数据和 SQL 记录保存在 MEDIA_ROOT 下的文件中）"""
+    rule = models.ForeignKey(
+        ProfilingRule,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='profiles',
+        verbose_name="分析规则"
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='request_profiles',
+        verbose_name="请求用户"
+    )
+    method = models.CharField(max_length=10, verbose_name="请求方法")
+    path = models.CharField(max_length=500, verbose_name="请求路径")
+    view_name = models.CharField(max_length=200, blank=True, verbose_name="视图")
+    status_code = models.PositiveIntegerField(default=0, verbose_name="状态码")
+    duration_ms = models.FloatField(default=0, verbose_name="耗时(毫秒)")
+    query_count = models.PositiveIntegerField(default=0, verbose_name="SQL 查询数")
+    sql_ms = models.FloatField(default=0, verbose_name="SQL 耗时(毫秒)")
+    profile_path = models.CharField(max_length=500, verbose_name="cProfile 文件")  # 相对 MEDIA_ROOT
+    sql_path = models.CharField(max_length=500, verbose_name="SQL 记录文件")  # 相对 MEDIA_ROOT
+    file_size = models.BigIntegerField(default=0, verbose_name="文件大小(字节)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="采集时间")
+
+    class Meta:
+        verbose_name = "请求性能分析"
+        verbose_name_plural = "请求性能分析"
+        ordering = ['-created_at', '-id']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f}ms)"
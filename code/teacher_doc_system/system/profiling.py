@@ -0,0 +1,277 @@
+"""按需请求性能分析
+
+管理员在“性能分析”页面为某个用户和/或 URL 正则开启一条有时限的规则（ProfilingRule），
+ProfilingMiddleware 对匹配的请求采集 cProfile 数据和 SQL 记录，保存到 MEDIA_ROOT/PROFILING_DIR，
+只保留最近 PROFILING_KEEP 份。
+
+为了能在生产环境中开启，开销有严格上限：
+- 没有生效的规则时，每个请求只做一次时间比较（规则每 RULE_REFRESH_INTERVAL 秒从数据库刷新一次）；
+- 规则有效期最长 PROFILING_MAX_DURATION 分钟，采集次数不超过 max_profiles（按条件 UPDATE 占用名额）；
+- 每个进程同一时间只分析一个请求，每分钟最多 PROFILING_MAX_PER_MINUTE 个，超出的请求照常处理；
+- SQL 记录最多保存 MAX_SQL_ENTRIES 条，语句和参数截断。
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ProfilingRule, RequestProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = getattr(settings, 'PROFILING_DIR', 'profiles')
+KEEP = getattr(settings, 'PROFILING_KEEP', 50)
+MAX_PER_MINUTE = getattr(settings, 'PROFILING_MAX_PER_MINUTE', 10)
+MAX_DURATION = getattr(settings, 'PROFILING_MAX_DURATION', 120)  # 分钟
+MAX_PROFILES_PER_RULE = 100
+RULE_REFRESH_INTERVAL = 10  # 秒
+MAX_SQL_ENTRIES = 500
+MAX_SQL_LENGTH = 2000
+
+STATS_SORT_CHOICES = (
+    ('cumulative', '累计耗时'),
+    ('tottime', '自身耗时'),
+    ('ncalls', '调用次数'),
+)
+
+
+class SQLRecorder:
+    """connection.execute_wrapper 使用的 SQL 记录器"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.entries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.entries) < MAX_SQL_ENTRIES:
+                self.entries.append({
+                    'sql': sql[:MAX_SQL_LENGTH],
+                    'params': repr(params)[:MAX_SQL_LENGTH] if params else '',
+                    'many': many,
+                    'ms': round(elapsed * 1000, 3),
+                })
+
+
+class _ActiveRule:
+    """规则在进程内的缓存（预编译正则）"""
+
+    def __init__(self, rule):
+        self.pk = rule.pk
+        self.user_id = rule.user_id
+        self.pattern = re.compile(rule.path_pattern) if rule.path_pattern else None
+        self.expires_at = rule.expires_at
+
+    def matches(self, request, now):
+        if self.expires_at <= now:
+            return False
+        if self.pattern is not None and not self.pattern.search(request.path):
+            return False
+        if self.user_id is not None:
+            user = getattr(request, 'user', None)
+            return user is not None and user.is_authenticated and user.pk == self.user_id
+        return True
+
+
+class ProfilingGate:
+    """决定一个请求是否需要分析，并限制分析的频率和并发"""
+
+    def __init__(self, max_per_minute=MAX_PER_MINUTE, refresh_interval=RULE_REFRESH_INTERVAL):
+        self.max_per_minute = max_per_minute
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._running = threading.Lock()
+        self._rules = []
+        self._loaded_at = None
+        self._window_start = 0.0
+        self._window_count = 0
+
+    def invalidate(self):
+        """规则变化后立即重新加载（只影响当前进程，其他进程在刷新间隔内生效）"""
+        self._loaded_at = None
+
+    def _active_rules(self):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.refresh_interval:
+            return self._rules
+        with self._lock:
+            if self._loaded_at is None or now - self._loaded_at >= self.refresh_interval:
+                try:
+                    rules = ProfilingRule.objects.filter(
+                        is_active=True, expires_at__gt=timezone.now(),
+                        captured_count__lt=F('max_profiles')
+                    )
+                    self._rules = [_ActiveRule(rule) for rule in rules]
+                except Exception:
+                    # 分析功能出错不能影响正常请求
+                    logger.warning('加载性能分析规则失败', exc_info=True)
+                    self._rules = []
+                self._loaded_at = now
+        return self._rules
+
+    def match(self, request):
+        rules = self._active_rules()
+        if not rules:
+            return None
+        now = timezone.now()
+        for rule in rules:
+            if rule.matches(request, now):
+                return rule
+        return None
+
+    def acquire(self, rule):
+        """占用一次分析名额；并发、频率或规则次数超限时返回 False"""
+        if not self._running.acquire(blocking=False):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_start >= 60:
+                self._window_start = now
+                self._window_count = 0
+            allowed = self._window_count < self.max_per_minute
+            if allowed:
+                self._window_count += 1
+        if allowed:
+            try:
+                claimed = ProfilingRule.objects.filter(
+                    pk=rule.pk, is_active=True, captured_count__lt=F('max_profiles')
+                ).update(captured_count=F('captured_count') + 1)
+            except Exception:
+                logger.warning('占用性能分析名额失败', exc_info=True)
+                claimed = 0
+            if not claimed:
+                self.invalidate()
+                allowed = False
+        if not allowed:
+            self._running.release()
+        return allowed
+
+    def release(self):
+        self._running.release()
+
+
+gate = ProfilingGate()
+
+
+def _write_file(relative_path, write):
+    full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    temporary = full_path + '.partial'
+    write(temporary)
+    os.replace(temporary, full_path)
+    return os.path.getsize(full_path)
+
+
+def _write_json(data):
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(data, output, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return write
+
+
+def save_profile(rule, request, status_code, seconds, profiler, recorder):
+    """保存一次分析结果，并清理超出保留数量的旧结果"""
+    match = getattr(request, 'resolver_match', None)
+    user = getattr(request, 'user', None)
+    name = f'{timezone.localtime():%Y%m%d-%H%M%S}-{os.getpid()}-{time.monotonic_ns()}'
+    profile_path = os.path.join(PROFILE_DIR, f'{name}.prof')
+    sql_path = os.path.join(PROFILE_DIR, f'{name}.sql.json')
+
+    size = _write_file(profile_path, profiler.dump_stats)
+    size += _write_file(sql_path, _write_json(recorder.entries))
+    profile = RequestProfile.objects.create(
+        rule_id=rule.pk,
+        user=user if user is not None and user.is_authenticated else None,
+        method=request.method,
+        path=request.path[:500],
+        view_name=match.view_name if match else '',
+        status_code=status_code,
+        duration_ms=seconds * 1000,
+        query_count=recorder.count,
+        sql_ms=recorder.seconds * 1000,
+        profile_path=profile_path,
+        sql_path=sql_path,
+        file_size=size,
+    )
+    prune_profiles()
+    return profile
+
+
+def delete_profile_files(profile):
+    for path in (profile.profile_path, profile.sql_path):
+        try:
+            os.remove(os.path.join(settings.MEDIA_ROOT, path))
+        except FileNotFoundError:
+            pass
+
+
+def prune_profiles(keep=KEEP):
+    """只保留最近 keep 份分析结果"""
+    stale = list(RequestProfile.objects.order_by('-created_at', '-id')[keep:])
+    for profile in stale:
+        delete_profile_files(profile)
+    if stale:
+        RequestProfile.objects.filter(pk__in=[profile.pk for profile in stale]).delete()
+    return len(stale)
+
+
+def format_stats(profile, sort='cumulative', limit=40):
+    """cProfile 结果的文本报告（pstats 格式）"""
+    if sort not in dict(STATS_SORT_CHOICES):
+        sort = 'cumulative'
+    output = io.StringIO()
+    stats = pstats.Stats(os.path.join(settings.MEDIA_ROOT, profile.profile_path), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def load_sql_log(profile):
+    with open(os.path.join(settings.MEDIA_ROOT, profile.sql_path), encoding='utf-8') as source:
+        return json.load(source)
+
+
+def run_profiled(get_response, request):
+    """对当前请求做性能分析；不匹配任何规则或超出开销上限时直接处理请求"""
+    rule = gate.match(request)
+    if rule is None or not gate.acquire(rule):
+        return get_response(request)
+
+    profiler = cProfile.Profile()
+    recorder = SQLRecorder()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        with connection.execute_wrapper(recorder):
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        status_code = response.status_code
+        return response
+    finally:
+        seconds = time.perf_counter() - started
+        try:
+            save_profile(rule, request, status_code, seconds, profiler, recorder)
+        except Exception:
+            logger.warning('保存性能分析结果失败: %s', request.path, exc_info=True)
+        finally:
+            gate.release()
@@ -0,0 +1,123 @@
+"""SQL 查询分析：N+1 检测与视图查询预算
+
+开发环境（DEBUG）下 QueryAnalysisMiddleware 记录每个请求执行的 SQL，把只有参数不同的语句
+归为一类；同一类语句执行次数达到 QUERY_ANALYSIS_REPEAT_THRESHOLD 时记录警告，并指出触发查询的
+模板行（如 documents/category_list.html:373）和项目代码行，通常是模板中逐行访问了关联对象
+（category.children.count、document.author 等）而视图没有 select_related/prefetch_related。
+
+QUERY_BUDGETS 为主要页面的查询次数上限，由 system/tests.py 中的测试检查（超出预算或随数据行数增长时失败，
+失败信息中列出实际执行的语句）。
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+REPEAT_THRESHOLD = getattr(settings, 'QUERY_ANALYSIS_REPEAT_THRESHOLD', 5)
+
+# 主要页面每个请求的查询次数上限（URL 名称 -> 次数），为缓存已预热时的实测值，包括会话和用户的查询
+# （SESSION_SAVE_EVERY_REQUEST 使每个请求都有 SAVEPOINT、UPDATE django_session、RELEASE 三次）。
+# 有意增加查询时同时修改这里（或在 settings.QUERY_BUDGETS 中覆盖）
+DEFAULT_QUERY_BUDGETS = {
+    'documents:document_list': 8,
+    'documents:document_search': 7,  # 搜索结果的ID列表已缓存（见 documents/search_cache.py）
+    'documents:document_detail': 8,
+    'documents:teacher_dashboard': 15,
+    'documents:category_list': 10,
+    'documents:share_link_list': 7,
+    'documents:document_review_list': 7,
+    'system:dashboard': 8,
+}
+QUERY_BUDGETS = {**DEFAULT_QUERY_BUDGETS, **getattr(settings, 'QUERY_BUDGETS', {})}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_SKIP_DIRS = (os.path.dirname(__file__) + os.sep,)
+
+
+def normalize_sql(sql):
+    """去掉字面量并合并 IN 列表，只有参数不同的语句得到相同的结果"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+def _template_location(frame):
+    """调用栈中最内层正在渲染的模板节点（模板名:行号）"""
+    from django.template.base import Node
+
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            if isinstance(node, Node) and getattr(node, 'token', None) is not None:
+                origin = getattr(node, 'origin', None)
+                name = getattr(origin, 'template_name', None) or getattr(origin, 'name', '?')
+                return f'{name}:{node.token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+def _code_location(frame):
+    """调用栈中最内层的项目代码（相对 BASE_DIR 的文件:行号）"""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and not filename.startswith(_SKIP_DIRS):
+            return f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return None
+
+
+class QueryAnalyzer:
+    """connection.execute_wrapper 使用的查询记录器，按归一化后的语句分组"""
+
+    def __init__(self, locate=True):
+        self.locate = locate
+        self.count = 0
+        self.seconds = 0.0
+        self.groups = {}  # 归一化语句 -> {'count', 'seconds', 'sql', 'locations'}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            key = normalize_sql(sql)
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = {'count': 0, 'seconds': 0.0, 'sql': sql, 'locations': Counter()}
+            group['count'] += 1
+            group['seconds'] += elapsed
+            if self.locate:
+                frame = sys._getframe(1)
+                location = _template_location(frame) or _code_location(frame)
+                if location:
+                    group['locations'][location] += 1
+
+    def repeated(self, threshold=REPEAT_THRESHOLD):
+        """执行次数达到 threshold 的语句（次数多的在前）"""
+        return sorted(
+            (group for group in self.groups.values() if group['count'] >= threshold),
+            key=lambda group: group['count'], reverse=True
+        )
+
+
+def report_repeated(request, analyzer, threshold=REPEAT_THRESHOLD):
+    for group in analyzer.repeated(threshold):
+        locations = '、'.join(f'{location} ×{count}' for location, count in group['locations'].most_common(3))
+        logger.warning(
+            '%s %s 中相似查询执行了 %d 次（%.1f ms），可能是 N+1 查询，位置：%s\n%s',
+            request.method, request.path, group['count'], group['seconds'] * 1000,
+            locations or '未知', group['sql'][:500]
+        )
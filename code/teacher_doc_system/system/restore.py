@@ -0,0 +1,290 @@
+"""备份恢复
+
+restore_backup() 把某次备份恢复到当前系统：
+- 媒体文件：按清单从各个备份文件或分块仓库中取出内容（增量备份中未变化的文件保存在之前的备份里），
+  在有上限的线程池中并行解压，每个文件先写 .partial、校验 SHA-256 后再替换目标文件；
+  目标文件的大小和修改时间与清单一致时跳过，重复执行只处理有差异的文件（不删除清单以外的文件）；
+- 数据库：在一个事务中清空并重新加载备份中的数据（见 system/dbdump.py），失败时回滚，有文件恢复失败时不加载；
+- 指定 user 时只恢复该用户的文档和版本记录（按主键更新或插入）以及它们引用的文件；
+- dry_run 时读取并校验将要恢复的文件、统计数据行数，不写入任何内容；
+- 进度定期写入 Backup.restore_progress 供页面轮询，同一个备份同时只能有一个恢复任务。
+"""
+import logging
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .backups import BackupError, _extract, backup_full_path, load_manifest
+from .chunkstore import ChunkError, ChunkReader, extract_file, load_index
+from .dbdump import DumpError, load_database, read_dump_manifest, read_rows, replace_rows
+from .models import Backup
+
+logger = logging.getLogger(__name__)
+
+RESTORE_WORKERS = getattr(settings, 'BACKUP_RESTORE_WORKERS', 4)
+PROGRESS_INTERVAL = 1.0  # 秒
+STALE_AFTER = timedelta(minutes=10)  # 进度超过这么久没有更新的恢复任务视为已中断
+MAX_ERRORS = 20
+
+
+class RestoreProgress:
+    """恢复进度，最多每 PROGRESS_INTERVAL 秒写入一次 Backup 记录"""
+
+    def __init__(self, backup, dry_run=False):
+        self.backup = backup
+        self.data = {
+            'phase': 'prepare',
+            'dry_run': dry_run,
+            'files_total': 0,
+            'files_done': 0,
+            'files_skipped': 0,
+            'bytes_total': 0,
+            'bytes_done': 0,
+            'rows': 0,
+            'errors': [],
+        }
+        self.saved_at = 0.0
+
+    def claim(self):
+        """标记为恢复中；该备份已有未中断的恢复任务时报错"""
+        now = timezone.now()
+        claimed = Backup.objects.filter(pk=self.backup.pk).filter(
+            ~Q(restore_status='running') | Q(restore_updated_at__lt=now - STALE_AFTER)
+        ).update(restore_status='running', restore_progress=self.data, restore_started_at=now, restore_updated_at=now)
+        if not claimed:
+            raise BackupError(f'备份 {self.backup.name} 正在恢复中')
+        self.saved_at = time.monotonic()
+
+    def update(self, force=False, **changes):
+        self.data.update(changes)
+        if force or time.monotonic() - self.saved_at >= PROGRESS_INTERVAL:
+            self._save()
+
+    def error(self, message):
+        if len(self.data['errors']) < MAX_ERRORS:
+            self.data['errors'].append(message)
+
+    def finish(self, status):
+        self._save(restore_status=status)
+
+    def _save(self, **fields):
+        self.saved_at = time.monotonic()
+
+        def save():
+            Backup.objects.filter(pk=self.backup.pk).update(
+                restore_progress=self.data, restore_updated_at=timezone.now(), **fields
+            )
+
+        if not connection.in_atomic_block:
+            save()
+        elif connection.vendor != 'sqlite':
+            # 加载数据库的事务尚未提交：在另一个连接中写入，页面和其他任务才能看到进度
+            # （SQLite 同时只能有一个连接写入，只能等事务结束后再写）
+            _run_in_thread(save)
+
+
+def _run_in_thread(func):
+    """在新线程（使用独立的数据库连接）中执行 func 并等待完成"""
+    errors = []
+
+    def run():
+        try:
+            func()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+class _ArchivePool:
+    """每个线程各自打开需要的备份文件和 pack 文件（文件对象不在线程间共享）"""
+
+    def __init__(self, chunk_index=None):
+        self.chunk_index = chunk_index
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.opened = []
+
+    def get(self, source):
+        archives = self.local.__dict__.setdefault('archives', {})
+        archive = archives.get(source)
+        if archive is None:
+            path = backup_full_path(source)
+            if not os.path.exists(path):
+                raise BackupError(f'依赖的备份文件不存在: {source}')
+            archive = archives[source] = zipfile.ZipFile(path)
+            with self.lock:
+                self.opened.append(archive)
+        return archive
+
+    def reader(self):
+        reader = getattr(self.local, 'reader', None)
+        if reader is None:
+            reader = self.local.reader = ChunkReader(self.chunk_index)
+            with self.lock:
+                self.opened.append(reader)
+        return reader
+
+    def close(self):
+        for archive in self.opened:
+            archive.close()
+
+
+def _target_path(target_dir, entry):
+    target = os.path.normpath(os.path.join(target_dir, *entry.path.split('/')))
+    if not target.startswith(os.path.normpath(target_dir) + os.sep):
+        raise BackupError(f'清单中的路径无效: {entry.path}')
+    return target
+
+
+def _unchanged(entry, target):
+    try:
+        stat = os.stat(target)
+    except FileNotFoundError:
+        return False
+    return stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime_ns
+
+
+def restore_files(entries, target_dir, progress, dry_run=False, workers=RESTORE_WORKERS):
+    """并行取出并校验文件，返回失败的文件数"""
+    pending = []
+    for entry in entries:
+        if _unchanged(entry, _target_path(target_dir, entry)):
+            progress.data['files_skipped'] += 1
+        else:
+            pending.append(entry)
+    progress.update(
+        force=True, phase='verify' if dry_run else 'media',
+        files_total=len(pending), bytes_total=sum(entry.size for entry in pending)
+    )
+
+    # 分块仓库中的文件：先在主线程中查好块的位置，工作线程只读文件
+    pool = _ArchivePool(load_index({digest for entry in pending if entry.chunks for digest in entry.chunks}))
+    failed = 0
+
+    def run(entry):
+        target = None if dry_run else _target_path(target_dir, entry)
+        if entry.chunks is not None:
+            extract_file(pool.reader(), entry, target)
+        else:
+            _extract(pool.get(entry.source), entry, target)
+
+    def collect(futures):
+        nonlocal failed
+        for future in futures:
+            entry = running.pop(future)
+            try:
+                future.result()
+            except (BackupError, ChunkError, OSError) as e:
+                failed += 1
+                progress.error(str(e))
+                logger.warning('恢复文件 %s 失败: %s', entry.path, e)
+            progress.data['files_done'] += 1
+            progress.data['bytes_done'] += entry.size
+        progress.update()
+
+    workers = max(1, workers)
+    running = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backup-restore') as executor:
+            for entry in pending:
+                # 只提交有限数量的任务，已完成的及时汇总进度
+                if len(running) >= workers * 4:
+                    collect(wait(running, return_when=FIRST_COMPLETED).done)
+                running[executor.submit(run, entry)] = entry
+            collect(wait(running).done)
+    finally:
+        pool.close()
+    return failed
+
+
+def _user_documents(archive_path, user):
+    """备份中该用户的文档和版本记录 [(模型, 字段, 行)]，以及它们引用的文件路径"""
+    Document = apps.get_model('documents', 'Document')
+    DocumentVersion = apps.get_model('documents', 'DocumentVersion')
+    document_fields, documents = read_rows(
+        archive_path, Document._meta.label, lambda row: row['author_id'] == user.pk
+    )
+    pk_index = document_fields.index(Document._meta.pk.attname)
+    document_ids = {values[pk_index] for values in documents}
+    version_fields, versions = read_rows(
+        archive_path, DocumentVersion._meta.label, lambda row: row['document_id'] in document_ids
+    )
+    tables = [(Document, document_fields, documents), (DocumentVersion, version_fields, versions)]
+    paths = set()
+    for model, fields, rows in tables:
+        file_index = fields.index('file')
+        paths.update(values[file_index] for values in rows if values[file_index])
+    return tables, paths
+
+
+def _restore_database(archive_path, progress, dry_run, workers, tables=None):
+    """tables 为 _user_documents() 的结果时只恢复这些行，否则恢复整个数据库"""
+    progress.update(force=True, phase='database')
+    if tables is not None:
+        for model, fields, rows in tables:
+            progress.data['rows'] += len(rows) if dry_run else replace_rows(model, fields, rows)
+        return
+    if dry_run:
+        with zipfile.ZipFile(archive_path) as archive:
+            manifest = read_dump_manifest(archive)
+        for table in manifest['tables']:
+            try:
+                apps.get_model(table['model'])
+            except LookupError:
+                raise DumpError(f'当前代码中没有模型 {table["model"]}，请先迁移到备份时的版本')
+            progress.data['rows'] += table['rows']
+        return
+
+    def loaded(label, rows):
+        progress.data['rows'] += rows
+        progress.update()
+
+    load_database(archive_path, replace=True, workers=workers, on_loaded=loaded)
+
+
+def restore_backup(backup, target_dir=None, media=True, database=True, user=None, dry_run=False,
+                   workers=RESTORE_WORKERS):
+    """恢复备份，返回进度数据；失败时抛出 BackupError 或 DumpError（进度中记录错误）"""
+    progress = RestoreProgress(backup, dry_run)
+    progress.claim()
+    started = time.perf_counter()
+    try:
+        manifest = load_manifest(backup)
+        if manifest is None:
+            raise BackupError(f'备份 {backup.name} 没有清单，无法恢复')
+        archive_path = backup_full_path(backup.file_path)
+        tables = paths = None
+        if user is not None:
+            tables, paths = _user_documents(archive_path, user)
+
+        if media:
+            entries = [entry for entry in manifest if paths is None or entry.path in paths]
+            failed = restore_files(entries, str(target_dir or settings.MEDIA_ROOT), progress, dry_run, workers)
+            if failed:
+                raise BackupError(f'{failed} 个文件恢复失败' + ('' if dry_run or not database else '，未恢复数据库'))
+        if database:
+            _restore_database(archive_path, progress, dry_run, workers, tables)
+    except Exception as e:
+        progress.error(str(e))
+        progress.data.update(phase='failed', seconds=round(time.perf_counter() - started, 3))
+        progress.finish('failed')
+        raise
+    progress.data.update(phase='done', seconds=round(time.perf_counter() - started, 3))
+    progress.finish('completed')
+    return progress.data
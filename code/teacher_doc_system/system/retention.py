@@ -0,0 +1,235 @@
+"""日志保留与冷归档
+
+DocumentOperationLog、SystemLog、LoginLog、UserOperationLog 只增不删。这里按表配置保留天数
+（LOG_RETENTION_POLICIES），超过保留期的记录：
+1. 按ID顺序分批取出，按月份写入 MEDIA_ROOT/LOG_ARCHIVE_DIR 下的 gzip 压缩 JSONL 文件；
+2. 在同一个短事务中删除这一批记录并登记 LogArchive，然后把临时文件改名为正式文件；
+   中途失败时记录仍在数据库中（下次重新归档），或已登记但文件未改名（下次启动时补改名）。
+每批最多 ARCHIVE_CHUNK_SIZE 条，删除按主键进行，不会长时间锁表。
+同一张表同时只能有一个归档任务（缓存锁，见 archive_lock()），避免重复归档同一批记录。
+
+读取时 iter_archived_logs() 按月份找到归档文件，返回与数据库查询相同的模型对象（未保存），
+页面可以把热数据和归档数据一起展示。
+"""
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import LogArchive
+
+ARCHIVE_DIR = getattr(settings, 'LOG_ARCHIVE_DIR', 'archives/logs')
+ARCHIVE_CHUNK_SIZE = 2000
+LOCK_TIMEOUT = 6 * 60 * 60
+DEFAULT_POLICIES = {
+    'documents.DocumentOperationLog': 90,
+    'system.SystemLog': 90,
+    'users.LoginLog': 180,
+    'users.UserOperationLog': 365,
+}
+TIME_FIELDS = {
+    'users.LoginLog': 'login_time',
+}
+
+
+@dataclass
+class RetentionPolicy:
+    """一张日志表的保留策略"""
+    model_label: str
+    days: int
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def time_field(self):
+        return TIME_FIELDS.get(self.model_label, 'created_at')
+
+    def cutoff(self, now=None):
+        """保留期开始时间（本地零点），早于它的记录需要归档"""
+        local = timezone.localtime(now or timezone.now())
+        return local.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=self.days)
+
+
+def get_policies():
+    policies = getattr(settings, 'LOG_RETENTION_POLICIES', DEFAULT_POLICIES)
+    return [RetentionPolicy(label, days) for label, days in policies.items()]
+
+
+def get_policy(model_label):
+    for policy in get_policies():
+        if policy.model_label == model_label:
+            return policy
+    return None
+
+
+def _month_of(value):
+    local = timezone.localtime(value)
+    return date(local.year, local.month, 1)
+
+
+def _archive_path(policy, month, min_id, max_id):
+    return os.path.join(ARCHIVE_DIR, policy.model_label, f'{month:%Y-%m}', f'{min_id}-{max_id}.jsonl.gz')
+
+
+def _write_archive(path, fields, rows):
+    """写入临时文件，返回 (临时文件绝对路径, 文件大小)"""
+    full_path = os.path.join(settings.MEDIA_ROOT, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    partial = full_path + '.partial'
+    with gzip.open(partial, 'wt', encoding='utf-8') as archive:
+        for row in rows:
+            archive.write(json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder, ensure_ascii=False))
+            archive.write('\n')
+    return partial, os.path.getsize(partial)
+
+
+def finish_pending_archives(model_label):
+    """已登记但临时文件未改名的归档（上次在改名前中断），补做改名
+
+    归档按顺序进行，只有最后登记的一批可能处于这种状态。
+    """
+    record = LogArchive.objects.filter(model_label=model_label).order_by('-id').only('path').first()
+    if record is not None:
+        full_path = os.path.join(settings.MEDIA_ROOT, record.path)
+        if not os.path.exists(full_path) and os.path.exists(full_path + '.partial'):
+            os.replace(full_path + '.partial', full_path)
+
+
+class ArchiveBusy(Exception):
+    """该日志表正在被其他任务归档"""
+
+
+@contextmanager
+def archive_lock(model_label):
+    """归档某张日志表时持有（定时任务和手动执行重叠时，后开始的一个放弃）"""
+    key = f'system:log_archive_lock:{model_label}'
+    if not cache.add(key, 1, LOCK_TIMEOUT):
+        raise ArchiveBusy(f'{model_label} 正在归档中，请稍后重试')
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def archive_old_logs(policy, chunk_size=ARCHIVE_CHUNK_SIZE, now=None, max_chunks=None):
+    """归档并删除超过保留期的日志，返回归档的记录数；其他任务正在归档该表时抛出 ArchiveBusy"""
+    with archive_lock(policy.model_label):
+        return _archive_old_logs(policy, chunk_size, now, max_chunks)
+
+
+def _archive_old_logs(policy, chunk_size, now, max_chunks):
+    model = policy.model
+    fields = [field.attname for field in model._meta.concrete_fields]
+    time_index = fields.index(policy.time_field)
+    cutoff = policy.cutoff(now)
+    finish_pending_archives(policy.model_label)
+    archived = 0
+    last_id = 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        rows = list(
+            model.objects.filter(**{f'{policy.time_field}__lt': cutoff}, pk__gt=last_id)
+            .order_by('pk').values_list(*fields)[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        chunks += 1
+
+        months = {}
+        for row in rows:
+            months.setdefault(_month_of(row[time_index]), []).append(row)
+
+        for month, month_rows in months.items():
+            ids = [row[0] for row in month_rows]
+            times = [row[time_index] for row in month_rows]
+            path = _archive_path(policy, month, ids[0], ids[-1])
+            partial, size = _write_archive(path, fields, month_rows)
+            try:
+                with transaction.atomic():
+                    model.objects.filter(pk__in=ids).delete()
+                    LogArchive.objects.create(
+                        model_label=policy.model_label, month=month, path=path,
+                        row_count=len(month_rows), min_id=ids[0], max_id=ids[-1],
+                        start_time=min(times), end_time=max(times), file_size=size
+                    )
+            except Exception:
+                os.remove(partial)
+                raise
+            os.replace(partial, os.path.join(settings.MEDIA_ROOT, path))
+            archived += len(month_rows)
+    return archived
+
+
+def _read_archive(model, record):
+    full_path = os.path.join(settings.MEDIA_ROOT, record.path)
+    if not os.path.exists(full_path):
+        full_path += '.partial'
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    with gzip.open(full_path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            data = json.loads(line)
+            yield model(**{name: fields[name].to_python(value) for name, value in data.items() if name in fields})
+
+
+def archived_row_count(model_label, start=None, end=None):
+    """时间范围内归档文件的记录总数（按文件统计，可能略多于范围内的实际条数）"""
+    records = LogArchive.objects.filter(model_label=model_label)
+    if start is not None:
+        records = records.filter(end_time__gte=start)
+    if end is not None:
+        records = records.filter(start_time__lt=end)
+    return records.aggregate(total=Sum('row_count'))['total'] or 0
+
+
+def archived_months(model_label):
+    """已归档的月份（新的在前）"""
+    return list(
+        LogArchive.objects.filter(model_label=model_label)
+        .order_by('-month').values_list('month', flat=True).distinct()
+    )
+
+
+def iter_archived_logs(model_label, start=None, end=None, filters=None, predicate=None, ascending=False):
+    """按时间倒序（ascending=True 时正序）返回归档中的日志（未保存的模型对象）
+
+    start/end 为时间范围（含 start，不含 end），filters 为字段等值条件（如 {'user_id': 1}），
+    predicate 为额外的筛选函数。
+    """
+    time_field = TIME_FIELDS.get(model_label, 'created_at')
+    model = apps.get_model(model_label)
+    filters = filters or {}
+
+    records = LogArchive.objects.filter(model_label=model_label)
+    if start is not None:
+        records = records.filter(end_time__gte=start)
+    if end is not None:
+        records = records.filter(start_time__lt=end)
+
+    ordering = ('month', 'min_id') if ascending else ('-month', '-min_id')
+    for record in records.order_by(*ordering):
+        rows = list(_read_archive(model, record))
+        for row in (rows if ascending else reversed(rows)):
+            value = getattr(row, time_field)
+            if start is not None and value < start:
+                continue
+            if end is not None and value >= end:
+                continue
+            if any(getattr(row, name) != expected for name, expected in filters.items()):
+                continue
+            if predicate is not None and not predicate(row):
+                continue
+            yield row
+
@@ -0,0 +1,54 @@
+"""分享链接失效处理
+
+expire_share_links() 把已经不可用的有效链接标记为失效（is_active=False）：
+- 过期：expires_at 早于当前时间；
+- 下载次数用完：max_downloads > 0 且 download_count >= max_downloads。
+每类链接分批处理：先按索引取出一批主键，再用一条 UPDATE 按主键更新，UPDATE 中重新检查条件，
+期间被延期或修改的链接不受影响。每批最多 EXPIRY_BATCH_SIZE 条，不会长时间锁表。
+
+索引（见 ShareLink.Meta.indexes）：MySQL 不支持部分索引，等值列 is_active 放在范围列之前，
+扫描只落在仍然有效的链接上，历史上已失效的链接再多也不影响：
+- (is_active, expires_at)：过期链接；
+- (is_active, max_downloads, download_count)：限制下载次数的链接，不用回表即可判断是否用完。
+"""
+import time
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ShareLink
+
+EXPIRY_BATCH_SIZE = getattr(settings, 'SHARE_LINK_EXPIRY_BATCH_SIZE', 1000)
+
+
+def _deactivate(condition, batch_size):
+    """分批失效满足条件的有效链接，返回 (更新条数, 批数)"""
+    updated = batches = 0
+    while True:
+        ids = list(
+            ShareLink.objects.filter(condition, is_active=True).order_by().values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        batches += 1
+        updated += ShareLink.objects.filter(condition, pk__in=ids, is_active=True).update(is_active=False)
+        if len(ids) < batch_size:
+            break
+    return updated, batches
+
+
+def expire_share_links(now=None, batch_size=EXPIRY_BATCH_SIZE):
+    """失效过期和下载次数用完的链接，返回本次运行的统计"""
+    started = time.perf_counter()
+    now = now or timezone.now()
+    expired, expired_batches = _deactivate(Q(expires_at__lt=now), batch_size)
+    exhausted, exhausted_batches = _deactivate(
+        Q(max_downloads__gt=0, download_count__gte=F('max_downloads')), batch_size
+    )
+    return {
+        'expired': expired,
+        'exhausted': exhausted,
+        'batches': expired_batches + exhausted_batches,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,140 @@
+"""管理员仪表盘统计
+
+总数由数据库聚合得到（用户、文档、登录失败各一次查询），结果缓存在 Django 缓存中：
+- 缓存未超过 DASHBOARD_STATS_FRESH 秒时直接使用；
+- 超过后仍先返回旧数据，同时提交后台任务刷新（同一时间只提交一次）；
+- 缓存不存在时同步计算。
+"""
+import logging
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Greatest
+from django.utils import timezone
+
+from documents.models import Document
+from users.models import LoginLog
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+DASHBOARD_STATS_KEY = 'system:dashboard:stats'
+DASHBOARD_REFRESH_LOCK_KEY = 'system:dashboard:stats:refreshing'
+DASHBOARD_STATS_FRESH = 60  # 秒，超过后在后台刷新
+DASHBOARD_STATS_TIMEOUT = 30 * 60  # 缓存保留时间，期间可返回旧数据
+
+# 用户存储排序字段（参数值 -> 排序表达式名）
+STORAGE_SORT_FIELDS = {
+    'used': 'storage_used',
+    'quota': 'storage_quota',
+    'remaining': 'remaining',
+    'percentage': 'percentage',
+    'username': 'username',
+}
+
+
+def _percentage(used, total):
+    if not total:
+        return 0
+    percentage = used * 100 / total
+    if 0 < percentage < 0.01:
+        return 0.01
+    return round(percentage, 2)
+
+
+def compute_dashboard_stats():
+    """用聚合查询计算仪表盘的总数"""
+    users = User.objects.aggregate(
+        total_users=Count('id'),
+        total_teachers=Count('id', filter=Q(role='teacher')),
+        total_admins=Count('id', filter=Q(role='admin')),
+        frozen_users=Count('id', filter=Q(is_frozen=True)),
+        total_quota=Sum('storage_quota'),
+        total_used=Sum('storage_used'),
+    )
+    documents = Document.objects.aggregate(
+        total_documents=Count('id'),
+        public_documents=Count('id', filter=Q(is_public=True)),
+        pending_reviews=Count('id', filter=Q(status='review')),
+        total_downloads=Sum('download_count'),
+    )
+    failed_logins = LoginLog.objects.filter(
+        is_successful=False,
+        login_time__gte=timezone.now() - timezone.timedelta(days=1)
+    ).count()
+
+    total_quota = users.pop('total_quota') or 0
+    total_used = users.pop('total_used') or 0
+    stats = dict(users, **documents)
+    stats['total_downloads'] = stats['total_downloads'] or 0
+    stats['failed_logins'] = failed_logins
+    stats['overall_storage_stats'] = {
+        'total_quota': total_quota,
+        'total_used': total_used,
+        'remaining': max(0, total_quota - total_used),
+        'percentage': _percentage(total_used, total_quota),
+    }
+    return stats
+
+
+def refresh_dashboard_stats():
+    stats = compute_dashboard_stats()
+    cache.set(DASHBOARD_STATS_KEY, {'stats': stats, 'computed_at': time.time()}, DASHBOARD_STATS_TIMEOUT)
+    cache.delete(DASHBOARD_REFRESH_LOCK_KEY)
+    return stats
+
+
+def _schedule_refresh():
+    # cache.add 只有一个请求能成功，避免同时提交多个刷新任务
+    if not cache.add(DASHBOARD_REFRESH_LOCK_KEY, 1, DASHBOARD_STATS_FRESH):
+        return
+    from .tasks import refresh_dashboard_stats_task
+    try:
+        refresh_dashboard_stats_task.delay()
+    except Exception:
+        # 消息队列不可用时同步刷新
+        logger.warning('无法提交仪表盘统计刷新任务，改为同步刷新', exc_info=True)
+        refresh_dashboard_stats()
+
+
+def get_dashboard_stats():
+    """返回仪表盘统计（可能是不超过 DASHBOARD_STATS_TIMEOUT 的旧数据）"""
+    cached = cache.get(DASHBOARD_STATS_KEY)
+    if cached is None:
+        return refresh_dashboard_stats()
+    if time.time() - cached['computed_at'] > DASHBOARD_STATS_FRESH:
+        _schedule_refresh()
+    return cached['stats']
+
+
+def user_storage_queryset(sort='used', descending=True):
+    """按存储使用情况排序的用户查询，剩余空间和使用率由数据库计算"""
+    queryset = User.objects.annotate(
+        remaining=Greatest(F('storage_quota') - F('storage_used'), Value(0)),
+        percentage=Case(
+            When(storage_quota__gt=0, then=Cast(F('storage_used'), FloatField()) * 100 / F('storage_quota')),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    ).only(
+        'id', 'username', 'first_name', 'last_name', 'role', 'storage_quota', 'storage_used', 'is_frozen'
+    )
+    field = STORAGE_SORT_FIELDS.get(sort, 'storage_used')
+    prefix = '-' if descending else ''
+    return queryset.order_by(f'{prefix}{field}', f'{prefix}id')
+
+
+def serialize_user_storage(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'name': user.get_full_name() or user.username,
+        'role': user.role,
+        'storage_quota': user.storage_quota,
+        'storage_used': user.storage_used,
+        'storage_remaining': user.remaining,
+        'storage_percentage': _percentage(user.storage_used, user.storage_quota),
+        'is_frozen': user.is_frozen,
+    }
@@ -0,0 +1,481 @@
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipIf
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from documents.models import Document, DocumentCategory
+from system import chunkstore
+from system.backup_writer import BackupWriter, supports_precompressed
+from system.backups import collect_garbage, create_backup
+from system.dbdump import DUMP_MANIFEST, DumpError, dump_database, load_database
+from system.forms import BackupRestoreForm
+from system.metrics import MetricsRegistry, render_prometheus
+from system.models import Backup, BackupChunk, ShareLink, SystemConfig
+from system.query_analysis import QUERY_BUDGETS
+
+User = get_user_model()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'query-budget'}})
+class QueryBudgetTests(TestCase):
+    """主要页面的查询次数不超过 QUERY_BUDGETS，且不随数据行数增长（N+1）"""
+    small = 3
+    large = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='budget-admin', password=None, employee_id='budget-admin',
+            role='admin', is_superuser=True, must_change_password=False
+        )
+        cls.teacher = User.objects.create_user(
+            username='budget-teacher', password=None, employee_id='budget-teacher',
+            role='teacher', department='测试部门', must_change_password=False
+        )
+        cls.colleague = User.objects.create_user(
+            username='budget-colleague', password=None, employee_id='budget-colleague',
+            role='teacher', department='其他部门', must_change_password=False
+        )
+        cls.seed(0, cls.small)
+
+    @classmethod
+    def seed(cls, start, stop):
+        """每类数据补足到 stop 条：分类及子分类、文档、待审核文档、分享链接"""
+        for index in range(start, stop):
+            parent = DocumentCategory.objects.create(name=f'分类{index}', created_by=cls.admin)
+            DocumentCategory.objects.create(name=f'子分类{index}', parent=parent, created_by=cls.admin)
+            DocumentCategory.objects.create(name=f'个人分类{index}', created_by=cls.teacher)
+            document = cls.document(cls.teacher, index, category=parent, status='published', is_public=True)
+            cls.document(cls.colleague, index, status='review')
+            ShareLink.objects.create(
+                document=document, token=f'budget-{index}', created_by=cls.teacher,
+                expires_at=timezone.now() + timedelta(days=7)
+            )
+
+    @staticmethod
+    def document(author, index, **fields):
+        document = Document(
+            title=f'预算 文档 {author.username} {index}', file_size=1024, file_type='pdf',
+            file_hash=f'budget-{author.username}-{index}', author=author, **fields
+        )
+        document.file.name = f'user_files/budget/{author.username}-{index}.pdf'
+        document.save()
+        return document
+
+    def setUp(self):
+        cache.clear()
+        self.clients = {}
+        for role, user in (('admin', self.admin), ('teacher', self.teacher)):
+            self.clients[role] = self.client_class()
+            self.clients[role].force_login(user)
+
+    def pages(self):
+        document = Document.objects.filter(author=self.teacher).order_by('pk').first()
+        return {
+            'documents:document_list': ('teacher', reverse('documents:document_list'), {}),
+            'documents:document_search': ('teacher', reverse('documents:document_search'), {'search': '预算'}),
+            'documents:document_detail': ('teacher', reverse('documents:document_detail', args=[document.pk]), {}),
+            'documents:teacher_dashboard': ('teacher', reverse('documents:teacher_dashboard'), {}),
+            'documents:category_list': ('admin', reverse('documents:category_list'), {}),
+            'documents:share_link_list': ('teacher', reverse('documents:share_link_list'), {}),
+            'documents:document_review_list': ('admin', reverse('documents:document_review_list'), {}),
+            'system:dashboard': ('admin', reverse('system:dashboard'), {}),
+        }
+
+    def request(self, name):
+        """预热缓存后再请求一次，返回这次请求的查询次数"""
+        role, url, params = self.pages()[name]
+        self.clients[role].get(url, params)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.clients[role].get(url, params)
+        self.assertEqual(response.status_code, 200, name)
+        return len(queries)
+
+    def test_every_budget_has_a_page(self):
+        self.assertEqual(set(QUERY_BUDGETS), set(self.pages()))
+
+    def test_pages_within_budget(self):
+        for name, budget in QUERY_BUDGETS.items():
+            role, url, params = self.pages()[name]
+            with self.subTest(page=name):
+                self.clients[role].get(url, params)
+                with self.assertNumQueries(budget):
+                    self.clients[role].get(url, params)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        small = {name: self.request(name) for name in QUERY_BUDGETS}
+        self.seed(self.small, self.large)
+        for name in QUERY_BUDGETS:
+            with self.subTest(page=name):
+                self.assertEqual(self.request(name), small[name])
+
+
+class BackupWriterTests(SimpleTestCase):
+    """并行压缩直接写入 zip 内部结构（见 BackupWriter._write_compressed），当前 Python 版本生成的 zip 必须完整可读"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def make_files(self):
+        files = {}
+        for index in range(12):
+            name = f'file{index}.{"png" if index % 4 == 0 else "txt"}'
+            content = (f'内容 {index} ' * (2000 * (index + 1))).encode() + os.urandom(index * 100)
+            path = os.path.join(self.directory.name, name)
+            with open(path, 'wb') as output:
+                output.write(content)
+            files[name] = SimpleNamespace(full_path=path, size=len(content), content=content)
+        return files
+
+    def write_archive(self, files, **options):
+        path = os.path.join(self.directory.name, 'backup.zip')
+        stored = {}
+
+        def on_stored(item, digest, size, error=None):
+            self.assertIsNone(error)
+            stored[item.full_path] = digest
+
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            writer = BackupWriter(archive, on_stored, **options)
+            for name, item in files.items():
+                writer.add(item, f'media/{name}')
+            summary = writer.close()
+        return path, stored, summary
+
+    def assert_round_trip(self, path, files, stored):
+        with zipfile.ZipFile(path) as archive:
+            self.assertIsNone(archive.testzip())
+            for name, item in files.items():
+                self.assertEqual(archive.read(f'media/{name}'), item.content)
+                self.assertEqual(stored[item.full_path], hashlib.sha256(item.content).hexdigest())
+
+    def test_parallel_archive_round_trip(self):
+        with zipfile.ZipFile(os.path.join(self.directory.name, 'probe.zip'), 'w') as archive:
+            self.assertTrue(supports_precompressed(archive), '当前 Python 版本的 ZipFile 缺少并行写入需要的内部属性')
+        files = self.make_files()
+        path, stored, summary = self.write_archive(files, workers=4, parallel_max_size=10 ** 9)
+        self.assertEqual(summary['workers'], 4)
+        self.assert_round_trip(path, files, stored)
+
+    def test_serial_archive_round_trip(self):
+        files = self.make_files()
+        path, stored, summary = self.write_archive(files, workers=1)
+        self.assertEqual(summary['workers'], 1)
+        self.assert_round_trip(path, files, stored)
+
+
+class LoadDatabaseTests(TestCase):
+    """load_database(replace=True) 中途失败时整体回滚，现有数据不受影响"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.user = User.objects.create_user(
+            username='dump-teacher', password=None, employee_id='dump-teacher', role='teacher',
+            must_change_password=False
+        )
+        SystemConfig.set_value('dump_test', 'before')
+
+    def dump(self, tamper=None):
+        path = os.path.join(self.directory.name, 'dump.zip')
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            dump_database(archive)
+        if tamper is not None:
+            with zipfile.ZipFile(path) as source:
+                members = {name: source.read(name) for name in source.namelist()}
+            manifest = json.loads(members[DUMP_MANIFEST])
+            tamper(manifest, members)
+            members[DUMP_MANIFEST] = json.dumps(manifest).encode()
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for name, data in members.items():
+                    archive.writestr(name, data)
+        return path
+
+    def test_replace_round_trip(self):
+        path = self.dump()
+        SystemConfig.set_value('dump_test', 'after')
+        load_database(path, replace=True)
+        self.assertEqual(SystemConfig.get_value('dump_test'), 'before')
+        self.assertTrue(User.objects.filter(username='dump-teacher').exists())
+
+    def test_failed_replace_keeps_current_data(self):
+        def break_last_table(manifest, members):
+            manifest['tables'][-1]['rows'] += 1
+
+        path = self.dump(break_last_table)
+        SystemConfig.set_value('dump_test', 'after')
+        with self.assertRaises(DumpError):
+            load_database(path, replace=True)
+        self.assertEqual(SystemConfig.get_value('dump_test'), 'after')
+        self.assertTrue(User.objects.filter(username='dump-teacher').exists())
+
+    def test_dangling_foreign_key_rejected(self):
+        ShareLink.objects.create(token='dump-link', expires_at=timezone.now(), created_by=self.user)
+
+        def point_to_missing_user(manifest, members):
+            table = next(table for table in manifest['tables'] if table['model'] == 'system.ShareLink')
+            column = table['fields'].index('created_by_id')
+            member = table['parts'][0]['member']
+            rows = [json.loads(line) for line in members[member].decode().splitlines()]
+            for row in rows:
+                row[column] = 999999
+            members[member] = ''.join(json.dumps(row) + '\n' for row in rows).encode()
+
+        path = self.dump(point_to_missing_user)
+        SystemConfig.set_value('dump_test', 'after')
+        with self.assertRaisesMessage(DumpError, '无效的外键引用'):
+            load_database(path, replace=True)
+        self.assertEqual(SystemConfig.get_value('dump_test'), 'after')
+        self.assertEqual(ShareLink.objects.get(token='dump-link').created_by, self.user)
+
+
+class BackupRestoreFormTests(TestCase):
+    """网页上的整库恢复只能校验；只恢复媒体文件或某个用户的文档不受限制"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.backup = Backup.objects.create(name='nightly', status='completed')
+        cls.teacher = User.objects.create_user(
+            username='restore-teacher', password=None, employee_id='restore-teacher', role='teacher',
+            must_change_password=False
+        )
+
+    def form(self, **data):
+        return BackupRestoreForm({'backup': self.backup.pk, 'restore_media': 'on', **data})
+
+    def test_full_database_restore_requires_dry_run(self):
+        form = self.form(restore_database='on')
+        self.assertFalse(form.is_valid())
+        self.assertIn(f'restore_backup {self.backup.pk}', form.non_field_errors()[0])
+        self.assertTrue(self.form(restore_database='on', dry_run='on').is_valid())
+
+    def test_partial_restores_allowed(self):
+        self.assertTrue(self.form().is_valid())
+        self.assertTrue(self.form(restore_database='on', username='restore-teacher').is_valid())
+
+
+class ShareLinkConcurrentDownloadTests(TransactionTestCase):
+    """多个线程同时下载同一个分享链接：成功次数不超出上限，计数不丢失
+
+    各线程使用独立的数据库连接，需要 TransactionTestCase（数据已提交，其他连接可见）。
+    """
+    threads = 20
+    limit = 10
+    rounds = 5
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # 测试数据库创建后才能判断
+            self.skipTest('内存中的 SQLite 数据库不支持多个连接并发写入（可在 DATABASES 的 TEST NAME 中指定文件）')
+        user = User.objects.create_user(
+            username='share-teacher', password=None, employee_id='share-teacher', role='teacher',
+            must_change_password=False
+        )
+        self.user = user
+        self.expires_at = timezone.now() + timedelta(hours=1)
+
+    def hammer(self, share_link, rounds):
+        """threads 个线程同时开始，每个线程下载 rounds 次，返回成功的次数"""
+        barrier = threading.Barrier(self.threads)
+        results = []
+        errors = []
+        lock = threading.Lock()
+
+        def run():
+            link = ShareLink(pk=share_link.pk)
+            try:
+                barrier.wait()
+                granted = sum(link.consume_download() for _ in range(rounds))
+                with lock:
+                    results.append(granted)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=run) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+        return sum(results)
+
+    def test_limited_link_never_exceeds_max_downloads(self):
+        link = ShareLink.objects.create(
+            token='share-limited', expires_at=self.expires_at, max_downloads=self.limit, created_by=self.user
+        )
+        self.assertEqual(self.hammer(link, 1), self.limit)
+        link.refresh_from_db()
+        self.assertEqual(link.download_count, self.limit)
+
+    def test_unlimited_link_counts_every_download(self):
+        link = ShareLink.objects.create(token='share-unlimited', expires_at=self.expires_at, created_by=self.user)
+        expected = self.threads * self.rounds
+        self.assertEqual(self.hammer(link, self.rounds), expected)
+        link.refresh_from_db()
+        self.assertEqual(link.download_count, expected)
+
+
+class ChunkStoreTests(TestCase):
+    """分块仓库：按内容切块、去重写入 pack、回收不再引用的块，以及备份与回收之间的互斥"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media_root = directory.name
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.data = random.Random(0).randbytes(6 * 1024 * 1024)
+
+    def chunks(self, data):
+        return list(chunkstore.iter_chunks(io.BytesIO(data)))
+
+    def test_iter_chunks_splits_by_content(self):
+        chunks = self.chunks(self.data)
+        self.assertEqual(b''.join(chunks), self.data)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(len(chunk), chunkstore.CHUNK_MIN_SIZE)
+            self.assertLessEqual(len(chunk), chunkstore.CHUNK_MAX_SIZE)
+        # 文件开头插入内容后，后面的块不变
+        shifted = self.chunks(b'inserted' * 100 + self.data)
+        self.assertEqual(chunks[2:], shifted[2:])
+
+    @skipIf(chunkstore.numpy is None, '未安装 numpy')
+    def test_vectorized_cut_matches_python(self):
+        limit = chunkstore.CHUNK_MAX_SIZE
+        for start in (0, 12345, 2 * 1024 * 1024):
+            data = self.data[start:start + limit]
+            self.assertEqual(
+                chunkstore._find_cut_vectorized(data, limit), chunkstore._find_cut_python(data, limit)
+            )
+
+    def test_pack_writer_deduplicates_and_reads_back(self):
+        data = self.data[:chunkstore.CHUNK_MIN_SIZE]
+        writer = chunkstore.PackWriter()
+        digest = writer.add(data)
+        self.assertEqual(writer.add(data), digest)
+        self.assertFalse(BackupChunk.objects.filter(digest=digest).exists())  # 未落盘前不登记
+        writer.flush()
+        self.assertEqual(writer.stats['new_chunks'], 1)
+        self.assertEqual(writer.stats['chunks'], 2)
+
+        reader = chunkstore.ChunkReader()
+        self.assertEqual(reader.read(digest), data)
+        reader.close()
+
+        # 其他线程编码好的块同样去重
+        second = chunkstore.PackWriter()
+        second.add_encoded(digest, chunkstore.encode_record(data, digest), len(data))
+        self.assertEqual(second.stats['new_chunks'], 0)
+
+        aborted = chunkstore.PackWriter()
+        aborted.add(self.data[-1000:])
+        partial = chunkstore.pack_path(aborted.pack) + '.partial'
+        self.assertTrue(os.path.exists(partial))
+        aborted.abort()
+        self.assertFalse(os.path.exists(partial))
+
+    def test_collect_garbage_keeps_referenced_chunks(self):
+        os.makedirs(os.path.join(self.media_root, 'user_files'))
+        with open(os.path.join(self.media_root, 'user_files', 'a.bin'), 'wb') as output:
+            output.write(self.data)
+        manifest = create_backup(Backup.objects.create(name='chunked', status='completed'),
+                                 full=True, backup_format='chunked')
+        live = {digest for entry in manifest for digest in entry.chunks}
+
+        writer = chunkstore.PackWriter()
+        dead = writer.add(b'unreferenced' * 1000)
+        dead_pack = writer.pack
+        writer.flush()
+
+        stats = collect_garbage(grace=timedelta(0))
+        self.assertEqual(stats['chunks_deleted'], 1)
+        self.assertFalse(BackupChunk.objects.filter(digest=dead).exists())
+        self.assertFalse(os.path.exists(chunkstore.pack_path(dead_pack)))
+        self.assertEqual(set(BackupChunk.objects.values_list('digest', flat=True)), live)
+
+        reader = chunkstore.ChunkReader()
+        for entry in manifest:
+            chunkstore.extract_file(reader, entry)  # 只校验
+        reader.close()
+
+    def test_repository_lock_excludes_other_holders(self):
+        with chunkstore.repository_lock():
+            with self.assertRaises(chunkstore.ChunkError):
+                collect_garbage(grace=timedelta(0))
+        collect_garbage(grace=timedelta(0))
+
+
+class LogExplorerArchiveTests(TestCase):
+    """日志查询只在勾选“包括历史归档”且日期范围有限时读取归档文件"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='log-admin', password=None, employee_id='log-admin',
+            role='admin', is_superuser=True, must_change_password=False
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        patcher = mock.patch('system.log_explorer.iter_archived_logs', return_value=iter(()))
+        self.iter_archived_logs = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **params):
+        response = self.client.get(reverse('system:log_explorer'), {'source': 'system', **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_archives_not_read_by_default(self):
+        self.get(user=self.admin.pk)
+        self.get(date_from='2020-01-01', date_to='2020-01-31')
+        self.iter_archived_logs.assert_not_called()
+
+    def test_include_archive_requires_bounded_range(self):
+        response = self.get(include_archive='on')
+        self.assertFalse(response.context['form'].is_valid())
+        response = self.get(include_archive='on', date_from='2020-01-01', date_to='2020-12-31')
+        self.assertFalse(response.context['form'].is_valid())
+        self.iter_archived_logs.assert_not_called()
+
+        self.get(include_archive='on', date_from='2020-01-01', date_to='2020-01-31')
+        self.iter_archived_logs.assert_called()
+
+
+class MetricsLabelTests(SimpleTestCase):
+    """请求方法只有固定的几种取值，其他方法记为 other"""
+
+    def test_unknown_methods_share_one_series(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        registry = MetricsRegistry(directory=directory.name)
+        for method in ('GET', 'BREW', 'X"}\n'):
+            registry.request_started()
+            registry.request_finished('documents:document_list', method, 200, 0.01, 1, 0.001, 100)
+        text = render_prometheus([registry.snapshot()])
+        self.assertIn('method="GET"', text)
+        self.assertIn(
+            'django_http_requests_total{view="documents:document_list",method="other",status="200"} 2', text
+        )
+        self.assertNotIn('BREW', text)
@@ -6,6 +6,7 @@ app_name = 'system'
 urlpatterns = [
     # 仪表盘
     path('', views.DashboardView.as_view(), name='dashboard'),
+    path('api/user-storage/', views.UserStorageAPIView.as_view(), name='user_storage_api'),
     
     # 用户管理
     path('users/', views.UserListView.as_view(), name='user_list'),
@@ -16,6 +17,26 @@ urlpatterns = [
     
     # 系统配置
     path('config/', views.SystemConfigView.as_view(), name='config'),
+
+    # 日志查询
+    path('logs/', views.LogExplorerView.as_view(), name='log_explorer'),
+    path('logs/export/', views.LogExportView.as_view(), name='log_export'),
+
+    # 请求指标（Prometheus）
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+
+    # 按需性能分析
+    path('profiling/', views.ProfilingView.as_view(), name='profiling'),
+    path('profiling/rules/<int:pk>/stop/', views.ProfilingRuleStopView.as_view(), name='profiling_rule_stop'),
+    path('profiling/<int:pk>/', views.RequestProfileDetailView.as_view(), name='profile_detail'),
+    path('profiling/<int:pk>/download/', views.RequestProfileDownloadView.as_view(), name='profile_download'),
+
+    # 备份恢复
+    path('backups/', views.BackupListView.as_view(), name='backups'),
+    path('backups/<int:pk>/restore-status/', views.BackupRestoreStatusView.as_view(), name='backup_restore_status'),
+
+    # 报表
+    path('reports/near-duplicates/', views.NearDuplicateReportView.as_view(), name='near_duplicate_report'),
     
     
 ]
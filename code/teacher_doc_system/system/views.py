@@ -3,15 +3,18 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.views.generic import View, ListView, CreateView, UpdateView, DeleteView, TemplateView
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse, FileResponse
 from django.db.models import Count, Q, Sum
 from django.conf import settings
 from django.utils import timezone
 from django.core.paginator import Paginator
 from django.db import transaction
+from django.utils.crypto import constant_time_compare
 import json
 import csv
 import io
+import os
+from datetime import timedelta
 from django.contrib.auth.password_validation import validate_password
 
 from django.contrib.auth import get_user_model
@@ -19,10 +22,19 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 from users.models import UserOperationLog, LoginLog
 from users.forms import CreateUserForm, EditUserForm
-from documents.models import Document, DocumentOperationLog
-from .models import SystemConfig, SystemLog, ShareLink
-from .forms import SystemConfigForm
+from documents.models import Document, DocumentOperationLog, DocumentSignature
+from documents.pagination import CursorPaginationMixin
+from documents.rollups import department_activity, week_start
+from documents.similarity import find_near_duplicate_clusters
+from . import audit
+from .models import Backup, SystemConfig, SystemLog, ShareLink, ProfilingRule, RequestProfile
+from .forms import BackupRestoreForm, LogFilterForm, ProfilingRuleForm, SystemConfigForm
+from .metrics import registry as metrics_registry, render_prometheus
+from . import profiling
+from .log_explorer import LogQuery, get_source as get_log_source, stream_csv, stream_jsonl
+from .retention import archived_months
 from .utils import require_admin
+from .stats import get_dashboard_stats, serialize_user_storage, user_storage_queryset
 
 
 class AdminRequiredMixin(UserPassesTestMixin):
@@ -43,92 +55,71 @@ class DashboardView(AdminRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # 基础统计
-        total_users = User.objects.count()
-        total_teachers = User.objects.filter(role='teacher').count()
-        total_admins = User.objects.filter(role='admin').count()
-        frozen_users = User.objects.filter(is_frozen=True).count()
+        # 总数来自聚合查询并缓存，过期后在后台刷新
+        context.update(get_dashboard_stats())
         
-        # 文档统计
-        total_documents = Document.objects.count()
-        public_documents = Document.objects.filter(is_public=True).count()
-        pending_reviews = Document.objects.filter(status='review').count()
-        total_downloads = Document.objects.aggregate(
-            total=Sum('download_count')
-        )['total'] or 0
-        
-        # 用户存储使用情况 - 获取所有用户的存储信息
-        users_storage = []
-        for user in User.objects.all().order_by('-storage_used'):
-            users_storage.append({
-                'id': user.id,
-                'username': user.username,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'role': user.role,
-                'storage_quota': user.storage_quota,
-                'storage_used': user.storage_used,
-                'storage_remaining': max(0, user.storage_quota - user.storage_used),
-                'storage_percentage': user.storage_usage_percentage,
-                'is_frozen': user.is_frozen
-            })
-        
-        # 计算总体存储统计
-        total_storage_quota = sum(user['storage_quota'] for user in users_storage)
-        total_storage_used = sum(user['storage_used'] for user in users_storage)
-        total_storage_remaining = max(0, total_storage_quota - total_storage_used)
-        
-        # 计算总体存储使用百分比
-        overall_storage_percentage = 0
-        if total_storage_quota > 0:
-            percentage = (total_storage_used / total_storage_quota) * 100
-            if percentage > 0 and percentage < 0.01:
-                overall_storage_percentage = 0.01
-            else:
-                overall_storage_percentage = round(percentage, 2)
+        # 用户存储明细由 UserStorageAPIView 分页加载
+        context['storage_sort_choices'] = (
+            ('used', '已用空间'),
+            ('percentage', '使用率'),
+            ('remaining', '剩余空间'),
+            ('quota', '配额'),
+        )
         
         # 最近活动
-        recent_users = User.objects.order_by('-date_joined')[:5]
-        recent_logins = LoginLog.objects.filter(
+        context['recent_users'] = User.objects.order_by('-date_joined')[:5]
+        context['recent_logins'] = LoginLog.objects.filter(
             is_successful=True
-        ).order_by('-login_time')[:10]
+        ).select_related('user').order_by('-login_time')[:10]
         
-        # 异常情况
-        failed_logins = LoginLog.objects.filter(
-            is_successful=False,
-            login_time__gte=timezone.now() - timezone.timedelta(days=1)
-        ).count()
-        
-        context.update({
-            'total_users': total_users,
-            'total_teachers': total_teachers,
-            'total_admins': total_admins,
-            'frozen_users': frozen_users,
-            'total_documents': total_documents,
-            'public_documents': public_documents,
-            'pending_reviews': pending_reviews,
-            'total_downloads': total_downloads,
-            'users_storage': users_storage,
-            'overall_storage_stats': {
-                'total_quota': total_storage_quota,
-                'total_used': total_storage_used,
-                'remaining': total_storage_remaining,
-                'percentage': overall_storage_percentage
-            },
-            'recent_users': recent_users,
-            'recent_logins': recent_logins,
-            'failed_logins': failed_logins,
-        })
+        # 各部门本周的文档操作（读取操作日志汇总表）
+        activity = department_activity(week_start())
+        context['department_activity'] = sorted(
+            (
+                {
+                    'department': department or '未设置部门',
+                    'view': counts.get('view', 0),
+                    'download': counts.get('download', 0),
+                    'total': sum(counts.values()),
+                }
+                for department, counts in activity.items()
+            ),
+            key=lambda row: -row['total']
+        )
         
         return context
 
 
-class UserListView(AdminRequiredMixin, ListView):
+class UserStorageAPIView(AdminRequiredMixin, View):
+    """用户存储使用情况API（分页、可排序）"""
+    page_size = 20
+    max_page_size = 100
+
+    def get(self, request):
+        sort = request.GET.get('sort', 'used')
+        descending = request.GET.get('order', 'desc') != 'asc'
+        try:
+            page_size = max(1, min(int(request.GET.get('page_size', self.page_size)), self.max_page_size))
+        except ValueError:
+            return JsonResponse({'error': 'page_size 必须是整数'}, status=400)
+
+        paginator = Paginator(user_storage_queryset(sort, descending), page_size)
+        page = paginator.get_page(request.GET.get('page'))
+        return JsonResponse({
+            'results': [serialize_user_storage(user) for user in page.object_list],
+            'page': page.number,
+            'num_pages': paginator.num_pages,
+            'count': paginator.count,
+        })
+
+
+class UserListView(AdminRequiredMixin, CursorPaginationMixin, ListView):
     """用户列表"""
     model = User
     template_name = 'system/user_list.html'
     context_object_name = 'users'
     paginate_by = 20
+    cursor_field = 'date_joined'
     
     def get_queryset(self):
         queryset = User.objects.all()
@@ -210,7 +201,8 @@ class CreateUserView(AdminRequiredMixin, CreateView):
                 user.save()
                 
                 # 记录操作日志
-                UserOperationLog.objects.create(
+                audit.record(
+                    UserOperationLog,
                     user=user,
                     operation='create',
                     operated_by=self.request.user,
@@ -274,7 +266,8 @@ class EditUserView(AdminRequiredMixin, UpdateView):
                     user.unfreeze_account(unfrozen_by=self.request.user)
             
             # 记录操作日志
-            UserOperationLog.objects.create(
+            audit.record(
+                UserOperationLog,
                 user=user,
                 operation='update',
                 operated_by=self.request.user,
@@ -343,8 +336,10 @@ class SystemConfigView(AdminRequiredMixin, View):
             'default_storage_quota': '10',  # 10GB
             'password_expiry_days': '90',
             'share_link_expiry_days': '7',
-            'backup_retention_days': '7',
-            'auto_backup_enabled': 'False',
+            'backup_retention_days': str(settings.TEACHER_DOC_SETTINGS['BACKUP_RETENTION_DAYS']),
+            'backup_retention_weeks': str(settings.TEACHER_DOC_SETTINGS['BACKUP_RETENTION_WEEKS']),
+            'backup_retention_months': str(settings.TEACHER_DOC_SETTINGS['BACKUP_RETENTION_MONTHS']),
+            'auto_backup_enabled': str(settings.TEACHER_DOC_SETTINGS['AUTO_BACKUP_ENABLED']),
             'allowed_file_types': 'pdf,doc,docx,ppt,pptx,xls,xlsx,txt,md,zip,rar,7z,jpg,jpeg,png,gif'
         }
         
@@ -371,14 +366,269 @@ class SystemConfigView(AdminRequiredMixin, View):
     def post(self, request):
         # 更新配置值
         for key, value in request.POST.items():
-            if key != 'csrfmiddlewaretoken':
-                # 处理复选框
-                if key == 'auto_backup_enabled':
-                    value = 'True' if value else 'False'
+            if key not in ('csrfmiddlewaretoken', 'auto_backup_enabled'):
                 SystemConfig.set_value(key, value)
+        # 处理复选框（未勾选时不会提交）
+        SystemConfig.set_value('auto_backup_enabled', 'True' if request.POST.get('auto_backup_enabled') else 'False')
         
         messages.success(request, '系统配置更新成功')
         return redirect('system:config')
 
 
+class NearDuplicateReportView(AdminRequiredMixin, TemplateView):
+    """近似重复文档报告"""
+    template_name = 'system/near_duplicates.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        clusters = find_near_duplicate_clusters()
+        context.update({
+            'clusters': clusters,
+            'total_redundant_bytes': sum(cluster['redundant_bytes'] for cluster in clusters),
+            'signature_count': DocumentSignature.objects.count(),
+            'document_count': Document.objects.count(),
+        })
+        return context
+
+
+class LogExplorerView(AdminRequiredMixin, CursorPaginationMixin, ListView):
+    """日志查询（四张日志表，键集分页，数据库之外的记录从归档读取）"""
+    template_name = 'system/log_explorer.html'
+    context_object_name = 'logs'
+    paginate_by = 50
+    archive_max_days = 92  # 包括历史归档时日期范围的上限
+
+    @property
+    def cursor_field(self):
+        return self.log_query.source.time_field
+
+    def get_queryset(self):
+        source = get_log_source(self.request.GET.get('source'))
+        self.form = LogFilterForm(
+            self.request.GET or None, operation_choices=source.operation_choices,
+            archive_max_days=self.archive_max_days
+        )
+        filters = self.form.cleaned_data if self.form.is_valid() else {}
+        self.log_query = LogQuery(source, filters)
+        return self.log_query.queryset()
+
+    def get_fetch_rows(self):
+        return self.log_query.fetch
+
+    def get_count_rows(self):
+        return self.log_query.count
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = self.request.GET.copy()
+        params.pop(self.cursor_query_param, None)
+        context.update({
+            'form': self.form,
+            'source': self.log_query.source,
+            'archived_months': archived_months(self.log_query.source.model_label),
+            'archive_max_days': self.archive_max_days,
+            'export_query': params.urlencode(),
+        })
+        return context
+
+
+class LogExportView(AdminRequiredMixin, View):
+    """按筛选条件流式导出日志（CSV 或 JSONL）"""
+
+    def get(self, request):
+        source = get_log_source(request.GET.get('source'))
+        form = LogFilterForm(request.GET, operation_choices=source.operation_choices)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        log_query = LogQuery(source, form.cleaned_data)
+
+        export_format = request.GET.get('format', 'csv')
+        if export_format == 'jsonl':
+            response = StreamingHttpResponse(stream_jsonl(log_query), content_type='application/x-ndjson; charset=utf-8')
+        else:
+            export_format = 'csv'
+            response = StreamingHttpResponse(stream_csv(log_query), content_type='text/csv; charset=utf-8')
+        filename = f'{source.key}_logs_{timezone.localtime():%Y%m%d%H%M%S}.{export_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+        audit.record(
+            SystemLog,
+            level='INFO',
+            message=f'管理员 {request.user.get_full_name() or request.user.username} 导出了{source.label}',
+            module='system',
+            user=request.user,
+            ip_address=request.META.get('REMOTE_ADDR')
+        )
+        return response
+
+
+class MetricsView(View):
+    """请求指标（Prometheus 文本格式），仅管理员或持有 METRICS_TOKEN 的抓取程序可访问"""
+
+    def get(self, request):
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        authorized = request.user.is_authenticated and request.user.is_admin()
+        if not authorized and token:
+            authorized = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+        if not authorized:
+            return HttpResponse('Forbidden', status=403, content_type='text/plain; charset=utf-8')
+        return HttpResponse(
+            render_prometheus(metrics_registry.collect()),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class ProfilingView(AdminRequiredMixin, View):
+    """按需性能分析：开启规则，浏览最近的分析结果"""
+    template_name = 'system/profiling.html'
+
+    def get(self, request):
+        return self.render(request, ProfilingRuleForm())
+
+    def post(self, request):
+        form = ProfilingRuleForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, '请检查表单中的错误信息')
+            return self.render(request, form)
+
+        rule = ProfilingRule.objects.create(
+            user=form.cleaned_data['username'],
+            path_pattern=form.cleaned_data['path_pattern'],
+            expires_at=timezone.now() + timedelta(minutes=form.cleaned_data['duration']),
+            max_profiles=form.cleaned_data['max_profiles'],
+            created_by=request.user
+        )
+        profiling.gate.invalidate()
+        audit.record(
+            SystemLog,
+            level='INFO',
+            message=f'管理员 {request.user.get_full_name() or request.user.username} 开启了性能分析：{rule}',
+            module='system',
+            user=request.user,
+            ip_address=request.META.get('REMOTE_ADDR')
+        )
+        messages.success(request, '性能分析已开启，匹配的请求会被记录')
+        return redirect('system:profiling')
+
+    def render(self, request, form):
+        return render(request, self.template_name, {
+            'form': form,
+            'rules': ProfilingRule.objects.select_related('user', 'created_by')[:20],
+            'profiles': RequestProfile.objects.select_related('user')[:profiling.KEEP],
+            'max_per_minute': profiling.MAX_PER_MINUTE,
+        })
+
+
+class ProfilingRuleStopView(AdminRequiredMixin, View):
+    """停止性能分析规则"""
+
+    def post(self, request, pk):
+        rule = get_object_or_404(ProfilingRule, pk=pk)
+        rule.is_active = False
+        rule.save(update_fields=['is_active'])
+        profiling.gate.invalidate()
+        messages.success(request, '性能分析规则已停止')
+        return redirect('system:profiling')
+
+
+class RequestProfileDetailView(AdminRequiredMixin, TemplateView):
+    """一次请求的分析结果：函数耗时排行和 SQL 记录"""
+    template_name = 'system/profile_detail.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        profile = get_object_or_404(RequestProfile.objects.select_related('user', 'rule'), pk=kwargs['pk'])
+        sort = self.request.GET.get('sort', 'cumulative')
+        try:
+            stats = profiling.format_stats(profile, sort=sort)
+            queries = profiling.load_sql_log(profile)
+        except FileNotFoundError:
+            raise Http404('分析结果文件不存在')
+        context.update({
+            'profile': profile,
+            'stats': stats,
+            'queries': queries,
+            'sort': sort,
+            'sort_choices': profiling.STATS_SORT_CHOICES,
+        })
+        return context
+
+
+class RequestProfileDownloadView(AdminRequiredMixin, View):
+    """下载 cProfile 原始数据（可用 snakeviz 等工具查看）"""
+
+    def get(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        path = os.path.join(settings.MEDIA_ROOT, profile.profile_path)
+        if not os.path.exists(path):
+            raise Http404('分析结果文件不存在')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+
+
+class BackupListView(AdminRequiredMixin, View):
+    """备份列表与恢复：提交恢复任务，页面轮询进度"""
+    template_name = 'system/backups.html'
+
+    def get(self, request):
+        return self.render(request, BackupRestoreForm())
+
+    def post(self, request):
+        form = BackupRestoreForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, '请检查表单中的错误信息')
+            return self.render(request, form)
 
+        backup = form.cleaned_data['backup']
+        user = form.cleaned_data['username']
+        dry_run = form.cleaned_data['dry_run']
+        if backup.restore_status == 'running':
+            messages.error(request, f'备份 {backup.name} 正在恢复中')
+            return redirect('system:backups')
+
+        from .tasks import restore_backup_task
+        try:
+            restore_backup_task.delay(
+                backup.pk,
+                user_id=user.pk if user else None,
+                media=form.cleaned_data['restore_media'],
+                database=form.cleaned_data['restore_database'],
+                dry_run=dry_run
+            )
+        except Exception:
+            messages.error(request, '无法提交恢复任务，请检查任务队列（也可以使用 restore_backup 命令）')
+            return redirect('system:backups')
+
+        audit.record(
+            SystemLog,
+            level='INFO' if dry_run else 'WARNING',
+            message=(
+                f'管理员 {request.user.get_full_name() or request.user.username} '
+                f'{"校验" if dry_run else "恢复"}了备份 {backup.name}'
+                f'{f"（用户 {user.username} 的文档）" if user else ""}'
+            ),
+            module='backup',
+            user=request.user,
+            ip_address=request.META.get('REMOTE_ADDR')
+        )
+        messages.success(request, '恢复任务已提交，进度见下方列表')
+        return redirect('system:backups')
+
+    def render(self, request, form):
+        return render(request, self.template_name, {
+            'form': form,
+            'backups': Backup.objects.select_related('created_by')[:50],
+        })
+
+
+class BackupRestoreStatusView(AdminRequiredMixin, View):
+    """恢复进度（页面轮询）"""
+
+    def get(self, request, pk):
+        backup = get_object_or_404(Backup, pk=pk)
+        return JsonResponse({
+            'status': backup.restore_status,
+            'status_display': backup.get_restore_status_display(),
+            'progress': backup.restore_progress,
+            'started_at': backup.restore_started_at,
+            'updated_at': backup.restore_updated_at,
+        })
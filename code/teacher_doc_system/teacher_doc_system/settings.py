@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -92,11 +93,14 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'system.middleware.MetricsMiddleware',  # 请求指标，放在最前面以统计完整的处理时间
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'system.middleware.ProfilingMiddleware',  # 按需性能分析，需要 request.user
+    'system.middleware.QueryAnalysisMiddleware',  # N+1 查询检测，仅 DEBUG 时启用
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'auditlog.middleware.AuditlogMiddleware',
@@ -235,6 +239,104 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    # 文档操作日志增量汇总（仪表盘统计读取汇总表）
+    'rollup-operation-logs': {
+        'task': 'documents.tasks.rollup_operation_logs_task',
+        'schedule': 300,
+    },
+    # 过期日志归档（每天凌晨3点）
+    'archive-old-logs': {
+        'task': 'system.tasks.archive_old_logs_task',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    # 失效过期和下载次数用完的分享链接（每10分钟，见 system/share_links.py）
+    'expire-share-links': {
+        'task': 'system.tasks.cleanup_expired_share_links',
+        'schedule': 600,
+    },
+    # 自动备份并按保留策略清理旧备份（每天凌晨2点，见 system/backup_retention.py）
+    'auto-backup': {
+        'task': 'system.tasks.auto_backup_task',
+        'schedule': crontab(hour=2, minute=0),
+    },
+}
+
+# 分享链接失效处理每批更新的条数（见 system/share_links.py）
+SHARE_LINK_EXPIRY_BATCH_SIZE = 1000
+
+# 审计日志异步批量写入（见 system/audit.py）
+AUDIT_LOG_ASYNC = os.getenv('AUDIT_LOG_ASYNC', 'True').lower() == 'true'
+AUDIT_LOG_BATCH_SIZE = 200  # 每批写入条数
+AUDIT_LOG_FLUSH_INTERVAL = 500  # 毫秒
+AUDIT_LOG_QUEUE_SIZE = 10000
+AUDIT_LOG_SPOOL_PATH = BASE_DIR / 'logs' / 'audit_spool.jsonl'  # 数据库不可用时的暂存文件
+# 文档操作日志合并窗口（秒）：同一用户对同一文档的重复操作在窗口内合并为一条；下载、删除始终逐条记录
+# 第一次操作立即写入，之后的次数累加到这条记录上；操作日志汇总会等最长的窗口结束后再处理（见 documents/rollups.py）
+DOCUMENT_LOG_COALESCE_WINDOWS = {
+    'view': 30 * 60,
+}
+
+# 日志保留天数，超过的记录归档到 MEDIA_ROOT/LOG_ARCHIVE_DIR 后从数据库删除（见 system/retention.py）
+LOG_RETENTION_POLICIES = {
+    'documents.DocumentOperationLog': 90,
+    'system.SystemLog': 90,
+    'users.LoginLog': 180,
+    'users.UserOperationLog': 365,
+}
+LOG_ARCHIVE_DIR = 'archives/logs'
+
+# 请求指标（见 system/metrics.py）：多进程部署时各进程定期把计数写入 METRICS_DIR，由 /system/metrics 汇总
+METRICS_DIR = BASE_DIR / 'logs' / 'metrics'
+METRICS_FLUSH_INTERVAL = 5  # 秒
+METRICS_OVERHEAD_BUDGET_US = 50  # benchmark_metrics 命令检查的每请求额外开销上限（微秒）
+# 配置后 Prometheus 可以用 Authorization: Bearer <METRICS_TOKEN> 抓取，无需管理员登录
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# 按需性能分析（见 system/profiling.py）：结果保存在 MEDIA_ROOT/PROFILING_DIR，只保留最近 PROFILING_KEEP 份
+PROFILING_DIR = 'profiles'
+PROFILING_KEEP = 50
+PROFILING_MAX_PER_MINUTE = 10  # 每个进程每分钟最多分析的请求数
+PROFILING_MAX_DURATION = 120  # 规则最长有效期（分钟）
+
+# 备份（见 system/backups.py）：保存在 MEDIA_ROOT/BACKUP_DIR，每 BACKUP_FULL_INTERVAL 次做一次完整备份，其余为增量备份
+BACKUP_DIR = 'backups'
+BACKUP_FULL_INTERVAL = 7
+BACKUP_SPACE_MARGIN = 64 * 1024 * 1024  # 检查磁盘空间时在预计的备份大小之外保留的余量
+# 备份格式：'zip' 每个备份保存变化的文件；'chunked' 文件按内容切块去重，保存在 BACKUP_DIR/repository（见 system/chunkstore.py）
+# 'chunked' 需要安装 numpy（pip install numpy）才能达到可用的切块速度；未安装时逐字节计算，只适合很小的媒体目录
+BACKUP_FORMAT = os.getenv('BACKUP_FORMAT', 'zip')
+BACKUP_CHUNK_MIN_SIZE = 256 * 1024
+BACKUP_CHUNK_AVG_SIZE = 1024 * 1024
+BACKUP_CHUNK_MAX_SIZE = 4 * 1024 * 1024
+BACKUP_PACK_SIZE = 64 * 1024 * 1024
+# 备份压缩（见 system/backup_writer.py）：已压缩格式直接存储，其余文件用 BACKUP_COMPRESSION_WORKERS 个线程并行压缩
+BACKUP_COMPRESSION_WORKERS = None  # 默认等于 CPU 核数
+BACKUP_PARALLEL_MAX_SIZE = 32 * 1024 * 1024  # 超过该大小的文件在主线程中流式压缩
+# 备份恢复（见 system/restore.py）：并行解压、校验文件的线程数
+BACKUP_RESTORE_WORKERS = 4
+
+# 查询分析（见 system/query_analysis.py）：DEBUG 时同一请求中相似查询达到阈值次数会记录警告
+QUERY_ANALYSIS_ENABLED = DEBUG
+QUERY_ANALYSIS_REPEAT_THRESHOLD = 5
+
+# Cache configuration
+# 配置 CACHE_URL（如 redis://localhost:6379/1）后使用Redis共享缓存，多进程部署时缓存失效才能及时同步；
+# 未配置时退回进程内缓存
+CACHE_URL = os.getenv('CACHE_URL', '')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
@@ -278,6 +380,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'system.query_analysis': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
 
@@ -298,6 +405,8 @@ TEACHER_DOC_SETTINGS = {
     'PASSWORD_EXPIRY_DAYS': int(os.getenv('PASSWORD_EXPIRY_DAYS', '90')),
     'AUTO_BACKUP_ENABLED': os.getenv('AUTO_BACKUP_ENABLED', 'True').lower() == 'true',
     'BACKUP_RETENTION_DAYS': int(os.getenv('BACKUP_RETENTION_DAYS', '7')),
+    'BACKUP_RETENTION_WEEKS': int(os.getenv('BACKUP_RETENTION_WEEKS', '4')),  # 更早的备份每周保留一个
+    'BACKUP_RETENTION_MONTHS': int(os.getenv('BACKUP_RETENTION_MONTHS', '6')),  # 更早的备份每月保留一个
 }
 
 # Default password for admin reset
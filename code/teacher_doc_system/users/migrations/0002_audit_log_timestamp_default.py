@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-19 07:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loginlog',
+            name='login_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='登录时间'),
+        ),
+        migrations.AlterField(
+            model_name='useroperationlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='操作时间'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-19 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_audit_log_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loginlog',
+            index=models.Index(fields=['login_time'], name='users_login_login_t_465de0_idx'),
+        ),
+    ]
@@ -2,6 +2,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from system import audit
 
 class CustomUser(AbstractUser):
     """用户模型（区分系统管理员和教师）"""
@@ -95,7 +98,9 @@ class CustomUser(AbstractUser):
         self.save()
         
         # 记录操作日志
-        UserOperationLog.objects.create(
+        audit.record(
+            UserOperationLog,
+            sync=True,
             user=self,
             operation='freeze',
             operated_by=frozen_by,
@@ -110,7 +115,9 @@ class CustomUser(AbstractUser):
         self.save()
         
         # 记录操作日志
-        UserOperationLog.objects.create(
+        audit.record(
+            UserOperationLog,
+            sync=True,
             user=self,
             operation='unfreeze',
             operated_by=unfrozen_by,
@@ -128,7 +135,9 @@ class CustomUser(AbstractUser):
         self.save()
         
         # 记录操作日志
-        UserOperationLog.objects.create(
+        audit.record(
+            UserOperationLog,
+            sync=True,
             user=self,
             operation='password_reset',
             operated_by=reset_by,
@@ -167,7 +176,7 @@ class UserOperationLog(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name="操作IP")
     user_agent = models.TextField(blank=True, verbose_name="用户代理")
     details = models.JSONField(blank=True, null=True, verbose_name="操作详情")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="操作时间")
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name="操作时间")
     
     class Meta:
         verbose_name = "用户操作日志"
@@ -193,7 +202,7 @@ class LoginLog(models.Model):
     )
     ip_address = models.GenericIPAddressField(verbose_name="登录IP")
     user_agent = models.TextField(verbose_name="用户代理")
-    login_time = models.DateTimeField(auto_now_add=True, verbose_name="登录时间")
+    login_time = models.DateTimeField(default=timezone.now, editable=False, verbose_name="登录时间")
     logout_time = models.DateTimeField(null=True, blank=True, verbose_name="登出时间")
     is_successful = models.BooleanField(default=True, verbose_name="是否成功")
     failure_reason = models.CharField(max_length=100, blank=True, verbose_name="失败原因")
@@ -204,6 +213,7 @@ class LoginLog(models.Model):
         indexes = [
             models.Index(fields=['user', 'login_time']),
             models.Index(fields=['ip_address', 'login_time']),
+            models.Index(fields=['login_time']),
         ]
         ordering = ['-login_time']
     
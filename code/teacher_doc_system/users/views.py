@@ -12,8 +12,12 @@ from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.cache import never_cache
 from django.db.models import Q
 import json
+from datetime import datetime, timedelta
+from itertools import islice
 
 from django.contrib.auth import get_user_model
+from system import audit
+from system.retention import iter_archived_logs
 from .models import UserOperationLog, LoginLog
 
 User = get_user_model()
@@ -116,8 +120,13 @@ class LoginView(View):
         return ip
     
     def _log_login_attempt(self, user, request, is_successful, failure_reason=''):
-        """记录登录尝试"""
-        LoginLog.objects.create(
+        """记录登录尝试
+
+        成功的登录同步写入：登出时直接更新这条记录的 logout_time，异步写入时记录可能还在队列中。
+        """
+        audit.record(
+            LoginLog,
+            sync=is_successful,
             user=user,
             ip_address=self._get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
@@ -168,7 +177,8 @@ class ChangePasswordView(LoginRequiredMixin, View):
             request.user.save()
             
             # 记录操作日志
-            UserOperationLog.objects.create(
+            audit.record(
+                UserOperationLog,
                 user=request.user,
                 operation='update',
                 operated_by=request.user,
@@ -231,7 +241,8 @@ class EditProfileView(LoginRequiredMixin, UpdateView):
     
     def form_valid(self, form):
         # 记录操作日志
-        UserOperationLog.objects.create(
+        audit.record(
+            UserOperationLog,
             user=self.request.user,
             operation='update',
             operated_by=self.request.user,
@@ -256,6 +267,7 @@ class EditProfileView(LoginRequiredMixin, UpdateView):
 class LoginLogsView(LoginRequiredMixin, TemplateView):
     """登录记录视图"""
     template_name = 'users/login_logs.html'
+    archive_max_days = 92  # 查找历史归档时日期范围的上限
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -284,10 +296,36 @@ class LoginLogsView(LoginRequiredMixin, TemplateView):
         elif status_filter == 'failed':
             logs = logs.filter(is_successful=False)
         
-        logs = logs.order_by('-login_time')[:100]  # 最多显示100条
+        logs = list(logs.order_by('-login_time')[:100])  # 最多显示100条
+        
+        # 历史归档需要解压扫描所有用户的记录，只在明确要求且日期范围有限时查找
+        archived_logs = []
+        archive_error = ''
+        search_archive = self.request.GET.get('archive') == '1'
+        if search_archive:
+            archive_error = self._archive_range_error(start_date, end_date)
+        if search_archive and not archive_error and len(logs) < 100:
+            archived_logs = list(islice(
+                iter_archived_logs(
+                    'users.LoginLog',
+                    start=self._local_date_start(start_date),
+                    end=self._local_date_start(end_date, days=1),
+                    filters={'user_id': self.request.user.pk},
+                    predicate=lambda log: (
+                        (not ip_filter or ip_filter in (log.ip_address or ''))
+                        and (status_filter != 'success' or log.is_successful)
+                        and (status_filter != 'failed' or not log.is_successful)
+                    ),
+                ),
+                100 - len(logs)
+            ))
         
         context.update({
-            'logs': logs,
+            'logs': logs + archived_logs,
+            'archived_count': len(archived_logs),
+            'search_archive': search_archive,
+            'archive_error': archive_error,
+            'archive_max_days': self.archive_max_days,
             'filters': {
                 'start_date': start_date,
                 'end_date': end_date,
@@ -296,6 +334,24 @@ class LoginLogsView(LoginRequiredMixin, TemplateView):
             }
         })
         return context
+    
+    def _archive_range_error(self, start_date, end_date):
+        start = self._local_date_start(start_date)
+        end = self._local_date_start(end_date, days=1)
+        if start is None or end is None:
+            return '查找历史归档需要填写开始日期和结束日期'
+        if not timedelta(0) < end - start <= timedelta(days=self.archive_max_days):
+            return f'查找历史归档的日期范围不能超过 {self.archive_max_days} 天'
+        return ''
+    
+    @staticmethod
+    def _local_date_start(value, days=0):
+        """'YYYY-MM-DD' -> 当天（加 days 天）本地零点，无法解析时返回 None"""
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d') + timedelta(days=days)
+        except (TypeError, ValueError):
+            return None
+        return timezone.make_aware(day)
 
 
 # API视图（用于AJAX请求）